@@ -0,0 +1,127 @@
+"""Provider HTTP client checks and benchmark against the local provider stub.
+
+1. Throughput: sequential calls with bare requests.post (a new connection
+   per call) versus ProviderClient (pooled keep-alive), reporting calls per
+   second and TCP connections opened.
+2. Behaviour: retries of idempotent calls on 503, no retry for plain POSTs,
+   read timeout enforcement and circuit breaker fail-fast. Exits non-zero if
+   any check fails.
+
+    python benchmarks/bench_http_client.py --calls 500
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+from provider_stub import StubServer
+from src.services.http_client import CircuitBreaker, CircuitOpenError, ProviderClient, ProviderError
+
+def stub_stats(server):
+    return requests.get(f'{server.url}/_stats').json()
+
+def measure(label, server, call, calls):
+    before = stub_stats(server)
+    started = time.perf_counter()
+    for _ in range(calls):
+        call()
+    elapsed = time.perf_counter() - started
+    after = stub_stats(server)
+
+    # Each /_stats probe opens its own connection
+    connections = after['connections'] - before['connections'] - 1
+    print(f"{label:<28} {calls / elapsed:8.0f} calls/s  {elapsed / calls * 1000:6.2f} ms/call  "
+          f"{connections} connections")
+    return calls / elapsed
+
+def run_benchmark(server, calls):
+    payload = {'amount': 100000, 'channel_code': 'BCA_VA'}
+    bare = measure('bare requests.post', server,
+                   lambda: requests.post(f'{server.url}/v3/payment_requests', json=payload, timeout=30).json(),
+                   calls)
+
+    client = ProviderClient('Stub', server.url)
+    client.post('/warmup')
+    pooled = measure('ProviderClient (keep-alive)', server,
+                     lambda: client.post('/v3/payment_requests', json=payload),
+                     calls)
+    print(f"speedup: {pooled / bare:.1f}x")
+
+def check(results, name, condition, detail=''):
+    results.append(condition)
+    print(f"[{'PASS' if condition else 'FAIL'}] {name}{' - ' + detail if detail else ''}")
+
+def run_checks(server):
+    results = []
+
+    client = ProviderClient('Stub', server.url, max_retries=2, retry_backoff=0.01,
+                            breaker=CircuitBreaker('Stub', failure_threshold=100))
+    body = client.get('/status?fail=2&key=get-retry')
+    check(results, 'idempotent GET is retried through two 503s', body['status'] == 'OK')
+
+    try:
+        client.post('/charge?fail=1&key=post-no-retry')
+        check(results, 'plain POST is not retried', False)
+    except ProviderError as e:
+        check(results, 'plain POST is not retried', e.status_code == 503)
+
+    body = client.post('/charge?fail=1&key=post-keyed', idempotent=True)
+    check(results, 'POST marked idempotent is retried', body['status'] == 'OK')
+
+    try:
+        client.get('/status?status=404')
+        check(results, '4xx is raised without retry', False)
+    except ProviderError as e:
+        check(results, '4xx is raised without retry', e.status_code == 404)
+
+    slow = ProviderClient('Stub', server.url, read_timeout=0.2, max_retries=0)
+    started = time.perf_counter()
+    try:
+        slow.get('/status?delay=2')
+        check(results, 'read timeout bounds a hung call', False)
+    except ProviderError:
+        elapsed = time.perf_counter() - started
+        check(results, 'read timeout bounds a hung call', elapsed < 1, f'{elapsed * 1000:.0f} ms')
+
+    breaker = CircuitBreaker('Stub', failure_threshold=3, reset_timeout=0.5)
+    flaky = ProviderClient('Stub', server.url, max_retries=0, breaker=breaker)
+    for _ in range(3):
+        try:
+            flaky.get('/status?status=503')
+        except ProviderError:
+            pass
+
+    requests_before = stub_stats(server)['requests']
+    started = time.perf_counter()
+    try:
+        flaky.get('/status')
+        check(results, 'open circuit fails fast', False)
+    except CircuitOpenError:
+        elapsed = time.perf_counter() - started
+        sent = stub_stats(server)['requests'] - requests_before
+        check(results, 'open circuit fails fast', sent == 0, f'{elapsed * 1e6:.0f} us, no request sent')
+
+    time.sleep(0.6)
+    body = flaky.get('/status')
+    check(results, 'half-open trial call closes the circuit', body['status'] == 'OK' and breaker.state == 'closed')
+
+    return all(results)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=500)
+    args = parser.parse_args()
+
+    with StubServer() as server:
+        run_benchmark(server, args.calls)
+        print()
+        ok = run_checks(server)
+
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
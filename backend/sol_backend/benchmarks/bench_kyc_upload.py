@@ -0,0 +1,118 @@
+"""Peak server RSS per KYC request: base64-in-JSON vs streamed multipart upload.
+
+For each mode a fresh server process is started, warmed up with one small
+KYC request, and then sent --requests KYC requests carrying two images of
+--image-mb megabytes. The growth of the server's peak RSS (VmHWM) over the
+warm-up is reported, along with the time per request.
+
+    python benchmarks/bench_kyc_upload.py --image-mb 4 --requests 5
+"""
+import argparse
+import base64
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+PNG_HEADER = b'\x89PNG\r\n\x1a\n'
+
+def serve(port, workdir):
+    from werkzeug.serving import make_server
+    from src.main import create_app
+    from src.cli import init_db
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+        'WEBHOOK_WORKERS': 0,
+        'KYC_WORKERS': 0,
+        'MAX_CONTENT_LENGTH': 256 * 1024 * 1024,
+        'KYC_MAX_IMAGE_BYTES': 64 * 1024 * 1024
+    })
+    with app.app_context():
+        init_db()
+    server = make_server('127.0.0.1', port, app)
+    print('ready', flush=True)
+    server.serve_forever()
+
+def peak_rss_kb(pid):
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+    return 0
+
+def image_file(directory, name, size):
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as f:
+        f.write(PNG_HEADER)
+        f.write(os.urandom(size - len(PNG_HEADER)))
+    return path
+
+def send_kyc(base_url, headers, mode, passport_path, selfie_path):
+    if mode == 'multipart':
+        with open(passport_path, 'rb') as passport, open(selfie_path, 'rb') as selfie:
+            return requests.post(f'{base_url}/privy/kyc/initiate', headers=headers,
+                                 files={'passport_image': passport, 'selfie_image': selfie})
+
+    payload = {}
+    for field, path in (('passport_image', passport_path), ('selfie_image', selfie_path)):
+        with open(path, 'rb') as f:
+            payload[field] = 'data:image/png;base64,' + base64.b64encode(f.read()).decode()
+    return requests.post(f'{base_url}/privy/kyc/initiate', headers=headers, json=payload)
+
+def run_mode(mode, args, port, images, small_images):
+    workdir = tempfile.mkdtemp()
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(port), workdir],
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, cwd=BACKEND_DIR)
+    try:
+        while server.stdout.readline().strip() not in (b'ready', b''):
+            pass
+        base_url = f'http://127.0.0.1:{port}/api'
+        token = requests.post(f'{base_url}/auth/register', json={
+            'passport_number': 'B1234567', 'full_name': 'Bench User',
+            'email': 'bench@example.com', 'password': 'bench-password'
+        }).json()['access_token']
+        headers = {'Authorization': f'Bearer {token}'}
+
+        send_kyc(base_url, headers, mode, *small_images).raise_for_status()
+        baseline = peak_rss_kb(server.pid)
+
+        started = time.perf_counter()
+        for _ in range(args.requests):
+            send_kyc(base_url, headers, mode, *images).raise_for_status()
+        elapsed = (time.perf_counter() - started) / args.requests
+
+        growth = (peak_rss_kb(server.pid) - baseline) / 1024
+        print(f"{mode:<10} peak RSS +{growth:6.1f} MB over warm-up   {elapsed * 1000:7.1f} ms/request")
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--serve':
+        return serve(int(sys.argv[2]), sys.argv[3])
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--image-mb', type=float, default=4)
+    parser.add_argument('--requests', type=int, default=5)
+    parser.add_argument('--port', type=int, default=8097)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    size = int(args.image_mb * 1024 * 1024)
+    images = (image_file(directory, 'passport.png', size), image_file(directory, 'selfie.png', size))
+    small_images = (image_file(directory, 'small-passport.png', 1024), image_file(directory, 'small-selfie.png', 1024))
+    print(f"two {args.image_mb:g} MB images per request, {args.requests} requests")
+
+    for offset, mode in enumerate(('json', 'multipart')):
+        run_mode(mode, args, args.port + offset, images, small_images)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""Concurrency benchmark for wallet debits.
+
+Runs QRIS-style debits from a thread pool against one hot user and against
+many users, and reports payments per second plus whether the final balances
+add up. ``--mode legacy`` runs the old read-modify-write code path for
+comparison; it is expected to lose updates.
+
+    python benchmarks/bench_ledger.py --threads 8 --payments 2000
+    BENCH_DATABASE_URL=postgresql://... python benchmarks/bench_ledger.py
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from src.models.user import User, Transaction, db
+from src.models.ledger import LedgerEntry
+from src.services.ledger import debit, InsufficientFundsError
+
+STARTING_BALANCE = Decimal('1000000000.00')
+PAYMENT_AMOUNT = Decimal('1000.00')
+
+def create_bench_app(database_url):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    if database_url.startswith('sqlite'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'connect_args': {'timeout': 30}}
+    db.init_app(app)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    return app
+
+def create_users(app, count, prefix):
+    with app.app_context():
+        users = [
+            User(
+                passport_number=f'{prefix}{i:06d}',
+                full_name=f'Bench User {i}',
+                email=f'{prefix.lower()}{i}@example.com',
+                password_hash='x',
+                kyc_status='APPROVED',
+                wallet_balance=STARTING_BALANCE
+            )
+            for i in range(count)
+        ]
+        db.session.add_all(users)
+        db.session.commit()
+        return [user.id for user in users]
+
+def pay_ledger(app, user_id):
+    with app.app_context():
+        try:
+            transaction = Transaction(user_id=user_id, type='QRIS_PAYMENT', amount=PAYMENT_AMOUNT, status='SUCCESS')
+            db.session.add(transaction)
+            db.session.flush()
+            debit(user_id, PAYMENT_AMOUNT, 'QRIS_PAYMENT', transaction_id=transaction.id)
+            db.session.commit()
+            return True
+        except InsufficientFundsError:
+            db.session.rollback()
+            return False
+
+def pay_legacy(app, user_id):
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        if user.wallet_balance < PAYMENT_AMOUNT:
+            return False
+        transaction = Transaction(user_id=user_id, type='QRIS_PAYMENT', amount=PAYMENT_AMOUNT, status='SUCCESS')
+        user.wallet_balance -= PAYMENT_AMOUNT
+        db.session.add(transaction)
+        db.session.commit()
+        return True
+
+def run_scenario(app, name, user_ids, payments, threads, pay):
+    targets = [user_ids[i % len(user_ids)] for i in range(payments)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        succeeded = sum(pool.map(lambda user_id: pay(app, user_id), targets))
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        total_balance = db.session.query(db.func.sum(User.wallet_balance))\
+            .filter(User.id.in_(user_ids)).scalar()
+        ledger_entries = LedgerEntry.query.filter(LedgerEntry.user_id.in_(user_ids)).count()
+
+    expected_balance = STARTING_BALANCE * len(user_ids) - PAYMENT_AMOUNT * succeeded
+    lost_updates = int((Decimal(str(total_balance)) - expected_balance) / PAYMENT_AMOUNT)
+
+    print(f"{name:<12} users={len(user_ids):<5} threads={threads:<3} "
+          f"payments={succeeded:<6} {succeeded / elapsed:>9.1f} payments/s  "
+          f"ledger_entries={ledger_entries:<6} lost_updates={lost_updates}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--payments', type=int, default=2000)
+    parser.add_argument('--users', type=int, default=100, help='user count for the many-users scenario')
+    parser.add_argument('--mode', choices=['ledger', 'legacy'], default='ledger')
+    args = parser.parse_args()
+
+    database_url = os.getenv('BENCH_DATABASE_URL')
+    if not database_url:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_ledger.db')}"
+
+    app = create_bench_app(database_url)
+    pay = pay_ledger if args.mode == 'ledger' else pay_legacy
+
+    print(f"mode={args.mode} database={database_url.split('://')[0]}")
+    run_scenario(app, 'one-user', create_users(app, 1, 'HOT'), args.payments, args.threads, pay)
+    run_scenario(app, 'many-users', create_users(app, args.users, 'MANY'), args.payments, args.threads, pay)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""Time a webhook log line costs the request thread: basicConfig vs the queue handler.
+
+The legacy path is what the webhook routes did before: an f-string of the
+whole payload, written and flushed by a StreamHandler in the calling
+thread. The queue path renders and redacts the message in the caller and
+leaves JSON encoding and the write to the writer thread. Both write to
+the same kind of file; --slow-write adds a delay per write to stand in for
+a busy disk or log shipper. The second table is the cost of a DEBUG line
+while DEBUG is disabled, formatted eagerly (f-string) and lazily.
+
+    python benchmarks/bench_logging.py --records 20000 --slow-write 0.0002
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils import logging_setup
+
+def webhook_payload(index):
+    return {
+        'id': f'evt_{index}',
+        'external_id': f'tx_{index}',
+        'status': 'PAID',
+        'amount': 150000,
+        'payer_email': 'customer@example.com',
+        'customer': {'full_name': 'JOHN DOE', 'passport_number': 'A12345678', 'phone_number': '+628123456789'},
+        'items': [{'name': 'Top-up', 'quantity': 1, 'price': 150000}]
+    }
+
+class SlowFileHandler(logging.FileHandler):
+    def __init__(self, path, delay):
+        super().__init__(path)
+        self.write_delay = delay
+
+    def flush(self):
+        super().flush()
+        if self.write_delay:
+            time.sleep(self.write_delay)
+
+def measure(label, logger, payloads, log):
+    timings = []
+    for payload in payloads:
+        started = time.perf_counter()
+        log(logger, payload)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(f"{label:<28} {statistics.mean(timings) * 1e6:8.1f} us mean  {p99 * 1e6:8.1f} us p99")
+    return statistics.mean(timings)
+
+def legacy_log(logger, data):
+    logger.info(f"Received Xendit webhook: {data}")
+
+def structured_log(logger, data):
+    logger.info("Received Xendit webhook", extra={'payload': data})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--slow-write', type=float, default=0.0, help='seconds added to every flush')
+    args = parser.parse_args()
+
+    payloads = [webhook_payload(index) for index in range(args.records)]
+    directory = tempfile.mkdtemp(prefix='sol-log-bench-')
+    root = logging.getLogger()
+
+    legacy_handler = SlowFileHandler(os.path.join(directory, 'legacy.log'), args.slow_write)
+    legacy_handler.setFormatter(logging.Formatter(logging_setup.TEXT_FORMAT))
+    root.addHandler(legacy_handler)
+    root.setLevel(logging.INFO)
+    legacy = measure('basicConfig, f-string', logging.getLogger('bench.legacy'), payloads, legacy_log)
+    root.removeHandler(legacy_handler)
+    legacy_handler.close()
+
+    # Sampling off, so both paths log every record
+    logging_setup.configure_logging({'LOG_LEVEL': 'INFO', 'LOG_FORMAT': 'json', 'LOG_QUEUE_SIZE': args.records + 1,
+                                     'LOG_SAMPLE_BURST': 0, 'LOG_SAMPLE_RATE': 1.0})
+    writer = SlowFileHandler(os.path.join(directory, 'queued.log'), args.slow_write)
+    writer.setFormatter(logging_setup.JsonFormatter())
+    logging_setup._writer.close()
+    logging_setup._listener.handlers = (writer,)
+    queued = measure('queue handler, JSON', logging.getLogger('bench.queued'), payloads, structured_log)
+    drain_started = time.perf_counter()
+    logging_setup._stop_listener()
+    print(f"writer thread drained the rest in {time.perf_counter() - drain_started:.2f}s")
+    print(f"caller speedup: {legacy / queued:.2f}x")
+
+    disabled = logging.getLogger('bench.disabled')
+    measure('disabled DEBUG, f-string', disabled, payloads, lambda logger, data: logger.debug(f"Payload: {data}"))
+    measure('disabled DEBUG, lazy %s', disabled, payloads, lambda logger, data: logger.debug("Payload: %s", data))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Login throughput benchmark for the bcrypt hashing pool.
+
+Sends concurrent POST /api/auth/login requests through the Flask test client
+and reports logins per second, per core, and how many requests were shed
+with 503. Runs once with hashing inline on the request thread (pool size 0)
+and once with the process pool.
+
+    python benchmarks/bench_login.py --rounds 10 --logins 64 --threads 16
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask_jwt_extended import JWTManager
+from src.models.user import User, db
+from src.routes import auth as auth_routes
+from src.routes.auth import auth_bp
+from src.services import passwords
+from src.services.passwords import PasswordHasher
+
+EMAIL = 'bench@example.com'
+PASSWORD = 'bench-password'
+
+def create_bench_app(hasher):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench_login.db')}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['JWT_SECRET_KEY'] = 'bench'
+    # Every login must reach the hasher
+    app.config['RATE_LIMIT_ENABLED'] = False
+    JWTManager(app)
+    db.init_app(app)
+    app.register_blueprint(auth_bp, url_prefix='/api')
+
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(
+            passport_number='BENCH0001',
+            full_name='Bench User',
+            email=EMAIL,
+            password_hash=hasher.hash(PASSWORD)
+        ))
+        db.session.commit()
+    return app
+
+def run(label, hasher, logins, threads):
+    # The auth routes use the module-level hasher
+    auth_routes.password_hasher = hasher
+
+    app = create_bench_app(hasher)
+    hasher.warm_up()
+
+    def login(_):
+        response = app.test_client().post('/api/auth/login', json={'email': EMAIL, 'password': PASSWORD})
+        return response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        statuses = Counter(pool.map(login, range(logins)))
+    elapsed = time.perf_counter() - started
+
+    cores = min(max(hasher.pool_size, 1), os.cpu_count() or 1)
+    succeeded = statuses.get(200, 0)
+    print(f"{label:<8} pool_size={hasher.pool_size:<3} ok={succeeded:<5} shed_503={statuses.get(503, 0):<5} "
+          f"{succeeded / elapsed:>7.1f} logins/s  {succeeded / elapsed / cores:>7.1f} logins/s/core  "
+          f"wall={elapsed:.2f}s")
+    hasher.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=passwords.DEFAULT_ROUNDS)
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--pool-size', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--max-pending', type=int, default=None)
+    args = parser.parse_args()
+
+    max_pending = args.max_pending or args.threads
+    print(f"bcrypt rounds={args.rounds} cpus={os.cpu_count()} threads={args.threads} max_pending={max_pending}")
+    run('inline', PasswordHasher(rounds=args.rounds, pool_size=0, max_pending=max_pending), args.logins, args.threads)
+    run('pool', PasswordHasher(rounds=args.rounds, pool_size=args.pool_size, max_pending=max_pending),
+        args.logins, args.threads)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Top-ups per second: the old two-commit route body vs PaymentService.
+
+The legacy path is what /wallet/topup, /doku/virtual-account and
+/xendit/payment-request did before: commit a PENDING Transaction, call
+the provider, then commit again to store its reference. Reading the
+expired transaction id after the first commit opens a new database
+transaction, so every call holds a pooled connection while the provider
+answers. PaymentService also reserves the row first and stores the
+reference in a second commit, but chooses the id up front and ends the
+database transaction before the call, so no connection is held while the
+provider answers. The provider is simulated with --provider-latency
+seconds per call; the report includes commits per top-up and the mean
+pool checkout wait.
+
+    python benchmarks/bench_payments.py --threads 32 --topups 2000 --provider-latency 0.05
+    BENCH_DATABASE_URL=postgresql://... python benchmarks/bench_payments.py
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+from src.main import create_app
+from src.models.user import User, Transaction, db
+from src.services.payments import ProviderPayment, payment_service
+from src.utils.metrics import DB_POOL_WAIT_SECONDS
+
+AMOUNT = Decimal('150000.00')
+
+class SimulatedProvider:
+    """Answers like a virtual account provider after a fixed delay"""
+    name = 'simulated'
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def create_payment(self, amount, reference_id, channel):
+        time.sleep(self.latency)
+        return ProviderPayment(f'sim_{reference_id}', {
+            'number': '8808' + reference_id[:8],
+            'bank_code': 'BCA',
+            'expired_time': None
+        }, None, {})
+
+def topup_legacy(provider, user_id):
+    transaction = Transaction(user_id=user_id, type='TOPUP', amount=AMOUNT, status='PENDING',
+                              description='Top-up via BCA_VA')
+    db.session.add(transaction)
+    db.session.commit()
+
+    payment = provider.create_payment(AMOUNT, str(transaction.id), 'BCA_VA')
+
+    transaction.xendit_transaction_id = payment.reference
+    db.session.commit()
+    return transaction.id
+
+def topup_service(provider, user_id):
+    return payment_service.create_payment(provider, user_id, 'TOPUP', AMOUNT, 'BCA_VA', 'Top-up via BCA_VA').transaction_id
+
+def pool_wait():
+    series = DB_POOL_WAIT_SECONDS.snapshot()['series']
+    return (sum(series[0][1]), series[0][2]) if series else (0, 0.0)
+
+def run(label, app, topup, provider, user_ids, count, threads):
+    commits = []
+    counter_lock = threading.Lock()
+
+    def count_commit(conn):
+        with counter_lock:
+            commits.append(1)
+
+    with app.app_context():
+        event.listen(db.engine, 'commit', count_commit)
+
+    def one(index):
+        started = time.perf_counter()
+        # Request context, as in the route; the session is scoped to it
+        with app.test_request_context():
+            topup(provider, user_ids[index % len(user_ids)])
+        return time.perf_counter() - started
+
+    waits_before, wait_time_before = pool_wait()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        latencies = sorted(executor.map(one, range(count)))
+    elapsed = time.perf_counter() - started
+    waits, wait_time = pool_wait()
+
+    with app.app_context():
+        event.remove(db.engine, 'commit', count_commit)
+
+    checkouts = waits - waits_before
+    mean_wait = (wait_time - wait_time_before) / checkouts if checkouts else 0.0
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label:<16} {count / elapsed:8.1f} top-ups/s  p50 {statistics.median(latencies) * 1000:7.1f} ms"
+          f"  p95 {p95 * 1000:7.1f} ms  {len(commits) / count:.2f} commits each"
+          f"  pool wait {mean_wait * 1000:6.2f} ms")
+    return count / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--topups', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--provider-latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    database_url = os.getenv('BENCH_DATABASE_URL') or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'LOG_LEVEL': 'WARNING',
+        'WEBHOOK_WORKERS': 0,
+        'KYC_WORKERS': 0,
+        'SERVER_TIMING_ENABLED': False
+    })
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        users = [User(passport_number=f'P{i:07d}', full_name=f'Bench User {i}', email=f'bench{i}@example.com',
+                      password_hash='x', kyc_status='APPROVED') for i in range(args.users)]
+        db.session.add_all(users)
+        db.session.commit()
+        user_ids = [user.id for user in users]
+        print(f"{database_url.split(':')[0]}, pool {db.engine.pool.status()}")
+
+    provider = SimulatedProvider(args.provider_latency)
+    print(f"{args.topups} top-ups from {args.threads} threads, provider latency {args.provider_latency * 1000:.0f} ms")
+    legacy = run('two commits', app, topup_legacy, provider, user_ids, args.topups, args.threads)
+    service = run('PaymentService', app, topup_service, provider, user_ids, args.topups, args.threads)
+    print(f"speedup: {service / legacy:.2f}x")
+
+if __name__ == '__main__':
+    main()
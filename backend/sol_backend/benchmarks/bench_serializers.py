@@ -0,0 +1,161 @@
+"""List serialization throughput: ORM objects + to_dict vs column projections.
+
+Fills a database with --rows transactions and serializes them in pages of
+--page-size rows the way each list endpoint does: the legacy path loads
+Transaction (and User) objects, builds dicts with to_dict()/inline
+comprehensions and encodes with Flask's JSON provider; the projection path
+selects the same columns as tuples and encodes with src.utils.projection.
+Reports rows per second for /wallet/transactions, /admin/transactions and
+/admin/users and checks that both paths produce the same JSON.
+
+    python benchmarks/bench_serializers.py --rows 20000 --page-size 500
+    BENCH_DATABASE_URL=postgresql://... python benchmarks/bench_serializers.py
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload
+from src.models.user import User, Transaction, db
+from src.routes.admin import TRANSACTION_PROJECTION as ADMIN_TRANSACTION_PROJECTION, USER_PROJECTION
+from src.routes.wallet import TRANSACTION_PROJECTION
+from src.utils.projection import dumps, orjson
+
+def create_bench_app(database_url):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+    return app
+
+def fill(app, rows, users):
+    started = datetime(2024, 1, 1)
+    with app.app_context():
+        user_rows = [{
+            'id': str(uuid.uuid4()),
+            'passport_number': f'B{i:07d}',
+            'full_name': f'Bench User {i}',
+            'email': f'bench{i}@example.com',
+            'password_hash': 'x',
+            'kyc_status': 'APPROVED',
+            'wallet_balance': 1000000,
+            'created_at': started + timedelta(minutes=i)
+        } for i in range(users)]
+        db.session.execute(insert(User), user_rows)
+
+        for offset in range(0, rows, 10000):
+            db.session.execute(insert(Transaction), [{
+                'id': str(uuid.uuid4()),
+                'user_id': user_rows[i % users]['id'] if i % 2 else user_rows[0]['id'],
+                'type': 'TOPUP',
+                'amount': 1000 + i % 997,
+                'currency': 'IDR',
+                'status': 'SUCCESS',
+                'xendit_transaction_id': f'doku_{i}',
+                'description': 'Top-up via BCA_VA',
+                'created_at': started + timedelta(seconds=i),
+                'updated_at': started + timedelta(seconds=i)
+            } for i in range(offset, min(rows, offset + 10000))])
+        db.session.commit()
+        return user_rows[0]['id']
+
+def legacy_wallet(app, user_id, limit, offset):
+    items = Transaction.query.filter_by(user_id=user_id)\
+        .order_by(Transaction.created_at.desc()).limit(limit).offset(offset).all()
+    return app.json.dumps({'transactions': [transaction.to_dict() for transaction in items]}), len(items)
+
+def projection_wallet(app, user_id, limit, offset):
+    rows = db.session.execute(TRANSACTION_PROJECTION.select().where(Transaction.user_id == user_id)
+                              .order_by(Transaction.created_at.desc()).limit(limit).offset(offset)).all()
+    return dumps({'transactions': TRANSACTION_PROJECTION.serialize(rows)}), len(rows)
+
+def legacy_admin_transactions(app, user_id, limit, offset):
+    items = Transaction.query.options(joinedload(Transaction.user).load_only(User.full_name))\
+        .order_by(Transaction.created_at.desc()).limit(limit).offset(offset).all()
+    return app.json.dumps({'transactions': [{
+        'transaction_id': transaction.id,
+        'user_id': transaction.user_id,
+        'user_name': transaction.user.full_name if transaction.user else None,
+        'type': transaction.type,
+        'amount': float(transaction.amount),
+        'currency': transaction.currency,
+        'status': transaction.status,
+        'description': transaction.description,
+        'created_at': transaction.created_at.isoformat() if transaction.created_at else None
+    } for transaction in items]}), len(items)
+
+def projection_admin_transactions(app, user_id, limit, offset):
+    rows = db.session.execute(ADMIN_TRANSACTION_PROJECTION.select().select_from(Transaction)
+                              .outerjoin(User, User.id == Transaction.user_id)
+                              .order_by(Transaction.created_at.desc()).limit(limit).offset(offset)).all()
+    return dumps({'transactions': ADMIN_TRANSACTION_PROJECTION.serialize(rows)}), len(rows)
+
+def legacy_admin_users(app, user_id, limit, offset):
+    items = User.query.order_by(User.created_at.desc()).limit(limit).offset(offset).all()
+    return app.json.dumps({'users': [{
+        'user_id': user.id,
+        'full_name': user.full_name,
+        'email': user.email,
+        'passport_number': user.passport_number,
+        'kyc_status': user.kyc_status,
+        'wallet_balance': float(user.wallet_balance),
+        'created_at': user.created_at.isoformat() if user.created_at else None
+    } for user in items]}), len(items)
+
+def projection_admin_users(app, user_id, limit, offset):
+    rows = db.session.execute(USER_PROJECTION.select().order_by(User.created_at.desc())
+                              .limit(limit).offset(offset)).all()
+    return dumps({'users': USER_PROJECTION.serialize(rows)}), len(rows)
+
+def measure(app, serialize, user_id, page_size, pages):
+    rows = 0
+    started = time.perf_counter()
+    with app.app_context():
+        for page in range(pages):
+            _, count = serialize(app, user_id, page_size, page * page_size)
+            rows += count
+            db.session.remove()
+    return rows / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--page-size', type=int, default=500)
+    parser.add_argument('--pages', type=int, default=10)
+    args = parser.parse_args()
+
+    database_url = os.getenv('BENCH_DATABASE_URL') or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    app = create_bench_app(database_url)
+    user_id = fill(app, args.rows, args.users)
+    print(f"{args.rows} transactions, {args.users} users, pages of {args.page_size}, "
+          f"encoder: {'orjson' if orjson else 'json'}")
+
+    endpoints = (
+        ('/wallet/transactions', legacy_wallet, projection_wallet),
+        ('/admin/transactions', legacy_admin_transactions, projection_admin_transactions),
+        ('/admin/users', legacy_admin_users, projection_admin_users)
+    )
+    for name, legacy, projection in endpoints:
+        with app.app_context():
+            if json.loads(legacy(app, user_id, args.page_size, 0)[0]) != json.loads(projection(app, user_id, args.page_size, 0)[0]):
+                sys.exit(f'{name}: projection output differs from the legacy serializer')
+
+        before = measure(app, legacy, user_id, args.page_size, args.pages)
+        after = measure(app, projection, user_id, args.page_size, args.pages)
+        print(f"{name:<22} legacy {before:9.0f} rows/s   projection {after:9.0f} rows/s   {after / before:4.1f}x")
+
+if __name__ == '__main__':
+    main()
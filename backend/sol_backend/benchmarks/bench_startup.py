@@ -0,0 +1,120 @@
+"""Cold start time and per-worker memory of the production server.
+
+1. Imports src.wsgi (create_app) in fresh interpreters and reports the
+   median time and peak RSS.
+2. Starts gunicorn with and without preload_app, waits for /api/health, and
+   reports time-to-ready plus RSS and PSS (proportional set size, which
+   splits shared pages between processes) for the master and every worker.
+   Linux only, since it reads /proc.
+
+    python benchmarks/bench_startup.py --workers 4
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_PROBE = """
+import json, resource, time
+started = time.perf_counter()
+from src.wsgi import app
+elapsed = time.perf_counter() - started
+print(json.dumps({'seconds': elapsed, 'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+"""
+
+def measure_import(runs):
+    results = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', IMPORT_PROBE], cwd=BACKEND_DIR)
+        results.append(json.loads(output.decode().strip().splitlines()[-1]))
+
+    seconds = statistics.median(result['seconds'] for result in results)
+    rss_mb = statistics.median(result['max_rss_kb'] for result in results) / 1024
+    print(f"import + create_app: median {seconds * 1000:.0f} ms, peak RSS {rss_mb:.1f} MB ({runs} runs)")
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def memory_kb(pid):
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ('Rss:', 'Pss:'):
+                values[parts[0][:-1]] = int(parts[1])
+    return values
+
+def children(pid):
+    found = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                if int(f.read().rsplit(')', 1)[1].split()[1]) == pid:
+                    found.append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return found
+
+def measure_gunicorn(workers, preload):
+    port = free_port()
+    env = dict(os.environ, GUNICORN_BIND=f'127.0.0.1:{port}', GUNICORN_WORKERS=str(workers),
+               GUNICORN_PRELOAD='true' if preload else 'false', BCRYPT_POOL_SIZE='0')
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'src.wsgi:app'],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+    try:
+        while True:
+            try:
+                urllib.request.urlopen(f'http://127.0.0.1:{port}/api/health', timeout=1)
+                break
+            except OSError:
+                if time.perf_counter() - started > 60:
+                    raise RuntimeError('gunicorn did not become ready within 60s')
+                time.sleep(0.05)
+        ready = time.perf_counter() - started
+
+        # Let every worker finish booting before sampling memory
+        deadline = time.time() + 10
+        while len(children(server.pid)) < workers and time.time() < deadline:
+            time.sleep(0.1)
+        time.sleep(0.5)
+
+        master = memory_kb(server.pid)
+        worker_memory = [memory_kb(pid) for pid in children(server.pid)]
+        total_pss = master['Pss'] + sum(memory['Pss'] for memory in worker_memory)
+
+        print(f"gunicorn preload={str(preload).lower():<5} workers={workers}: ready in {ready * 1000:.0f} ms, "
+              f"master RSS {master['Rss'] / 1024:.1f} MB, "
+              f"worker RSS {statistics.mean(m['Rss'] for m in worker_memory) / 1024:.1f} MB / "
+              f"PSS {statistics.mean(m['Pss'] for m in worker_memory) / 1024:.1f} MB avg, "
+              f"total PSS {total_pss / 1024:.1f} MB")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    measure_import(args.runs)
+    measure_gunicorn(args.workers, preload=False)
+    measure_gunicorn(args.workers, preload=True)
+
+if __name__ == '__main__':
+    main()
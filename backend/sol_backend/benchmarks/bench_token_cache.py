@@ -0,0 +1,109 @@
+"""Token refreshes across worker processes: legacy per-process dict vs TokenCache.
+
+Starts --processes worker processes with --threads threads each. Every
+thread asks for a token in a loop while tokens expire every --lifetime
+seconds; the simulated token endpoint takes --fetch-ms to answer. Reports
+how many times the endpoint was called and the slowest token lookup.
+
+    python benchmarks/bench_token_cache.py --processes 4 --threads 16
+    python benchmarks/bench_token_cache.py --redis redis://localhost:6379/0
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.token_cache import FileTokenStore, RedisTokenStore, TokenCache
+from src.utils.redis_client import get_redis
+
+def make_fetch(counter, fetch_seconds, lifetime):
+    def fetch():
+        with counter.get_lock():
+            counter.value += 1
+        time.sleep(fetch_seconds)
+        return f'token-{time.time()}', lifetime
+    return fetch
+
+class LegacyCache:
+    """The previous doku._token_cache logic: check, then fetch, no coordination"""
+
+    def __init__(self, fetch):
+        self.fetch = fetch
+        self.token = None
+        self.expires_at = 0
+
+    def get(self):
+        if self.token and time.time() < self.expires_at:
+            return self.token
+        token, lifetime = self.fetch()
+        self.token, self.expires_at = token, time.time() + lifetime
+        return token
+
+def worker(mode, counter, slowest, args, store_args):
+    fetch = make_fetch(counter, args.fetch_ms / 1000, args.lifetime)
+    if mode == 'legacy':
+        cache = LegacyCache(fetch)
+    else:
+        kind, location = store_args
+        store = FileTokenStore(location) if kind == 'file' else RedisTokenStore(get_redis(location), 'bench:token')
+        cache = TokenCache('bench', fetch, store, refresh_ahead=args.lifetime / 4)
+
+    deadline = time.time() + args.duration
+
+    def run():
+        worst = 0
+        while time.time() < deadline:
+            started = time.perf_counter()
+            cache.get()
+            worst = max(worst, time.perf_counter() - started)
+            time.sleep(0.001)
+        with slowest.get_lock():
+            slowest.value = max(slowest.value, worst)
+
+    threads = [threading.Thread(target=run) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def measure(mode, args, store_args=None):
+    context = multiprocessing.get_context('fork')
+    counter = context.Value('i', 0)
+    slowest = context.Value('d', 0.0)
+    processes = [context.Process(target=worker, args=(mode, counter, slowest, args, store_args))
+                 for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    expiries = args.duration / args.lifetime
+    label = mode if store_args is None else f'{mode} ({store_args[0]})'
+    print(f"{label:<24} {counter.value:4d} token fetches over ~{expiries:.0f} expiries, "
+          f"slowest lookup {slowest.value * 1000:.0f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=6)
+    parser.add_argument('--lifetime', type=float, default=2)
+    parser.add_argument('--fetch-ms', type=float, default=100)
+    parser.add_argument('--redis', help='Redis URL; the file store is used otherwise')
+    args = parser.parse_args()
+
+    measure('legacy', args)
+    if args.redis:
+        get_redis(args.redis).delete('bench:token')
+        measure('token-cache', args, ('redis', args.redis))
+    else:
+        path = os.path.join(tempfile.mkdtemp(), 'token.json')
+        measure('token-cache', args, ('file', path))
+
+if __name__ == '__main__':
+    main()
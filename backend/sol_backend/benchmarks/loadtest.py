@@ -0,0 +1,337 @@
+"""HTTP load test: the user journey and the admin dashboard against a running server.
+
+Each virtual user registers, logs in, submits KYC and waits for approval,
+tops up, has the top-up settled by a Xendit webhook and waits for the
+balance, then pays --payments QRIS payments. --concurrency users run at
+once while --admin-threads admins refresh the dashboard (stats,
+transactions, users) until the last user is done.
+
+Latency percentiles (p50/p95/p99) and requests per second are reported
+per endpoint. Answers shed with 503 or 429 are retried after their
+Retry-After and counted in the shed column. With --baseline the results are compared to a saved run and
+the exit status is 1 when an endpoint's p95 or the overall throughput is
+worse by more than --tolerance (or when any request failed). Baselines
+only compare runs on the same machine with the same options.
+
+By default a fresh server is started in a subprocess (threaded werkzeug
+server, SQLite in a temporary directory, background workers running, rate
+limits off, KYC stub). Use --url to test a server you started yourself,
+e.g. under gunicorn; it needs RATE_LIMIT_ENABLED=false and a KYC provider
+whose OCR does not return a passport number.
+
+    python benchmarks/loadtest.py --users 40 --concurrency 4
+    python benchmarks/loadtest.py --baseline benchmarks/loadtest_baseline.json
+    python benchmarks/loadtest.py --save-baseline benchmarks/loadtest_baseline.json
+    python benchmarks/loadtest.py --url http://127.0.0.1:5000/api
+"""
+import argparse
+import json
+import os
+import random
+import secrets
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\0' * 2048
+POLL_INTERVAL = 0.05
+WAIT_TIMEOUT = 30
+MAX_SHED_RETRIES = 10
+# Endpoints with fewer samples (the admin login) are too noisy to flag as regressions
+MIN_COMPARED_SAMPLES = 20
+
+def serve(port, workdir):
+    from werkzeug.serving import make_server
+    from src.main import create_app, start_background_services
+    from src.cli import init_db
+
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(workdir, 'loadtest.db')}",
+        'UPLOAD_FOLDER': os.path.join(workdir, 'uploads'),
+        'RATE_LIMIT_ENABLED': False
+    })
+    with app.app_context():
+        init_db()
+    start_background_services(app)
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    print('ready', flush=True)
+    server.serve_forever()
+
+class ScenarioError(Exception):
+    pass
+
+class Recorder:
+    """Latency samples and failures per endpoint, shared by all virtual users"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = Counter()
+        self.shed = Counter()
+        self.failures = []
+        self._lock = threading.Lock()
+
+    def call(self, session, name, method, url, expect=(200,), **kwargs):
+        """Send a request and record its latency. Raises ScenarioError unless the status is in expect.
+
+        503 and 429 answers carrying Retry-After (load shedding, rate
+        limits) are counted as shed and retried after the advised delay,
+        the way a well-behaved client would.
+        """
+        for attempt in range(MAX_SHED_RETRIES + 1):
+            started = time.perf_counter()
+            try:
+                response = session.request(method, url, timeout=WAIT_TIMEOUT, **kwargs)
+            except requests.RequestException as e:
+                with self._lock:
+                    self.errors[name] += 1
+                raise ScenarioError(f'{name}: {e}')
+            elapsed = time.perf_counter() - started
+
+            retry_after = response.headers.get('Retry-After')
+            if response.status_code in (429, 503) and retry_after and attempt < MAX_SHED_RETRIES:
+                with self._lock:
+                    self.shed[name] += 1
+                # Jittered, so shed clients do not come back in lockstep
+                time.sleep(float(retry_after) * random.uniform(1, 2))
+                continue
+            break
+
+        ok = response.status_code in expect
+        with self._lock:
+            self.samples[name].append(elapsed)
+            if not ok:
+                self.errors[name] += 1
+        if not ok:
+            raise ScenarioError(f"{name}: {response.status_code} {' '.join(response.text.split())[:200]}")
+        return response
+
+    def fail(self, message):
+        with self._lock:
+            self.failures.append(message)
+
+def wait_for(check, what):
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        if check():
+            return
+        time.sleep(POLL_INTERVAL)
+    raise ScenarioError(f'timed out waiting for {what}')
+
+def user_journey(base, recorder, run_id, number, args):
+    session = requests.Session()
+    email = f'lt-{run_id}-{number}@example.com'
+    password = 'load-test-password'
+
+    recorder.call(session, 'POST /auth/register', 'POST', f'{base}/auth/register', expect=(201,), json={
+        'passport_number': f'L{run_id}{number:06d}',
+        'full_name': f'Load Test {number}',
+        'email': email,
+        'password': password
+    })
+    token = recorder.call(session, 'POST /auth/login', 'POST', f'{base}/auth/login',
+                          json={'email': email, 'password': password}).json()['access_token']
+    session.headers['Authorization'] = f'Bearer {token}'
+
+    kyc = recorder.call(session, 'POST /privy/kyc/initiate', 'POST', f'{base}/privy/kyc/initiate', expect=(200, 202),
+                        files={'passport_image': ('passport.png', PNG), 'selfie_image': ('selfie.png', PNG)}).json()
+
+    def kyc_done():
+        status = recorder.call(session, 'GET /privy/kyc/status/<kyc_id>', 'GET',
+                               f"{base}/privy/kyc/status/{kyc['kyc_id']}").json()['status']
+        if status in ('REJECTED', 'FAILED'):
+            raise ScenarioError(f'KYC {status}')
+        return status == 'APPROVED'
+
+    if kyc['status'] != 'APPROVED':
+        wait_for(kyc_done, 'KYC approval')
+
+    amount = args.payments * 1000 + 1000
+    topup = recorder.call(session, 'POST /wallet/topup', 'POST', f'{base}/wallet/topup', expect=(201,),
+                          json={'amount': amount, 'payment_method': 'BCA_VA'}).json()
+
+    # Sent the way the provider sends it: its own connection, no user token
+    recorder.call(requests, 'POST /webhooks/xendit', 'POST', f'{base}/webhooks/xendit', json={
+        'id': f"lt-{topup['transaction_id']}",
+        'external_id': topup['transaction_id'],
+        'status': 'PAID'
+    })
+
+    def credited():
+        balance = recorder.call(session, 'GET /wallet/balance', 'GET', f'{base}/wallet/balance').json()['balance']
+        return balance >= amount
+
+    wait_for(credited, 'the top-up to be credited')
+
+    for _ in range(args.payments):
+        recorder.call(session, 'POST /wallet/qris-pay', 'POST', f'{base}/wallet/qris-pay',
+                      json={'amount': 1000, 'merchant_qris_code': 'LOADTEST-MERCHANT'})
+
+    recorder.call(session, 'GET /wallet/transactions', 'GET', f'{base}/wallet/transactions?per_page=20')
+
+def admin_dashboard(base, recorder, args, done):
+    session = requests.Session()
+    token = recorder.call(session, 'POST /admin/login', 'POST', f'{base}/admin/login', json={
+        'username': args.admin_username,
+        'password': args.admin_password
+    }).json()['access_token']
+    session.headers['Authorization'] = f'Bearer {token}'
+
+    while not done.is_set():
+        recorder.call(session, 'GET /admin/stats', 'GET', f'{base}/admin/stats')
+        recorder.call(session, 'GET /admin/transactions', 'GET', f'{base}/admin/transactions?per_page=50')
+        recorder.call(session, 'GET /admin/users', 'GET', f'{base}/admin/users?per_page=50')
+        done.wait(args.admin_interval)
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile"""
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+def summarize(recorder, elapsed):
+    endpoints = {}
+    for name, samples in sorted(recorder.samples.items()):
+        samples = sorted(samples)
+        endpoints[name] = {
+            'count': len(samples),
+            'errors': recorder.errors[name],
+            'shed': recorder.shed[name],
+            'rps': round(len(samples) / elapsed, 2),
+            'p50_ms': round(percentile(samples, 0.50) * 1000, 2),
+            'p95_ms': round(percentile(samples, 0.95) * 1000, 2),
+            'p99_ms': round(percentile(samples, 0.99) * 1000, 2)
+        }
+    total = sum(endpoint['count'] for endpoint in endpoints.values())
+    return {
+        'elapsed_seconds': round(elapsed, 2),
+        'total_requests': total,
+        'total_rps': round(total / elapsed, 2),
+        'endpoints': endpoints
+    }
+
+def print_report(results, baseline):
+    print(f"{'endpoint':<34}{'count':>7}{'err':>5}{'shed':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+          + ('   p95 vs baseline' if baseline else ''))
+    for name, endpoint in results['endpoints'].items():
+        line = (f"{name:<34}{endpoint['count']:>7}{endpoint['errors']:>5}{endpoint['shed']:>6}{endpoint['rps']:>9.1f}"
+                f"{endpoint['p50_ms']:>9.1f}{endpoint['p95_ms']:>9.1f}{endpoint['p99_ms']:>9.1f}")
+        previous = (baseline or {}).get('endpoints', {}).get(name)
+        if previous:
+            line += f"   {(endpoint['p95_ms'] / previous['p95_ms'] - 1) * 100:+6.0f}%"
+        print(line)
+    print(f"{results['total_requests']} requests in {results['elapsed_seconds']:.1f}s, "
+          f"{results['total_rps']:.1f} req/s overall")
+
+def regressions(results, baseline, tolerance):
+    found = []
+    for name, previous in baseline['endpoints'].items():
+        current = results['endpoints'].get(name)
+        if previous['count'] < MIN_COMPARED_SAMPLES:
+            continue
+        if current is None:
+            found.append(f'{name}: not exercised in this run')
+        elif current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            found.append(f"{name}: p95 {current['p95_ms']:.1f} ms vs {previous['p95_ms']:.1f} ms")
+    if results['total_rps'] < baseline['total_rps'] * (1 - tolerance):
+        found.append(f"overall: {results['total_rps']:.1f} req/s vs {baseline['total_rps']:.1f} req/s")
+    return found
+
+def start_server(port):
+    workdir = tempfile.mkdtemp()
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(port), workdir],
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, cwd=BACKEND_DIR)
+    while server.stdout.readline().strip() not in (b'ready', b''):
+        pass
+    if server.poll() is not None:
+        sys.exit('The load test server failed to start')
+    return server
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--serve':
+        return serve(int(sys.argv[2]), sys.argv[3])
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', help='API base URL of a running server (default: start one)')
+    parser.add_argument('--port', type=int, default=8098)
+    parser.add_argument('--users', type=int, default=40)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--payments', type=int, default=5, help='QRIS payments per user')
+    parser.add_argument('--admin-threads', type=int, default=1)
+    parser.add_argument('--admin-interval', type=float, default=0.2, help='seconds between dashboard refreshes')
+    parser.add_argument('--admin-username', default=os.getenv('ADMIN_USERNAME', 'admin'))
+    parser.add_argument('--admin-password', default=os.getenv('ADMIN_PASSWORD', 'admin123'))
+    parser.add_argument('--baseline', help='compare with this results file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown against the baseline')
+    parser.add_argument('--save-baseline', help='write the results to this file')
+    args = parser.parse_args()
+
+    server = None if args.url else start_server(args.port)
+    base = (args.url or f'http://127.0.0.1:{args.port}/api').rstrip('/')
+    recorder = Recorder()
+    run_id = secrets.token_hex(2).upper()
+
+    def run_user(number):
+        try:
+            user_journey(base, recorder, run_id, number, args)
+        except ScenarioError as e:
+            recorder.fail(f'user {number}: {e}')
+
+    try:
+        print(f"{args.users} users, {args.concurrency} at a time, {args.payments} payments each, "
+              f"{args.admin_threads} admin dashboards against {base}")
+        done = threading.Event()
+        started = time.perf_counter()
+
+        admins = ThreadPoolExecutor(max_workers=max(1, args.admin_threads))
+        admin_runs = [admins.submit(admin_dashboard, base, recorder, args, done) for _ in range(args.admin_threads)]
+        with ThreadPoolExecutor(max_workers=args.concurrency) as users:
+            list(users.map(run_user, range(args.users)))
+        done.set()
+        for run in admin_runs:
+            try:
+                run.result()
+            except ScenarioError as e:
+                recorder.fail(f'admin: {e}')
+        admins.shutdown()
+
+        elapsed = time.perf_counter() - started
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    results = summarize(recorder, elapsed)
+    results['options'] = {name: getattr(args, name) for name in ('users', 'concurrency', 'payments', 'admin_threads', 'admin_interval')}
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('options') != results['options']:
+            print(f"warning: baseline was recorded with {baseline.get('options')}")
+
+    print_report(results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Saved results to {args.save_baseline}")
+
+    problems = list(recorder.failures)
+    if baseline:
+        problems += regressions(results, baseline, args.tolerance)
+    for problem in problems:
+        print(f"FAIL {problem}")
+    return 1 if problems else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""Local stand-in for the provider APIs (Xendit, Privy, DOKU).
+
+Answers every path with a small JSON body. Behaviour is chosen per request
+with query parameters:
+
+    delay=<seconds>    sleep before answering
+    status=<code>      answer with this status code
+    fail=<n>&key=<k>   answer 503 to the first n requests carrying key k
+    drop=1             close the connection without answering
+
+GET /_stats returns the number of requests and TCP connections seen. Used
+by bench_http_client.py and by tests/test_http_client.py.
+
+    python benchmarks/provider_stub.py --port 8099
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import argparse
+import json
+import threading
+import time
+
+class StubState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.failures = {}
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so clients can reuse connections
+    disable_nagle_algorithm = True  # Headers and body go out in separate writes
+
+    def setup(self):
+        super().setup()
+        with self.server.state.lock:
+            self.server.state.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _handle(self):
+        state = self.server.state
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+
+        url = urlparse(self.path)
+        params = {name: values[0] for name, values in parse_qs(url.query).items()}
+
+        if url.path == '/_stats':
+            with state.lock:
+                return self._send(200, {'requests': state.requests, 'connections': state.connections})
+
+        with state.lock:
+            state.requests += 1
+
+        if params.get('drop'):
+            self.close_connection = True
+            self.connection.shutdown(2)
+            return
+
+        if 'delay' in params:
+            time.sleep(float(params['delay']))
+
+        if 'fail' in params:
+            key = params.get('key', url.path)
+            with state.lock:
+                seen = state.failures.get(key, 0)
+                state.failures[key] = seen + 1
+            if seen < int(params['fail']):
+                return self._send(503, {'error': 'Service unavailable', 'attempt': seen + 1})
+
+        status = int(params.get('status', 200))
+        self._send(status, {
+            'path': url.path,
+            'method': self.command,
+            'received_bytes': len(body),
+            'status': 'OK' if status < 400 else 'ERROR'
+        })
+
+    do_GET = _handle
+    do_POST = _handle
+    do_PUT = _handle
+    do_DELETE = _handle
+
+class StubServer:
+    """Runs the stub in a background thread; use as a context manager"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.httpd = ThreadingHTTPServer((host, port), StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = StubState()
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def state(self):
+        return self.httpd.state
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='provider-stub', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    args = parser.parse_args()
+
+    server = StubServer(args.host, args.port)
+    print(f"Provider stub listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
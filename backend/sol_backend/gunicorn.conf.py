@@ -0,0 +1,40 @@
+"""Gunicorn settings for the Sol backend.
+
+The app is imported once in the master (preload_app) and then forked, so
+workers share the imported code pages and start in milliseconds. Anything
+that must not cross a fork (DB connections, the bcrypt process pool,
+background threads) is created per worker in post_worker_init.
+
+    gunicorn -c gunicorn.conf.py src.wsgi:app
+"""
+import multiprocessing
+import os
+from src.config import Config
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', str(multiprocessing.cpu_count() * 2 + 1)))
+# Request threads, plus one for each status stream a worker may hold open
+threads = int(os.getenv('GUNICORN_THREADS', '4')) + Config.STATUS_STREAM_MAX_CONNECTIONS
+worker_class = 'gthread'
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then to bound memory growth
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+
+def post_worker_init(worker):
+    from src.main import start_background_services
+    from src.models.user import db
+
+    app = worker.wsgi
+    # Drop any connections inherited from the master; each worker opens its own
+    with app.app_context():
+        db.engine.dispose(close=False)
+    start_background_services(app)
@@ -0,0 +1,105 @@
+from flask import current_app
+from sqlalchemy import Index, MetaData, inspect
+from src.models.user import db, Admin
+from src.services import stats, webhooks
+from src.services.passwords import password_hasher
+
+def create_default_admin():
+    """Create a default admin user if none exists"""
+    if not Admin.query.first():
+        password_hash = password_hasher.hash(current_app.config['ADMIN_PASSWORD'])
+        admin = Admin(
+            username=current_app.config['ADMIN_USERNAME'],
+            password_hash=password_hash,
+            email=current_app.config['ADMIN_EMAIL']
+        )
+        db.session.add(admin)
+        db.session.commit()
+        print(f"Default admin created: username={admin.username}")
+
+def create_missing_indexes():
+    """Create model indexes that an existing database does not have yet.
+
+    create_all skips tables that already exist, so indexes added to a table
+    later (such as the Transaction keyset indexes) are only created here.
+    Returns the names of the indexes created.
+    """
+    inspector = inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in existing:
+                index.create(db.engine, checkfirst=True)
+                created.append(index.name)
+    return created
+
+# Indexes replaced by ones under a new name, per table. The keyset indexes
+# first sorted id ascending, which does not match ORDER BY created_at DESC, id DESC.
+SUPERSEDED_INDEXES = {
+    'transaction': (
+        'ix_transaction_user_id_created_at',
+        'ix_transaction_created_at',
+        'ix_transaction_status_created_at'
+    )
+}
+
+def drop_superseded_indexes():
+    """Drop indexes listed in SUPERSEDED_INDEXES that still exist. Returns their names."""
+    inspector = inspect(db.engine)
+    dropped = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in SUPERSEDED_INDEXES or not inspector.has_table(table.name):
+            continue
+        existing = {index['name']: index['column_names'] for index in inspector.get_indexes(table.name)}
+        # A copy of the table, so the old index is not added to the models' metadata
+        copy = table.to_metadata(MetaData())
+        for name in SUPERSEDED_INDEXES[table.name]:
+            if name in existing:
+                Index(name, *(copy.c[column] for column in existing[name])).drop(db.engine)
+                dropped.append(name)
+    return dropped
+
+def init_db():
+    """Create tables and missing indexes, seed the default admin and compute the dashboard counters"""
+    db.create_all()
+    for name in create_missing_indexes():
+        print(f"Created index {name}")
+    for name in drop_superseded_indexes():
+        print(f"Dropped index {name}")
+    create_default_admin()
+
+    # First run against an existing database: compute the dashboard counters once
+    if stats.ensure_counters():
+        stats.reconcile_counters()
+
+def register_commands(app):
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create the schema and seed the default admin (run once per deployment)"""
+        init_db()
+        print("Database initialized")
+
+    @app.cli.command('reconcile-stats')
+    def reconcile_stats_command():
+        """Recompute the admin dashboard counters and report drift"""
+        drift = stats.reconcile_counters()
+        if drift:
+            for name, difference in sorted(drift.items()):
+                print(f"{name}: stored value was off by {difference}")
+        else:
+            print("Stats counters are in sync")
+
+    @app.cli.command('sweep-webhooks')
+    def sweep_webhooks_command():
+        """Delete webhook dedupe records older than WEBHOOK_RETENTION_DAYS"""
+        removed = webhooks.sweep_events(app.config['WEBHOOK_RETENTION_DAYS'])
+        print(f"Removed {removed} webhook events")
+
+    @app.cli.command('requeue-webhooks')
+    def requeue_webhooks_command():
+        """Retry every dead-lettered webhook event"""
+        requeued = webhooks.requeue_dead()
+        print(f"Requeued {requeued} webhook events")
+        for status, count in sorted(webhooks.queue_depth().items()):
+            print(f"{status}: {count}")
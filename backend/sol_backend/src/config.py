@@ -0,0 +1,157 @@
+import os
+from src.utils.db import normalize_database_url
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class Config:
+    SECRET_KEY = os.getenv('SECRET_KEY', 'sol-mvp-secret-key-change-in-production')
+    JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'sol-mvp-jwt-secret-key-change-in-production')
+    JWT_ACCESS_TOKEN_EXPIRES = False  # For development, disable token expiration
+
+    # DATABASE_URL selects the database; SQLite is the development default
+    SQLALCHEMY_DATABASE_URI = normalize_database_url(
+        os.getenv('DATABASE_URL', f"sqlite:///{os.path.join(BASE_DIR, 'database', 'app.db')}")
+    )
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Connection pool (PostgreSQL); SQLALCHEMY_ENGINE_OPTIONS is built from these in create_app
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '10'))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', '5'))
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '5000'))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+
+    # Default admin created by `flask init-db`
+    ADMIN_USERNAME = os.getenv('ADMIN_USERNAME', 'admin')
+    ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'admin123')
+    ADMIN_EMAIL = os.getenv('ADMIN_EMAIL', 'admin@sol.com')
+
+    # bcrypt runs in a pool of BCRYPT_POOL_SIZE worker processes per server process (0 hashes
+    # on the request thread). At most BCRYPT_MAX_PENDING operations run or wait at once; beyond
+    # that, or after BCRYPT_TIMEOUT seconds, callers get 503. Stored hashes made with another
+    # work factor than BCRYPT_ROUNDS are upgraded on login
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+    BCRYPT_POOL_SIZE = int(os.getenv('BCRYPT_POOL_SIZE', str(os.cpu_count() or 1)))
+    BCRYPT_MAX_PENDING = int(os.getenv('BCRYPT_MAX_PENDING', str(max(BCRYPT_POOL_SIZE, 1) * 4)))
+    BCRYPT_TIMEOUT = float(os.getenv('BCRYPT_TIMEOUT', '5'))
+    BCRYPT_MP_CONTEXT = os.getenv('BCRYPT_MP_CONTEXT', 'fork')
+
+    # Periodically recompute the dashboard counters and report drift (0 disables)
+    STATS_RECONCILE_INTERVAL = int(os.getenv('STATS_RECONCILE_INTERVAL', '0'))
+
+    # Processed webhook events are kept this long to recognise redeliveries (sweep interval 0 disables)
+    WEBHOOK_RETENTION_DAYS = int(os.getenv('WEBHOOK_RETENTION_DAYS', '30'))
+    WEBHOOK_SWEEP_INTERVAL = int(os.getenv('WEBHOOK_SWEEP_INTERVAL', '3600'))
+
+    # Webhooks are acknowledged once stored and applied by a worker pool in every
+    # serving process (0 workers applies them inside the request instead)
+    WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '2'))
+    WEBHOOK_BATCH_SIZE = int(os.getenv('WEBHOOK_BATCH_SIZE', '50'))
+    WEBHOOK_POLL_INTERVAL = float(os.getenv('WEBHOOK_POLL_INTERVAL', '2'))
+    WEBHOOK_MAX_ATTEMPTS = int(os.getenv('WEBHOOK_MAX_ATTEMPTS', '8'))
+    WEBHOOK_RETRY_BACKOFF = float(os.getenv('WEBHOOK_RETRY_BACKOFF', '5'))
+    WEBHOOK_LEASE_SECONDS = int(os.getenv('WEBHOOK_LEASE_SECONDS', '60'))
+
+    # Per-user versions used as ETags by /wallet/balance and /auth/profile. In Redis they
+    # expire after USER_VERSION_TTL seconds without a change; without Redis every process
+    # derives them from the user's row and re-reads it after USER_VERSION_LOCAL_TTL seconds,
+    # which bounds how long a change made by another process can be answered with 304
+    USER_VERSION_TTL = int(os.getenv('USER_VERSION_TTL', '86400'))
+    USER_VERSION_LOCAL_TTL = float(os.getenv('USER_VERSION_LOCAL_TTL', '5'))
+
+    # Authenticated routes read the user through a per-process LRU of row snapshots, each
+    # served while the user's version above is unchanged and for at most USER_CACHE_TTL
+    # seconds (0 disables the cache)
+    USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '60'))
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))
+
+    # Server-sent status events (GET /api/status/stream). Every open stream holds a server
+    # thread; gunicorn.conf.py adds STATUS_STREAM_MAX_CONNECTIONS threads per worker for them
+    STATUS_STREAM_MAX_CONNECTIONS = int(os.getenv('STATUS_STREAM_MAX_CONNECTIONS', '32'))
+    STATUS_STREAM_HEARTBEAT = float(os.getenv('STATUS_STREAM_HEARTBEAT', '15'))
+    STATUS_STREAM_MAX_SECONDS = int(os.getenv('STATUS_STREAM_MAX_SECONDS', '600'))
+
+    # Request bodies larger than this are refused with 413 before they are read
+    MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', str(16 * 1024 * 1024)))
+
+    # KYC images uploaded as multipart files are streamed to UPLOAD_FOLDER/kyc/<user_id>/
+    # and deleted once the verification job has a final status
+    UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
+    KYC_MAX_IMAGE_BYTES = int(os.getenv('KYC_MAX_IMAGE_BYTES', str(5 * 1024 * 1024)))
+
+    # KYC verifications are queued and run by a worker pool in every serving process, the
+    # OCR, liveness and face match checks in parallel (0 workers runs them inside the
+    # request instead). KYC_PROVIDER is 'stub' (fixed local results) or 'privy'
+    KYC_PROVIDER = os.getenv('KYC_PROVIDER', 'stub')
+    KYC_WORKERS = int(os.getenv('KYC_WORKERS', '2'))
+    KYC_POLL_INTERVAL = float(os.getenv('KYC_POLL_INTERVAL', '2'))
+    KYC_MAX_ATTEMPTS = int(os.getenv('KYC_MAX_ATTEMPTS', '3'))
+    KYC_RETRY_BACKOFF = float(os.getenv('KYC_RETRY_BACKOFF', '10'))
+    KYC_LEASE_SECONDS = int(os.getenv('KYC_LEASE_SECONDS', '120'))
+
+    # Provider behind /wallet/topup and /wallet/qris-pay: 'doku' or 'xendit'. The /doku and
+    # /xendit routes always use their own provider
+    WALLET_PAYMENT_PROVIDER = os.getenv('WALLET_PAYMENT_PROVIDER', 'doku')
+
+    # Token-bucket rate limits per route class, as <count>/<second|minute|hour|day>. Login and
+    # registration are counted per client IP, the others per user; with REDIS_URL set the
+    # buckets are shared by every process, otherwise each process keeps its own. The auth
+    # routes (login, register, admin login) share one bucket per IP, so RATE_LIMIT_AUTH is
+    # the total across them; behind a proxy without PROXY_FIX_X_FOR every client has one IP
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    RATE_LIMIT_AUTH = os.getenv('RATE_LIMIT_AUTH', '5/minute')
+    RATE_LIMIT_KYC = os.getenv('RATE_LIMIT_KYC', '10/hour')
+    RATE_LIMIT_PAYMENT = os.getenv('RATE_LIMIT_PAYMENT', '30/minute')
+    RATE_LIMIT_WEBHOOK = os.getenv('RATE_LIMIT_WEBHOOK', '1000/minute')
+
+    # Proxies in front of the app whose X-Forwarded-For is trusted for the client IP (nginx: 1)
+    PROXY_FIX_X_FOR = int(os.getenv('PROXY_FIX_X_FOR', '0'))
+
+    # Logs go through a bounded queue to a writer thread, as one JSON object per line
+    # (LOG_FORMAT=text for plain lines), with passport and contact details redacted. Past
+    # LOG_SAMPLE_BURST per minute, a repeated INFO message is kept LOG_SAMPLE_RATE of the time
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    LOG_SAMPLE_BURST = int(os.getenv('LOG_SAMPLE_BURST', '100'))
+    LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '0.01'))
+
+    # GET /api/metrics serves Prometheus metrics: this process's, or with REDIS_URL every
+    # worker's on the host, which publish them every METRICS_PUBLISH_INTERVAL seconds. Set
+    # METRICS_TOKEN to require 'Authorization: Bearer <token>'. Server-Timing response headers
+    # break each request down into app, db, pool and provider time
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+    METRICS_PUBLISH_INTERVAL = float(os.getenv('METRICS_PUBLISH_INTERVAL', '15'))
+    SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'true').lower() == 'true'
+
+    # Optional shared Redis; features using it fall back to the database or process memory
+    REDIS_URL = os.getenv('REDIS_URL')
+
+    DEBUG = False
+    TESTING = False
+
+class DevelopmentConfig(Config):
+    DEBUG = True
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+
+class ProductionConfig(Config):
+    pass
+
+class TestingConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    WEBHOOK_WORKERS = 0
+    KYC_WORKERS = 0
+    KYC_PROVIDER = 'stub'
+    RATE_LIMIT_ENABLED = False
+    BCRYPT_ROUNDS = 4
+    BCRYPT_POOL_SIZE = 0
+
+config_by_name = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig
+}
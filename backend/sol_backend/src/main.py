@@ -3,98 +3,169 @@ import sys
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask, Response, request, send_from_directory
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
-from src.models.user import db, Admin
+from werkzeug.middleware.proxy_fix import ProxyFix
+from src.config import config_by_name
+from src.models.user import db
 from src.routes.auth import auth_bp
 from src.routes.wallet import wallet_bp
 from src.routes.admin import admin_bp
 from src.routes.webhooks import webhooks_bp
 from src.routes.privy import privy_bp
 from src.routes.xendit import xendit_bp
-from src.routes.doku import doku_bp
-import bcrypt
-
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-
-# Configuration
-app.config['SECRET_KEY'] = 'sol-mvp-secret-key-change-in-production'
-app.config['JWT_SECRET_KEY'] = 'sol-mvp-jwt-secret-key-change-in-production'
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = False  # For development, disable token expiration
-
-# Enable CORS for all routes
-CORS(app, origins="*")
-
-# Initialize JWT
-jwt = JWTManager(app)
-
-# Register blueprints
-app.register_blueprint(auth_bp, url_prefix='/api')
-app.register_blueprint(wallet_bp, url_prefix='/api')
-app.register_blueprint(admin_bp, url_prefix='/api')
-app.register_blueprint(webhooks_bp, url_prefix='/api')
-app.register_blueprint(privy_bp, url_prefix='/api')
-app.register_blueprint(xendit_bp, url_prefix='/api')
-app.register_blueprint(doku_bp, url_prefix='/api')
-
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-
-def create_default_admin():
-    """Create a default admin user if none exists"""
-    with app.app_context():
-        if not Admin.query.first():
-            password_hash = bcrypt.hashpw('admin123'.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
-            admin = Admin(
-                username='admin',
-                password_hash=password_hash,
-                email='admin@sol.com'
-            )
-            db.session.add(admin)
-            db.session.commit()
-            print("Default admin created: username=admin, password=admin123")
-
-# Initialize database and create tables
-with app.app_context():
-    db.create_all()
-    create_default_admin()
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-        return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
+from src.routes.doku import doku_bp, get_token_manager
+from src.routes.status import status_bp
+from src.utils.query_stats import init_query_stats
+from src.utils import metrics
+from src.utils.redis_client import get_redis
+from src.utils.logging_setup import configure_logging, start_log_writer
+from src.utils.db import engine_options, pool_connections, pool_status
+from src.services import kyc_jobs, stats, webhooks
+from src.services.passwords import password_hasher
+from src.cli import init_db, register_commands
+
+def create_app(config=None):
+    """Build a configured Flask app.
+
+    config may be a name from config_by_name, a config class, or a dict of
+    overrides applied on top of the SOL_CONFIG environment (default
+    development). Nothing here touches the database; run `flask init-db`
+    once per deployment to create the schema and the default admin.
+    """
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+
+    # Configuration
+    overrides = config if isinstance(config, dict) else {}
+    if config is None or isinstance(config, dict):
+        config = os.getenv('SOL_CONFIG', 'development')
+    if isinstance(config, str):
+        config = config_by_name[config]
+    app.config.from_object(config)
+    app.config.update(overrides)
+
+    # Structured, redacted logging written from a background thread
+    configure_logging(app.config)
+
+    # bcrypt work factor and pool limits (BCRYPT_*)
+    password_hasher.configure(app.config)
+
+    # Client IPs (rate limiting) come from X-Forwarded-For only when set by a trusted proxy
+    if app.config['PROXY_FIX_X_FOR'] > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
+
+    # Enable CORS for all routes
+    CORS(app, origins="*")
+
+    # Initialize JWT
+    JWTManager(app)
+
+    # Count SQL queries per request (X-Query-Count / X-Query-Time-Ms headers)
+    init_query_stats(app)
+
+    # Per-route latency histograms and Server-Timing headers
+    metrics.init_metrics(app)
+
+    # Register blueprints
+    app.register_blueprint(auth_bp, url_prefix='/api')
+    app.register_blueprint(wallet_bp, url_prefix='/api')
+    app.register_blueprint(admin_bp, url_prefix='/api')
+    app.register_blueprint(webhooks_bp, url_prefix='/api')
+    app.register_blueprint(privy_bp, url_prefix='/api')
+    app.register_blueprint(xendit_bp, url_prefix='/api')
+    app.register_blueprint(doku_bp, url_prefix='/api')
+    app.register_blueprint(status_bp, url_prefix='/api')
+
+    # Database configuration
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
+    db.init_app(app)
+
+    register_commands(app)
+    register_core_routes(app)
+
+    return app
+
+def start_background_services(app):
+    """Start per-process pools and background threads.
+
+    Called once in every serving process: by the gunicorn post_worker_init
+    hook after the fork, or directly by the development server below.
+    """
+    # Fork the bcrypt workers before any other thread exists in this process
+    password_hasher.warm_up()
+
+    start_log_writer()
+
+    if app.config['STATS_RECONCILE_INTERVAL'] > 0:
+        stats.start_reconciler(app, app.config['STATS_RECONCILE_INTERVAL'])
+
+    if app.config['WEBHOOK_WORKERS'] > 0:
+        webhooks.start_workers(app)
+
+    if app.config['WEBHOOK_SWEEP_INTERVAL'] > 0:
+        webhooks.start_sweeper(app, app.config['WEBHOOK_SWEEP_INTERVAL'], app.config['WEBHOOK_RETENTION_DAYS'])
+
+    if app.config['KYC_WORKERS'] > 0:
+        kyc_jobs.start_workers(app)
+
+    redis_client = get_redis(app.config['REDIS_URL'])
+    if redis_client is not None and app.config['METRICS_PUBLISH_INTERVAL'] > 0:
+        metrics.start_publisher(app, redis_client, app.config['METRICS_PUBLISH_INTERVAL'])
+
+def register_core_routes(app):
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        static_folder_path = app.static_folder
+        if static_folder_path is None:
+            return "Static folder not configured", 404
+
+        if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
+            return send_from_directory(static_folder_path, path)
         else:
-            return "Sol MVP API Server is running", 200
-
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    return {
-        'status': 'healthy',
-        'service': 'Sol MVP API',
-        'version': '1.0.0'
-    }, 200
-
-# Error handlers
-@app.errorhandler(404)
-def not_found(error):
-    return {'error': 'Endpoint not found'}, 404
-
-@app.errorhandler(500)
-def internal_error(error):
-    return {'error': 'Internal server error'}, 500
+            index_path = os.path.join(static_folder_path, 'index.html')
+            if os.path.exists(index_path):
+                return send_from_directory(static_folder_path, 'index.html')
+            else:
+                return "Sol MVP API Server is running", 200
+
+    @app.route('/api/health', methods=['GET'])
+    def health_check():
+        return {
+            'status': 'healthy',
+            'service': 'Sol MVP API',
+            'version': '1.0.0',
+            'database': pool_status(db.engine),
+            'doku_token': get_token_manager().metrics()
+        }, 200
+
+    metrics.registry.gauge(
+        'sol_db_pool_connections', 'Database pool connections by state', ('state',),
+        lambda: pool_connections(db.engine))
+
+    @app.route('/api/metrics', methods=['GET'])
+    def prometheus_metrics():
+        token = app.config['METRICS_TOKEN']
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return {'error': 'Unauthorized'}, 401
+        ttl = int(max(app.config['METRICS_PUBLISH_INTERVAL'], 15) * 4)
+        snapshot = metrics.collect(get_redis(app.config['REDIS_URL']), ttl)
+        return Response(metrics.render(snapshot), content_type=metrics.CONTENT_TYPE)
+
+    # Error handlers
+    @app.errorhandler(404)
+    def not_found(error):
+        return {'error': 'Endpoint not found'}, 404
+
+    @app.errorhandler(500)
+    def internal_error(error):
+        return {'error': 'Internal server error'}, 500
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
-
+    # Development server: single process, creates the schema on start for convenience
+    app = create_app('development')
+    with app.app_context():
+        init_db()
+    start_background_services(app)
+    app.run(host='0.0.0.0', port=5000, debug=app.config['DEBUG'])
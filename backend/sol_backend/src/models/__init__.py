@@ -0,0 +1,9 @@
+# Importing any model module loads them all, so every table is registered with
+# db.metadata before create_all, whichever module the app happens to import first
+from src.models.user import db, User, Transaction, Admin
+from src.models.ledger import LedgerEntry
+from src.models.stats import StatCounter
+from src.models.webhook import WebhookEvent
+from src.models.kyc import KycJob
+
+__all__ = ['db', 'User', 'Transaction', 'Admin', 'LedgerEntry', 'StatCounter', 'WebhookEvent', 'KycJob']
@@ -0,0 +1,72 @@
+from src.models.user import db
+from datetime import datetime
+import uuid
+
+# The independent checks of a verification, each stored in its own <name>_result column
+KYC_CHECKS = ('ocr', 'liveness', 'face_match')
+
+class KycJob(db.Model):
+    """A passport + selfie verification: the work queue entry and the per-check results"""
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))  # The kyc_id
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='QUEUED')  # QUEUED, RUNNING, APPROVED, REJECTED, FAILED
+    passport_image = db.Column(db.String(500), nullable=False)  # Path of the stored upload
+    selfie_image = db.Column(db.String(500), nullable=False)
+    ocr_result = db.Column(db.JSON, nullable=True)
+    liveness_result = db.Column(db.JSON, nullable=True)
+    face_match_result = db.Column(db.JSON, nullable=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_by = db.Column(db.String(36), nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_kyc_job_status_next_attempt_at', 'status', 'next_attempt_at'),
+        db.Index('ix_kyc_job_user_id_created_at', 'user_id', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<KycJob {self.id}>'
+
+    def results(self):
+        return {check: getattr(self, f'{check}_result') for check in KYC_CHECKS}
+
+    def to_dict(self):
+        results = self.results()
+        data = {
+            'kyc_id': self.id,
+            'user_id': self.user_id,
+            'status': self.status,
+            'progress': {
+                'completed': sum(1 for result in results.values() if result is not None),
+                'total': len(KYC_CHECKS),
+                'checks': {check: 'DONE' if result is not None else 'PENDING' for check, result in results.items()}
+            },
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+        if self.status == 'FAILED':
+            data['error'] = self.last_error
+
+        ocr, liveness, face_match = results['ocr'], results['liveness'], results['face_match']
+        if ocr is not None:
+            data['ocr_data'] = {
+                'passport_number': ocr.get('passport_number'),
+                'full_name': ocr.get('full_name'),
+                'nationality': ocr.get('nationality'),
+                'date_of_birth': ocr.get('date_of_birth')
+            }
+        if None not in (ocr, liveness, face_match):
+            data['verification_scores'] = {
+                'ocr_confidence': ocr['confidence_score'],
+                'liveness_confidence': liveness['confidence_score'],
+                'face_match_confidence': face_match['confidence_score']
+            }
+        return data
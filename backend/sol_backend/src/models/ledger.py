@@ -0,0 +1,31 @@
+from src.models.user import db
+from datetime import datetime
+import uuid
+
+class LedgerEntry(db.Model):
+    """Append-only record of every change to a user's wallet balance"""
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
+    transaction_id = db.Column(db.String(36), db.ForeignKey('transaction.id'), nullable=True)
+    entry_type = db.Column(db.String(20), nullable=False)  # TOPUP, QRIS_PAYMENT, REFUND
+    amount = db.Column(db.Numeric(10, 2), nullable=False)  # Signed: credits > 0, debits < 0
+    balance_after = db.Column(db.Numeric(10, 2), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_ledger_entry_user_id_created_at', 'user_id', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<LedgerEntry {self.id}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'transaction_id': self.transaction_id,
+            'entry_type': self.entry_type,
+            'amount': float(self.amount),
+            'balance_after': float(self.balance_after),
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
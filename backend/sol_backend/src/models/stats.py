@@ -0,0 +1,12 @@
+from src.models.user import db
+from datetime import datetime
+
+class StatCounter(db.Model):
+    """Running total for the admin dashboard, split into slots to spread write contention"""
+    name = db.Column(db.String(64), primary_key=True)
+    slot = db.Column(db.Integer, primary_key=True, default=0)
+    value = db.Column(db.Numeric(18, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StatCounter {self.name}[{self.slot}]>'
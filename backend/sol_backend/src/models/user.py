@@ -47,6 +47,15 @@ class Transaction(db.Model):
 
     user = db.relationship('User', backref=db.backref('transactions', lazy=True))
 
+    # Composite indexes backing keyset pagination on (created_at DESC, id DESC),
+    # plus provider reference lookups from payment notifications
+    __table_args__ = (
+        db.Index('ix_transaction_user_id_created_at_id', user_id, created_at.desc(), id.desc()),
+        db.Index('ix_transaction_created_at_id', created_at.desc(), id.desc()),
+        db.Index('ix_transaction_status_created_at_id', status, created_at.desc(), id.desc()),
+        db.Index('ix_transaction_xendit_transaction_id', xendit_transaction_id),
+    )
+
     def __repr__(self):
         return f'<Transaction {self.id}>'
 
@@ -0,0 +1,41 @@
+from src.models.user import db
+from datetime import datetime
+import uuid
+
+class WebhookEvent(db.Model):
+    """A provider notification: the dedupe record and the work queue entry for processing it"""
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    provider = db.Column(db.String(20), nullable=False)  # xendit, privy
+    event_id = db.Column(db.String(255), nullable=False)
+    payload = db.Column(db.JSON, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='RECEIVED')  # RECEIVED, PROCESSING, DONE, DEAD
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_by = db.Column(db.String(36), nullable=True)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+    response_status = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.JSON, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('provider', 'event_id', name='uq_webhook_event_provider_event_id'),
+        db.Index('ix_webhook_event_status_next_attempt_at', 'status', 'next_attempt_at'),
+        db.Index('ix_webhook_event_created_at', 'created_at'),
+    )
+
+    def __repr__(self):
+        return f'<WebhookEvent {self.provider}:{self.event_id}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'provider': self.provider,
+            'event_id': self.event_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'processed_at': self.processed_at.isoformat() if self.processed_at else None
+        }
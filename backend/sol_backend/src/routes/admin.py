@@ -1,12 +1,31 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from src.models.user import User, Transaction, Admin, db
-import bcrypt
+from src.models.webhook import WebhookEvent
+from src.services.ledger import credit
+from src.services import stats
+from src.services.webhooks import queue_depth, requeue_dead
+from src.services.settlement import settle, summarize, SettlementError
+from src.services.exports import (
+    ExportError, FORMATS, TRANSACTION_COLUMNS, USER_COLUMNS,
+    parse_date_range, parse_format, stream_export, transactions_statement, users_statement
+)
+from src.services.passwords import password_hasher, HasherBusyError
+from src.services.rate_limits import rate_limit
+from src.routes.auth import hasher_busy_response
+from src.utils.pagination import keyset_paginate_rows, offset_paginate_rows, count_rows, clamp_page_size, InvalidCursorError
+from src.utils.projection import Projection, as_float, json_response
+from src.utils.query_stats import query_budget
+from datetime import datetime
 from decimal import Decimal
+import logging
 
 admin_bp = Blueprint('admin', __name__)
 
+logger = logging.getLogger(__name__)
+
 @admin_bp.route('/admin/login', methods=['POST'])
+@rate_limit('auth', by='ip')
 def admin_login():
     try:
         data = request.get_json()
@@ -22,8 +41,19 @@ def admin_login():
             return jsonify({'error': 'Invalid username or password'}), 401
         
         # Check password
-        if not bcrypt.checkpw(data['password'].encode('utf-8'), admin.password_hash.encode('utf-8')):
-            return jsonify({'error': 'Invalid username or password'}), 401
+        try:
+            if not password_hasher.verify(data['password'], admin.password_hash):
+                return jsonify({'error': 'Invalid username or password'}), 401
+        except HasherBusyError:
+            return hasher_busy_response()
+        
+        # Upgrade the stored hash when the configured work factor has changed
+        if password_hasher.needs_rehash(admin.password_hash):
+            try:
+                admin.password_hash = password_hasher.hash(data['password'])
+                db.session.commit()
+            except HasherBusyError:
+                logger.info("Skipped password rehash for admin %s: hasher busy", admin.id)
         
         # Create access token with admin identity
         access_token = create_access_token(identity=f"admin:{admin.id}")
@@ -50,8 +80,32 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+USER_PROJECTION = Projection(
+    ('user_id', User.id),
+    ('full_name', User.full_name),
+    ('email', User.email),
+    ('passport_number', User.passport_number),
+    ('kyc_status', User.kyc_status),
+    ('wallet_balance', as_float(User.wallet_balance)),
+    ('created_at', User.created_at)
+)
+
+# The user name comes from an outer join in the same SELECT, never one query per row
+TRANSACTION_PROJECTION = Projection(
+    ('transaction_id', Transaction.id),
+    ('user_id', Transaction.user_id),
+    ('user_name', User.full_name),
+    ('type', Transaction.type),
+    ('amount', as_float(Transaction.amount)),
+    ('currency', Transaction.currency),
+    ('status', Transaction.status),
+    ('description', Transaction.description),
+    ('created_at', Transaction.created_at)
+)
+
 @admin_bp.route('/admin/users', methods=['GET'])
 @admin_required
+@query_budget(2)
 def get_all_users():
     try:
         # Get query parameters for pagination and filtering
@@ -60,38 +114,29 @@ def get_all_users():
         kyc_status = request.args.get('kyc_status')
         
         # Build query
-        query = User.query
+        statement = USER_PROJECTION.select()
         
         if kyc_status:
-            query = query.filter_by(kyc_status=kyc_status)
+            statement = statement.where(User.kyc_status == kyc_status)
         
         # Apply pagination
-        users = query.order_by(User.created_at.desc())\
-            .paginate(page=page, per_page=per_page, error_out=False)
+        rows, total, pages = offset_paginate_rows(
+            db.session, statement.order_by(User.created_at.desc()), page, per_page
+        )
         
-        return jsonify({
-            'users': [
-                {
-                    'user_id': user.id,
-                    'full_name': user.full_name,
-                    'email': user.email,
-                    'passport_number': user.passport_number,
-                    'kyc_status': user.kyc_status,
-                    'wallet_balance': float(user.wallet_balance),
-                    'created_at': user.created_at.isoformat() if user.created_at else None
-                }
-                for user in users.items
-            ],
-            'total': users.total,
-            'pages': users.pages,
+        return json_response({
+            'users': USER_PROJECTION.serialize(rows),
+            'total': total,
+            'pages': pages,
             'current_page': page
-        }), 200
+        })
         
     except Exception as e:
         return jsonify({'error': 'Failed to get users', 'details': str(e)}), 500
 
 @admin_bp.route('/admin/transactions', methods=['GET'])
 @admin_required
+@query_budget(2)
 def get_all_transactions():
     try:
         # Get query parameters for pagination and filtering
@@ -101,41 +146,101 @@ def get_all_transactions():
         status = request.args.get('status')
         
         # Build query
-        query = Transaction.query
+        statement = TRANSACTION_PROJECTION.select()\
+            .select_from(Transaction)\
+            .outerjoin(User, User.id == Transaction.user_id)
         
         if transaction_type:
-            query = query.filter_by(type=transaction_type)
+            statement = statement.where(Transaction.type == transaction_type)
         
         if status:
-            query = query.filter_by(status=status)
+            statement = statement.where(Transaction.status == status)
+        
+        # Keyset pagination: opaque cursor, no OFFSET and no COUNT(*) unless asked for
+        cursor = request.args.get('cursor')
+        if cursor is not None:
+            try:
+                rows, next_cursor = keyset_paginate_rows(db.session, statement, Transaction, cursor, clamp_page_size(per_page))
+            except InvalidCursorError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            
+            response = {
+                'transactions': TRANSACTION_PROJECTION.serialize(rows),
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            }
+            if request.args.get('include_total', 'false').lower() == 'true':
+                response['total'] = count_rows(db.session, statement)
+            
+            return json_response(response)
         
         # Apply pagination
-        transactions = query.order_by(Transaction.created_at.desc())\
-            .paginate(page=page, per_page=per_page, error_out=False)
+        rows, total, pages = offset_paginate_rows(
+            db.session, statement.order_by(Transaction.created_at.desc()), page, per_page
+        )
         
-        return jsonify({
-            'transactions': [
-                {
-                    'transaction_id': transaction.id,
-                    'user_id': transaction.user_id,
-                    'user_name': transaction.user.full_name if transaction.user else None,
-                    'type': transaction.type,
-                    'amount': float(transaction.amount),
-                    'currency': transaction.currency,
-                    'status': transaction.status,
-                    'description': transaction.description,
-                    'created_at': transaction.created_at.isoformat() if transaction.created_at else None
-                }
-                for transaction in transactions.items
-            ],
-            'total': transactions.total,
-            'pages': transactions.pages,
+        return json_response({
+            'transactions': TRANSACTION_PROJECTION.serialize(rows),
+            'total': total,
+            'pages': pages,
             'current_page': page
-        }), 200
+        })
         
     except Exception as e:
         return jsonify({'error': 'Failed to get transactions', 'details': str(e)}), 500
 
+def export_response(statement, columns, fmt, name):
+    """Stream an export as a chunked attachment; nothing is buffered beyond one batch"""
+    filename = f"{name}-{datetime.utcnow().strftime('%Y%m%dT%H%M%SZ')}.{fmt}"
+    return Response(
+        stream_with_context(stream_export(statement, columns, fmt)),
+        mimetype=FORMATS[fmt],
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@admin_bp.route('/admin/transactions/export', methods=['GET'])
+@admin_required
+def export_transactions():
+    """All matching transactions as CSV or NDJSON (?format=), newest first.
+
+    Takes the filters of /admin/transactions (type, status) plus user_id and
+    a created_at range (from, to).
+    """
+    try:
+        fmt = parse_format(request.args.get('format'))
+        start, end = parse_date_range(request.args)
+    except ExportError as e:
+        return jsonify({'error': str(e)}), 400
+
+    statement = transactions_statement(
+        transaction_type=request.args.get('type'),
+        status=request.args.get('status'),
+        user_id=request.args.get('user_id'),
+        start=start,
+        end=end
+    )
+    return export_response(statement, TRANSACTION_COLUMNS, fmt, 'transactions')
+
+@admin_bp.route('/admin/users/export', methods=['GET'])
+@admin_required
+def export_users():
+    """All matching users as CSV or NDJSON (?format=), newest first.
+
+    Takes the kyc_status filter of /admin/users plus a created_at range
+    (from, to).
+    """
+    try:
+        fmt = parse_format(request.args.get('format'))
+        start, end = parse_date_range(request.args)
+    except ExportError as e:
+        return jsonify({'error': str(e)}), 400
+
+    statement = users_statement(kyc_status=request.args.get('kyc_status'), start=start, end=end)
+    return export_response(statement, USER_COLUMNS, fmt, 'users')
+
 @admin_bp.route('/admin/refund', methods=['POST'])
 @admin_required
 def process_refund():
@@ -171,47 +276,108 @@ def process_refund():
             description=f"Refund for transaction {original_transaction.id}"
         )
         
+        db.session.add(refund_transaction)
+        db.session.flush()
+        
         # Update user wallet balance
-        user.wallet_balance += refund_amount
+        new_balance = credit(user.id, refund_amount, 'REFUND', transaction_id=refund_transaction.id)
         
-        db.session.add(refund_transaction)
         db.session.commit()
         
         return jsonify({
             'message': 'Refund processed successfully',
             'refund_transaction_id': refund_transaction.id,
             'amount': float(refund_amount),
-            'user_new_balance': float(user.wallet_balance)
+            'user_new_balance': float(new_balance)
         }), 200
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to process refund', 'details': str(e)}), 500
 
+@admin_bp.route('/admin/settlements/bulk', methods=['POST'])
+@admin_required
+@query_budget(12)
+def bulk_settle():
+    try:
+        data = request.get_json()
+        notifications = data.get('notifications') if isinstance(data, dict) else None
+        
+        if not isinstance(notifications, list) or not notifications:
+            return jsonify({'error': 'notifications must be a non-empty list'}), 400
+        
+        # All outcomes are committed together; a failure leaves every transaction untouched
+        results, balances = settle(notifications)
+        db.session.commit()
+        
+        return jsonify({
+            'results': results,
+            'summary': summarize(results),
+            'credited_users': len(balances)
+        }), 200
+        
+    except SettlementError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to settle notifications', 'details': str(e)}), 500
+
 @admin_bp.route('/admin/stats', methods=['GET'])
 @admin_required
+@query_budget(1)
 def get_dashboard_stats():
     try:
-        # Get basic statistics
-        total_users = User.query.count()
-        approved_users = User.query.filter_by(kyc_status='APPROVED').count()
-        pending_kyc = User.query.filter_by(kyc_status='PENDING').count()
+        # Counters are maintained in the same DB transaction as the changes they count
+        counters = stats.read_counters()
         
-        total_transactions = Transaction.query.count()
-        successful_transactions = Transaction.query.filter_by(status='SUCCESS').count()
-        
-        # Get total wallet balance across all users
-        total_wallet_balance = db.session.query(db.func.sum(User.wallet_balance)).scalar() or 0
+        def count(name):
+            return int(counters.get(name, 0))
         
         return jsonify({
-            'total_users': total_users,
-            'approved_users': approved_users,
-            'pending_kyc': pending_kyc,
-            'total_transactions': total_transactions,
-            'successful_transactions': successful_transactions,
-            'total_wallet_balance': float(total_wallet_balance)
+            'total_users': count(stats.USERS_TOTAL),
+            'approved_users': count(stats.kyc_counter('APPROVED')),
+            'pending_kyc': count(stats.kyc_counter('PENDING')),
+            'total_transactions': count(stats.TRANSACTIONS_TOTAL),
+            'successful_transactions': count(stats.transaction_status_counter('SUCCESS')),
+            'total_wallet_balance': float(counters.get(stats.WALLET_BALANCE_TOTAL, 0))
         }), 200
         
     except Exception as e:
         return jsonify({'error': 'Failed to get dashboard stats', 'details': str(e)}), 500
 
+@admin_bp.route('/admin/webhooks', methods=['GET'])
+@admin_required
+def get_webhook_events():
+    try:
+        status = request.args.get('status', 'DEAD')
+        limit = clamp_page_size(request.args.get('limit', 50, type=int))
+        
+        events = WebhookEvent.query.filter_by(status=status)\
+            .order_by(WebhookEvent.created_at.desc())\
+            .limit(limit).all()
+        
+        return jsonify({
+            'events': [event.to_dict() for event in events],
+            'queue': queue_depth()
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to get webhook events', 'details': str(e)}), 500
+
+@admin_bp.route('/admin/webhooks/requeue', methods=['POST'])
+@admin_required
+def requeue_webhook_events():
+    try:
+        data = request.get_json(silent=True) or {}
+        
+        # Without event_ids every dead-lettered event is retried
+        requeued = requeue_dead(data.get('event_ids'))
+        
+        return jsonify({
+            'message': 'Webhook events requeued',
+            'requeued': requeued
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to requeue webhook events', 'details': str(e)}), 500
@@ -1,11 +1,20 @@
 from flask import Blueprint, jsonify, request
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, jwt_required
 from src.models.user import User, db
-import bcrypt
+from src.services.passwords import password_hasher, HasherBusyError
+from src.services.rate_limits import rate_limit
+from src.services.user_cache import current_user
+from src.services.user_versions import conditional_on_user_version
+import logging
 import re
 
 auth_bp = Blueprint('auth', __name__)
 
+logger = logging.getLogger(__name__)
+
+def hasher_busy_response():
+    return jsonify({'error': 'Server is busy, please retry shortly'}), 503, {'Retry-After': '1'}
+
 def validate_email(email):
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return re.match(pattern, email) is not None
@@ -16,6 +25,7 @@ def validate_passport_number(passport_number):
     return re.match(pattern, passport_number.upper()) is not None
 
 @auth_bp.route('/auth/register', methods=['POST'])
+@rate_limit('auth', by='ip')
 def register():
     try:
         data = request.get_json()
@@ -43,8 +53,11 @@ def register():
         if existing_user:
             return jsonify({'error': 'User with this email or passport number already exists'}), 409
         
-        # Hash password
-        password_hash = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        # Hash password (off the request thread, in the bcrypt pool)
+        try:
+            password_hash = password_hasher.hash(data['password'])
+        except HasherBusyError:
+            return hasher_busy_response()
         
         # Create new user
         user = User(
@@ -74,6 +87,7 @@ def register():
         return jsonify({'error': 'Registration failed', 'details': str(e)}), 500
 
 @auth_bp.route('/auth/login', methods=['POST'])
+@rate_limit('auth', by='ip')
 def login():
     try:
         data = request.get_json()
@@ -89,8 +103,19 @@ def login():
             return jsonify({'error': 'Invalid email or password'}), 401
         
         # Check password
-        if not bcrypt.checkpw(data['password'].encode('utf-8'), user.password_hash.encode('utf-8')):
-            return jsonify({'error': 'Invalid email or password'}), 401
+        try:
+            if not password_hasher.verify(data['password'], user.password_hash):
+                return jsonify({'error': 'Invalid email or password'}), 401
+        except HasherBusyError:
+            return hasher_busy_response()
+        
+        # Upgrade the stored hash when the configured work factor has changed
+        if password_hasher.needs_rehash(user.password_hash):
+            try:
+                user.password_hash = password_hasher.hash(data['password'])
+                db.session.commit()
+            except HasherBusyError:
+                logger.info("Skipped password rehash for user %s: hasher busy", user.id)
         
         # Create access token
         access_token = create_access_token(identity=user.id)
@@ -107,10 +132,10 @@ def login():
 
 @auth_bp.route('/auth/profile', methods=['GET'])
 @jwt_required()
+@conditional_on_user_version
 def get_profile():
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -1,22 +1,28 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models.user import User, Transaction, db
+from src.models.user import Transaction, db
+from src.services.ledger import debit, InsufficientFundsError
+from src.services.rate_limits import rate_limit
+from src.services.user_cache import current_user, kyc_required
+from src.services.settlement import settle
+from src.services.payments import payment_service
+from src.services.http_client import ProviderClient
+from src.services.doku_signing import DokuRequestSigner, canonical_body
+from src.services.token_cache import FileTokenStore, RedisTokenStore, TokenCache
+from src.utils.metrics import timed_call
+from src.utils.redis_client import get_redis
 import base64
 import uuid
-import requests
 import os
 import logging
-import hashlib
-import hmac
-import json
-from datetime import datetime, timezone
+import tempfile
+import threading
+from datetime import datetime
 from decimal import Decimal
 import time
 
 doku_bp = Blueprint('doku', __name__)
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # DOKU API configuration
@@ -26,19 +32,29 @@ DOKU_CLIENT_SECRET = os.getenv('DOKU_CLIENT_SECRET', 'mock-doku-client-secret')
 DOKU_MERCHANT_ID = os.getenv('DOKU_MERCHANT_ID', '2997')
 DOKU_TERMINAL_ID = os.getenv('DOKU_TERMINAL_ID', 'K45')
 
-# In-memory token storage (in production, use Redis or database)
-_token_cache = {
-    'access_token': None,
-    'expires_at': 0
-}
+# Mock responses unless real SNAP calls are switched on
+DOKU_MOCK_API = os.getenv('DOKU_MOCK_API', 'true').lower() == 'true'
+
+# Shared keep-alive client (connection pool, timeouts, retries, circuit breaker)
+doku_client = ProviderClient('DOKU', DOKU_API_BASE_URL)
+
+# Signs SNAP requests with a pre-keyed HMAC; the signed body bytes are the ones sent
+doku_signer = DokuRequestSigner(DOKU_CLIENT_ID, DOKU_CLIENT_SECRET)
+
+# Access tokens are shared by all workers through Redis (REDIS_URL) or, without it, a file on this host
+DOKU_TOKEN_FILE = os.getenv('DOKU_TOKEN_FILE', os.path.join(tempfile.gettempdir(), f'sol-doku-token-{DOKU_CLIENT_ID}.json'))
+DOKU_TOKEN_REFRESH_AHEAD = int(os.getenv('DOKU_TOKEN_REFRESH_AHEAD', '60'))
+
+_token_manager = None
+_token_manager_lock = threading.Lock()
 
 def get_current_timestamp():
     """Get current timestamp in ISO8601 format"""
-    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S+00:00')
+    return doku_signer.timestamp()
 
 def generate_external_id():
     """Generate unique external ID for requests"""
-    return str(int(time.time() * 1000000))
+    return doku_signer.external_id()
 
 def generate_asymmetric_signature(client_id, timestamp):
     """Generate asymmetric signature for Get Token API"""
@@ -50,34 +66,11 @@ def generate_asymmetric_signature(client_id, timestamp):
 
 def generate_symmetric_signature(method, endpoint, access_token, request_body, timestamp):
     """Generate symmetric signature for API requests"""
-    # Minify request body
-    minified_body = json.dumps(request_body, separators=(',', ':')) if request_body else ""
-    
-    # Generate SHA-256 hash of request body
-    body_hash = hashlib.sha256(minified_body.encode()).hexdigest().lower()
-    
-    # Create string to sign
-    string_to_sign = f"{method}:{endpoint}:{access_token}:{body_hash}:{timestamp}"
-    
-    # Generate HMAC-SHA512 signature
-    signature = hmac.new(
-        DOKU_CLIENT_SECRET.encode(),
-        string_to_sign.encode(),
-        hashlib.sha512
-    ).digest()
-    
-    return base64.b64encode(signature).decode()
+    return doku_signer.signature(method, endpoint, access_token, canonical_body(request_body), timestamp)
 
-def get_access_token():
-    """Get access token from DOKU API"""
-    global _token_cache
-    
-    # Check if token is still valid
-    current_time = time.time()
-    if _token_cache['access_token'] and current_time < _token_cache['expires_at']:
-        return _token_cache['access_token']
-    
-    # Get new token
+@timed_call('DOKU', 'access_token')
+def fetch_access_token():
+    """Request a new access token from DOKU. Returns (token, lifetime in seconds)."""
     timestamp = get_current_timestamp()
     external_id = generate_external_id()
     
@@ -96,24 +89,54 @@ def get_access_token():
         # For MVP, return mock token
         # In production, make actual API call to DOKU
         mock_token = f"mock_token_{int(time.time())}"
-        _token_cache['access_token'] = mock_token
-        _token_cache['expires_at'] = current_time + 900  # 15 minutes
         
-        logger.info(f"Generated new DOKU access token: {mock_token[:20]}...")
-        return mock_token
+        logger.info("Generated new DOKU access token")
+        return mock_token, 900  # 15 minutes
         
     except Exception as e:
-        logger.error(f"Failed to get DOKU access token: {str(e)}")
+        logger.error("Failed to get DOKU access token: %s", e)
         raise Exception(f"DOKU authentication failed: {str(e)}")
 
+def get_token_manager():
+    """The process-wide DOKU token cache, created on first use"""
+    global _token_manager
+    with _token_manager_lock:
+        if _token_manager is None:
+            client = get_redis(current_app.config.get('REDIS_URL'))
+            if client is not None:
+                store = RedisTokenStore(client, f'sol:doku:access_token:{DOKU_CLIENT_ID}')
+            else:
+                store = FileTokenStore(DOKU_TOKEN_FILE)
+            _token_manager = TokenCache('DOKU', fetch_access_token, store, refresh_ahead=DOKU_TOKEN_REFRESH_AHEAD)
+        return _token_manager
+
+def get_access_token():
+    """Get access token from DOKU API (cached; refreshed by one caller at a time)"""
+    return get_token_manager().get()
+
+@timed_call('DOKU', 'create_va')
 def create_virtual_account(amount, reference_id):
     """Create virtual account using DOKU API"""
     access_token = get_access_token()
-    timestamp = get_current_timestamp()
-    external_id = generate_external_id()
+    
+    endpoint = '/virtual-accounts/bi-snap-va/v1.1/transfer-va/create-va'
+    
+    payload = {
+        'partnerServiceId': DOKU_MERCHANT_ID,
+        'trxId': reference_id,
+        'totalAmount': {
+            'value': f"{amount:.2f}",
+            'currency': 'IDR'
+        },
+        'virtualAccountTrxType': 'C',
+        'expiredDate': '2024-12-31T23:59:59+07:00'
+    }
+    
+    signed = doku_signer.build('POST', endpoint, payload, access_token)
+    if not DOKU_MOCK_API:
+        return call_doku_api(signed)
     
     # For MVP, return mock VA response
-    # In production, make actual API call to DOKU
     va_number = f"8808{str(uuid.uuid4())[:8]}"
     
     return {
@@ -129,11 +152,10 @@ def create_virtual_account(amount, reference_id):
         'referenceNo': f"doku_{reference_id}"
     }
 
+@timed_call('DOKU', 'qris_generate')
 def generate_qris(amount, reference_id):
     """Generate QRIS using DOKU API"""
     access_token = get_access_token()
-    timestamp = get_current_timestamp()
-    external_id = generate_external_id()
     
     endpoint = '/snap-adapter/b2b/v1.0/qr/qr-mpm-generate'
     
@@ -156,16 +178,11 @@ def generate_qris(amount, reference_id):
         }
     }
     
-    headers = {
-        'X-PARTNER-ID': DOKU_CLIENT_ID,
-        'X-EXTERNAL-ID': external_id,
-        'X-SIGNATURE': generate_symmetric_signature('POST', endpoint, access_token, payload, timestamp),
-        'Authorization': f'Bearer {access_token}',
-        'Content-Type': 'application/json'
-    }
+    signed = doku_signer.build('POST', endpoint, payload, access_token)
+    if not DOKU_MOCK_API:
+        return call_doku_api(signed)
     
     # For MVP, return mock QRIS response
-    # In production, make actual API call to DOKU
     qr_content = f"00020101021226530012COM.DOKU.WWW0118936008990000{reference_id}020429970303UMI51440014ID.CO.QRIS.WWW0215ID20200622029970303UMI52045411530336054{amount:07.2f}5502025606500.525802ID5911Green Pages6007Jakarta61051312062430703K455032{reference_id}6304F6EA"
     
     return {
@@ -180,11 +197,10 @@ def generate_qris(amount, reference_id):
         }
     }
 
+@timed_call('DOKU', 'qris_status')
 def query_qris_status(reference_id, partner_reference_id):
     """Query QRIS payment status"""
     access_token = get_access_token()
-    timestamp = get_current_timestamp()
-    external_id = generate_external_id()
     
     endpoint = '/snap-adapter/b2b/v1.0/qr/qr-mpm-query'
     
@@ -195,17 +211,12 @@ def query_qris_status(reference_id, partner_reference_id):
         'merchantId': DOKU_MERCHANT_ID
     }
     
-    headers = {
-        'X-PARTNER-ID': DOKU_CLIENT_ID,
-        'X-TIMESTAMP': timestamp,
-        'X-EXTERNAL-ID': external_id,
-        'X-SIGNATURE': generate_symmetric_signature('POST', endpoint, access_token, payload, timestamp),
-        'Authorization': f'Bearer {access_token}',
-        'Content-Type': 'application/json'
-    }
+    signed = doku_signer.build('POST', endpoint, payload, access_token)
+    if not DOKU_MOCK_API:
+        # A status query changes nothing, so it is safe to retry
+        return call_doku_api(signed, idempotent=True)
     
     # For MVP, return mock status response
-    # In production, make actual API call to DOKU
     return {
         'responseCode': '2004700',
         'responseMessage': 'Request has been processed successfully',
@@ -229,20 +240,24 @@ def query_qris_status(reference_id, partner_reference_id):
         }
     }
 
+def call_doku_api(signed, idempotent=False):
+    """Send a SignedRequest to the DOKU SNAP API (used when DOKU_MOCK_API is false).
+
+    The body goes out as the exact bytes that were signed. SNAP endpoints
+    are all POSTs; pass idempotent=True for status queries so they are
+    retried on timeouts. Raises ProviderError.
+    """
+    return doku_client.request(signed.method, signed.endpoint, data=signed.body, headers=signed.headers,
+                               idempotent=idempotent)
+
 @doku_bp.route('/doku/virtual-account', methods=['POST'])
 @jwt_required()
+@rate_limit('payment')
+@kyc_required('KYC verification required before top-up')
 def create_va_payment():
     """Create virtual account for top-up"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-        
-        # Check KYC status
-        if user.kyc_status != 'APPROVED':
-            return jsonify({'error': 'KYC verification required before top-up'}), 403
         
         data = request.get_json()
         
@@ -260,61 +275,40 @@ def create_va_payment():
         if amount > 10000000:  # 10 million IDR limit
             return jsonify({'error': 'Amount exceeds maximum limit'}), 400
         
-        # Create transaction record
-        transaction = Transaction(
-            user_id=user_id,
-            type='TOPUP',
-            amount=amount,
-            status='PENDING',
-            description=f"Top-up via {payment_method}"
+        # Reserves the Transaction, calls DOKU, then stores its reference
+        created = payment_service.create_payment(
+            'doku', user_id, 'TOPUP', amount, 'VA', f"Top-up via {payment_method}"
         )
+        payment = created.payment
         
-        db.session.add(transaction)
-        db.session.commit()
-        
-        # Create DOKU virtual account
-        doku_response = create_virtual_account(
-            amount=float(amount),
-            reference_id=str(transaction.id)
-        )
-        
-        # Store DOKU reference
-        transaction.xendit_transaction_id = doku_response['referenceNo']  # Reuse field for DOKU reference
-        db.session.commit()
-        
-        logger.info(f"Created DOKU VA for user {user_id}: {doku_response['referenceNo']}")
+        logger.info("Created DOKU VA for user %s: %s", user_id, payment.reference)
         
         return jsonify({
-            'transaction_id': transaction.id,
-            'reference_no': doku_response['referenceNo'],
-            'partner_reference_no': doku_response['partnerReferenceNo'],
+            'transaction_id': created.transaction_id,
+            'reference_no': payment.reference,
+            'partner_reference_no': payment.raw['partnerReferenceNo'],
             'amount': float(amount),
             'payment_method': payment_method,
-            'status': 'PENDING',
-            'va_number': doku_response['virtualAccountInfo']['virtualAccountNumber'],
-            'bank_code': doku_response['virtualAccountInfo']['bankCode'],
-            'expired_time': doku_response['virtualAccountInfo']['expiredTime']
+            'status': created.status,
+            'va_number': payment.virtual_account['number'],
+            'bank_code': payment.virtual_account['bank_code'],
+            'expired_time': payment.virtual_account['expired_time']
         }), 201
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error creating DOKU VA: {str(e)}")
+        logger.error("Error creating DOKU VA: %s", e)
         return jsonify({'error': 'Failed to create virtual account', 'details': str(e)}), 500
 
 @doku_bp.route('/doku/qris-generate', methods=['POST'])
 @jwt_required()
+@rate_limit('payment')
+@kyc_required('KYC verification required before payment')
 def generate_qris_payment():
     """Generate QRIS for payment"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-        
-        # Check KYC status
-        if user.kyc_status != 'APPROVED':
-            return jsonify({'error': 'KYC verification required before payment'}), 403
+        user = current_user()
         
         data = request.get_json()
         
@@ -332,53 +326,38 @@ def generate_qris_payment():
         if user.wallet_balance < amount:
             return jsonify({'error': 'Insufficient wallet balance'}), 400
         
-        # Create transaction record
-        transaction = Transaction(
-            user_id=user_id,
-            type='QRIS_PAYMENT',
-            amount=amount,
-            status='PENDING',
-            description=f"QRIS payment"
+        # Reserves the Transaction, calls DOKU, then stores its reference
+        created = payment_service.create_payment(
+            'doku', user_id, 'QRIS_PAYMENT', amount, 'QRIS', "QRIS payment"
         )
+        payment = created.payment
         
-        db.session.add(transaction)
-        db.session.commit()
-        
-        # Generate DOKU QRIS
-        doku_response = generate_qris(
-            amount=float(amount),
-            reference_id=str(transaction.id)
-        )
-        
-        # Store DOKU reference
-        transaction.xendit_transaction_id = doku_response['referenceNo']  # Reuse field for DOKU reference
-        db.session.commit()
-        
-        logger.info(f"Generated DOKU QRIS for user {user_id}: {doku_response['referenceNo']}")
+        logger.info("Generated DOKU QRIS for user %s: %s", user_id, payment.reference)
         
         return jsonify({
-            'transaction_id': transaction.id,
-            'reference_no': doku_response['referenceNo'],
-            'partner_reference_no': doku_response['partnerReferenceNo'],
+            'transaction_id': created.transaction_id,
+            'reference_no': payment.reference,
+            'partner_reference_no': payment.raw['partnerReferenceNo'],
             'amount': float(amount),
-            'status': 'PENDING',
-            'qr_content': doku_response['qrContent'],
-            'terminal_id': doku_response['terminalId'],
-            'validity_period': doku_response['additionalInfo']['validityPeriod']
+            'status': created.status,
+            'qr_content': payment.qr_content,
+            'terminal_id': payment.raw['terminalId'],
+            'validity_period': payment.raw['additionalInfo']['validityPeriod']
         }), 201
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error generating DOKU QRIS: {str(e)}")
+        logger.error("Error generating DOKU QRIS: %s", e)
         return jsonify({'error': 'Failed to generate QRIS', 'details': str(e)}), 500
 
 @doku_bp.route('/doku/qris-pay', methods=['POST'])
 @jwt_required()
+@rate_limit('payment')
 def process_qris_payment():
     """Process QRIS payment (simulate payment completion)"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -395,7 +374,7 @@ def process_qris_payment():
         if amount <= 0:
             return jsonify({'error': 'Amount must be greater than 0'}), 400
         
-        # Check wallet balance
+        # Early check against the cached balance; debit() re-checks the balance atomically in its conditional UPDATE
         if user.wallet_balance < amount:
             return jsonify({'error': 'Insufficient wallet balance'}), 400
         
@@ -408,25 +387,31 @@ def process_qris_payment():
             description=f"QRIS payment to merchant"
         )
         
+        db.session.add(transaction)
+        db.session.flush()
+        
         # Deduct from wallet balance
-        user.wallet_balance -= amount
+        try:
+            remaining_balance = debit(user_id, amount, 'QRIS_PAYMENT', transaction_id=transaction.id)
+        except InsufficientFundsError:
+            db.session.rollback()
+            return jsonify({'error': 'Insufficient wallet balance'}), 400
         
-        db.session.add(transaction)
         db.session.commit()
         
-        logger.info(f"Processed DOKU QRIS payment for user {user_id}: {amount}")
+        logger.info("Processed DOKU QRIS payment for user %s: %s", user_id, amount)
         
         return jsonify({
             'transaction_id': transaction.id,
             'status': transaction.status,
             'amount': float(amount),
-            'remaining_balance': float(user.wallet_balance),
+            'remaining_balance': float(remaining_balance),
             'qr_content': data['qr_content']
         }), 200
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error processing DOKU QRIS payment: {str(e)}")
+        logger.error("Error processing DOKU QRIS payment: %s", e)
         return jsonify({'error': 'Failed to process QRIS payment', 'details': str(e)}), 500
 
 @doku_bp.route('/doku/payment-status/<reference_no>', methods=['GET'])
@@ -457,7 +442,7 @@ def get_payment_status(reference_no):
         }), 200
         
     except Exception as e:
-        logger.error(f"Error getting DOKU payment status: {str(e)}")
+        logger.error("Error getting DOKU payment status: %s", e)
         return jsonify({'error': 'Failed to get payment status', 'details': str(e)}), 500
 
 @doku_bp.route('/doku/simulate-payment', methods=['POST'])
@@ -472,37 +457,41 @@ def simulate_payment():
         reference_no = data['reference_no']
         status = data.get('status', 'SUCCESS')  # SUCCESS or FAILED
         
-        # Find transaction
-        transaction = Transaction.query.filter_by(
-            xendit_transaction_id=reference_no  # Reused field for DOKU reference
-        ).first()
+        # Same path as a settlement batch of one: only a PENDING payment moves or credits
+        results, balances = settle([{'reference_no': reference_no, 'status': status}])
+        result = results[0]
         
-        if not transaction:
+        if result['outcome'] == 'NOT_FOUND':
             return jsonify({'error': 'Payment not found'}), 404
-        
-        # Update transaction status
-        transaction.status = status
-        
-        # If successful top-up, update wallet balance
-        if status == 'SUCCESS' and transaction.type == 'TOPUP':
-            user = User.query.get(transaction.user_id)
-            if user:
-                user.wallet_balance += transaction.amount
-                logger.info(f"Updated wallet balance for user {user.id}: {user.wallet_balance}")
+        if result['outcome'] == 'INVALID':
+            return jsonify({'error': result['error']}), 400
+        
+        # Same contract as /xendit/simulate-payment: a repeat changes nothing and says so
+        if result['outcome'] == 'ALREADY_PROCESSED':
+            db.session.rollback()
+            return jsonify({
+                'error': 'Payment already processed',
+                'outcome': 'ALREADY_PROCESSED',
+                'reference_no': reference_no,
+                'transaction_id': result['transaction_id'],
+                'status': result['status']
+            }), 409
         
         db.session.commit()
         
-        logger.info(f"Simulated DOKU payment {reference_no}: {status}")
+        for user_id, balance in balances.items():
+            logger.info("Updated wallet balance for user %s: %s", user_id, balance)
+        logger.info("Simulated DOKU payment %s: %s", reference_no, result['status'])
         
         return jsonify({
             'message': f'Payment {status.lower()} simulated successfully',
             'reference_no': reference_no,
-            'transaction_id': transaction.id,
-            'status': transaction.status
+            'transaction_id': result['transaction_id'],
+            'status': result['status']
         }), 200
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error simulating DOKU payment: {str(e)}")
+        logger.error("Error simulating DOKU payment: %s", e)
         return jsonify({'error': 'Failed to simulate payment', 'details': str(e)}), 500
 
@@ -1,157 +1,142 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from src.models.kyc import KycJob
 from src.models.user import User, db
-import base64
+from src.services import kyc_jobs
+from src.services.kyc_providers import privy_client
+from src.services.rate_limits import rate_limit
+from src.services.uploads import UploadError, receive_images, save_base64_images, sniff_base64_image
 import uuid
-import requests
 import os
 import logging
 
 privy_bp = Blueprint('privy', __name__)
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Mock Privy API configuration
-PRIVY_API_BASE_URL = os.getenv('PRIVY_API_BASE_URL', 'https://api.privy.id/v1')
-PRIVY_API_KEY = os.getenv('PRIVY_API_KEY', 'mock-api-key')
+# Multipart fields of a KYC upload
+KYC_IMAGE_FIELDS = ('passport_image', 'selfie_image')
 
 def validate_image_base64(image_data):
-    """Validate base64 image data"""
-    try:
-        if not image_data:
-            return False
-        
-        # Remove data URL prefix if present
-        if image_data.startswith('data:image'):
-            image_data = image_data.split(',')[1]
-        
-        # Validate base64
-        base64.b64decode(image_data)
-        return True
-    except Exception:
-        return False
+    """Check that base64 image data starts like a JPEG, PNG or WebP image.
 
-def mock_privy_ocr(passport_image):
-    """Mock passport OCR processing"""
-    # In real implementation, this would call Privy API
-    # For MVP, return mock extracted data
-    return {
-        'passport_number': 'A12345678',
-        'full_name': 'JOHN DOE',
-        'nationality': 'USA',
-        'date_of_birth': '1990-01-01',
-        'expiry_date': '2030-01-01',
-        'confidence_score': 0.95
-    }
+    Only the first bytes are decoded; the payload is not copied.
+    """
+    return sniff_base64_image(image_data) is not None
 
-def mock_privy_liveness_check(selfie_image):
-    """Mock selfie liveness detection"""
-    # In real implementation, this would call Privy API
-    # For MVP, return mock liveness result
-    return {
-        'is_live': True,
-        'confidence_score': 0.92,
-        'face_detected': True
-    }
+def kyc_upload_directory(user_id):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], 'kyc', user_id)
 
-def mock_privy_face_match(passport_image, selfie_image):
-    """Mock face matching between passport and selfie"""
-    # In real implementation, this would call Privy API
-    # For MVP, return mock face match result
-    return {
-        'is_match': True,
-        'confidence_score': 0.88
-    }
+def remove_images(images):
+    for path in images.values():
+        os.remove(path)
 
 @privy_bp.route('/privy/kyc/initiate', methods=['POST'])
 @jwt_required()
+@rate_limit('kyc')
 def initiate_kyc():
+    """Start verifying the user's passport and selfie.
+
+    Send the images as multipart/form-data files (passport_image,
+    selfie_image): they are streamed to UPLOAD_FOLDER in chunks, within
+    KYC_MAX_IMAGE_BYTES each. Base64 strings in a JSON body are still
+    accepted.
+
+    The images are stored and a job is queued for the KYC worker pool,
+    which runs OCR, liveness and face match in parallel; the response is
+    202 with the kyc_id to poll GET /privy/kyc/status/<kyc_id> with. With
+    KYC_WORKERS=0 the job runs inside the request and the result is
+    returned with 200.
+    """
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-        
-        data = request.get_json()
-        
-        # Validate required fields
-        if not data.get('passport_image') or not data.get('selfie_image'):
-            return jsonify({'error': 'Passport image and selfie image are required'}), 400
-        
-        # Validate image formats
-        if not validate_image_base64(data['passport_image']):
-            return jsonify({'error': 'Invalid passport image format'}), 400
-        
-        if not validate_image_base64(data['selfie_image']):
-            return jsonify({'error': 'Invalid selfie image format'}), 400
         
         # Generate KYC ID
         kyc_id = str(uuid.uuid4())
         
-        # Mock Privy API calls
-        logger.info(f"Initiating KYC for user {user_id} with KYC ID {kyc_id}")
-        
-        # Step 1: OCR passport
-        ocr_result = mock_privy_ocr(data['passport_image'])
-        logger.info(f"OCR result: {ocr_result}")
-        
-        # Step 2: Liveness detection
-        liveness_result = mock_privy_liveness_check(data['selfie_image'])
-        logger.info(f"Liveness result: {liveness_result}")
+        if request.mimetype == 'multipart/form-data':
+            # Receive the files before touching the database, so a slow upload holds no connection
+            try:
+                images = receive_images(
+                    request.environ,
+                    request.content_length,
+                    KYC_IMAGE_FIELDS,
+                    kyc_upload_directory(user_id),
+                    kyc_id,
+                    current_app.config['KYC_MAX_IMAGE_BYTES']
+                )
+            except UploadError as e:
+                return jsonify({'error': e.message}), e.status
+        else:
+            data = request.get_json()
+            
+            # Validate required fields
+            if not data.get('passport_image') or not data.get('selfie_image'):
+                return jsonify({'error': 'Passport image and selfie image are required'}), 400
+            
+            # Validate image formats
+            if not validate_image_base64(data['passport_image']):
+                return jsonify({'error': 'Invalid passport image format'}), 400
+            
+            if not validate_image_base64(data['selfie_image']):
+                return jsonify({'error': 'Invalid selfie image format'}), 400
+            
+            # Stored like a multipart upload, so the worker reads both forms from disk
+            try:
+                images = save_base64_images(
+                    {field: data[field] for field in KYC_IMAGE_FIELDS},
+                    kyc_upload_directory(user_id),
+                    kyc_id,
+                    current_app.config['KYC_MAX_IMAGE_BYTES']
+                )
+            except UploadError as e:
+                return jsonify({'error': e.message}), e.status
         
-        # Step 3: Face matching
-        face_match_result = mock_privy_face_match(data['passport_image'], data['selfie_image'])
-        logger.info(f"Face match result: {face_match_result}")
+        user = User.query.get(user_id)
         
-        # Determine overall KYC status
-        if (ocr_result['confidence_score'] > 0.8 and 
-            liveness_result['is_live'] and 
-            face_match_result['is_match']):
-            kyc_status = 'APPROVED'
-        else:
-            kyc_status = 'REJECTED'
+        if not user:
+            remove_images(images)
+            return jsonify({'error': 'User not found'}), 404
         
-        # Update user record
-        user.privy_kyc_id = kyc_id
-        user.kyc_status = kyc_status
+        if kyc_jobs.active_job(user_id) is not None:
+            remove_images(images)
+            return jsonify({'error': 'A KYC verification is already in progress'}), 409
         
-        # Update passport number from OCR if available
-        if ocr_result.get('passport_number'):
-            user.passport_number = ocr_result['passport_number']
+        logger.info("Initiating KYC for user %s with KYC ID %s", user_id, kyc_id)
         
+        config = current_app.config
+        inline = config['KYC_WORKERS'] == 0
+        job, token = kyc_jobs.enqueue(
+            user, kyc_id, images['passport_image'], images['selfie_image'],
+            lease_seconds=config['KYC_LEASE_SECONDS'] if inline else None
+        )
         db.session.commit()
         
-        logger.info(f"KYC completed for user {user_id}: {kyc_status}")
+        if not inline:
+            kyc_jobs.wakeup().notify()
+            return jsonify(job.to_dict()), 202
         
-        return jsonify({
-            'kyc_id': kyc_id,
-            'status': kyc_status,
-            'ocr_data': {
-                'passport_number': ocr_result.get('passport_number'),
-                'full_name': ocr_result.get('full_name'),
-                'nationality': ocr_result.get('nationality'),
-                'date_of_birth': ocr_result.get('date_of_birth')
-            },
-            'verification_scores': {
-                'ocr_confidence': ocr_result['confidence_score'],
-                'liveness_confidence': liveness_result['confidence_score'],
-                'face_match_confidence': face_match_result['confidence_score']
-            }
-        }), 200
+        kyc_jobs.process_job(kyc_id, token, 1, config['KYC_RETRY_BACKOFF'])
+        job = db.session.get(KycJob, kyc_id)
+        return jsonify(job.to_dict()), 502 if job.status == 'FAILED' else 200
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error initiating KYC: {str(e)}")
+        logger.error("Error initiating KYC: %s", e)
         return jsonify({'error': 'Failed to initiate KYC', 'details': str(e)}), 500
 
 @privy_bp.route('/privy/kyc/status/<kyc_id>', methods=['GET'])
 @jwt_required()
 def get_kyc_status(kyc_id):
+    """The job's status (QUEUED, RUNNING, APPROVED, REJECTED or FAILED) and check progress"""
     try:
         user_id = get_jwt_identity()
+        job = db.session.get(KycJob, kyc_id)
+        
+        if job is not None and job.user_id == user_id:
+            return jsonify(job.to_dict()), 200
+        
+        # Verifications recorded before KYC jobs existed, or set by the Privy webhook
         user = User.query.filter_by(id=user_id, privy_kyc_id=kyc_id).first()
         
         if not user:
@@ -165,11 +150,12 @@ def get_kyc_status(kyc_id):
         }), 200
         
     except Exception as e:
-        logger.error(f"Error getting KYC status: {str(e)}")
+        logger.error("Error getting KYC status: %s", e)
         return jsonify({'error': 'Failed to get KYC status', 'details': str(e)}), 500
 
 @privy_bp.route('/privy/kyc/retry', methods=['POST'])
 @jwt_required()
+@rate_limit('kyc')
 def retry_kyc():
     try:
         user_id = get_jwt_identity()
@@ -192,31 +178,13 @@ def retry_kyc():
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error retrying KYC: {str(e)}")
+        logger.error("Error retrying KYC: %s", e)
         return jsonify({'error': 'Failed to retry KYC', 'details': str(e)}), 500
 
 # Real Privy API integration functions (for future implementation)
 def call_privy_api(endpoint, method='GET', data=None):
-    """Call actual Privy API (placeholder for real implementation)"""
-    headers = {
-        'Authorization': f'Bearer {PRIVY_API_KEY}',
-        'Content-Type': 'application/json'
-    }
-    
-    url = f"{PRIVY_API_BASE_URL}/{endpoint}"
-    
-    try:
-        if method == 'POST':
-            response = requests.post(url, json=data, headers=headers, timeout=30)
-        else:
-            response = requests.get(url, headers=headers, timeout=30)
-        
-        response.raise_for_status()
-        return response.json()
-    
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Privy API call failed: {str(e)}")
-        raise Exception(f"Privy API error: {str(e)}")
+    """Call actual Privy API (placeholder for real implementation). Raises ProviderError."""
+    return privy_client.request(method, endpoint, json=data)
 
 def real_privy_kyc_initiate(user_data, passport_image, selfie_image):
     """Real Privy KYC initiation (placeholder for actual implementation)"""
@@ -0,0 +1,56 @@
+from flask import Blueprint, Response, current_app, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from src.services.status_stream import StreamLimitError, format_event, get_broker
+import logging
+import time
+
+status_bp = Blueprint('status', __name__)
+
+logger = logging.getLogger(__name__)
+
+@status_bp.route('/status/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])  # EventSource cannot send headers: ?jwt=<token>
+def stream_status():
+    """Server-sent events for the current user's transactions, KYC status and balance.
+
+    Events are pushed as their changes commit, so clients can stop polling
+    the payment status endpoints. A comment line is sent every
+    STATUS_STREAM_HEARTBEAT seconds to keep proxies from closing the
+    connection, and the stream ends after STATUS_STREAM_MAX_SECONDS so the
+    browser reconnects and frees the server thread it holds.
+    """
+    user_id = get_jwt_identity()
+    broker = get_broker()
+    try:
+        subscription = broker.subscribe(user_id)
+    except StreamLimitError as e:
+        logger.warning("Refused status stream for user %s: %s", user_id, e)
+        response = jsonify({'error': 'Too many open status streams, try again shortly'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '5'
+        return response
+
+    heartbeat = current_app.config['STATUS_STREAM_HEARTBEAT']
+    deadline = time.monotonic() + current_app.config['STATUS_STREAM_MAX_SECONDS']
+
+    def events():
+        # Reconnect delay for the browser; 'ready' tells the client it is subscribed,
+        # so anything it fetches from now on cannot miss a later change
+        yield 'retry: 3000\n\n'
+        yield format_event({'type': 'ready'})
+
+        while time.monotonic() < deadline:
+            event = subscription.get(timeout=heartbeat)
+            if subscription.overflowed:
+                yield format_event({'type': 'resync'})
+                return
+            yield format_event(event) if event is not None else ': heartbeat\n\n'
+
+    response = Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Stop nginx from buffering the stream
+    })
+    # The server closes the response when the stream ends or the client goes away,
+    # including before the first event was sent
+    response.call_on_close(lambda: broker.unsubscribe(subscription))
+    return response
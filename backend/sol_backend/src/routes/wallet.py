@@ -1,16 +1,24 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models.user import User, Transaction, db
+from src.models.user import Transaction, db
+from src.services.ledger import debit, InsufficientFundsError
+from src.services.payments import payment_service, wallet_provider
+from src.services.rate_limits import rate_limit
+from src.services.user_cache import current_user, kyc_required
+from src.services.user_versions import conditional_on_user_version
+from src.utils.pagination import keyset_paginate_rows, offset_paginate_rows, count_rows, clamp_page_size, InvalidCursorError
+from src.utils.projection import Projection, as_float, json_response
+from src.utils.query_stats import query_budget
 from decimal import Decimal
 
 wallet_bp = Blueprint('wallet', __name__)
 
 @wallet_bp.route('/wallet/balance', methods=['GET'])
 @jwt_required()
+@conditional_on_user_version
 def get_balance():
     try:
-        user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = current_user()
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -23,48 +31,78 @@ def get_balance():
     except Exception as e:
         return jsonify({'error': 'Failed to get balance', 'details': str(e)}), 500
 
+# Same keys as Transaction.to_dict()
+TRANSACTION_PROJECTION = Projection(
+    ('id', Transaction.id),
+    ('user_id', Transaction.user_id),
+    ('type', Transaction.type),
+    ('amount', as_float(Transaction.amount)),
+    ('currency', Transaction.currency),
+    ('status', Transaction.status),
+    ('xendit_transaction_id', Transaction.xendit_transaction_id),
+    ('description', Transaction.description),
+    ('created_at', Transaction.created_at),
+    ('updated_at', Transaction.updated_at)
+)
+
 @wallet_bp.route('/wallet/transactions', methods=['GET'])
 @jwt_required()
+# User version (without Redis, a SELECT once per USER_VERSION_LOCAL_TTL), user row unless cached, page, count
+@query_budget(4)
 def get_transactions():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
         
-        if not user:
+        if current_user() is None:
             return jsonify({'error': 'User not found'}), 404
         
         # Get query parameters for pagination
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
+        cursor = request.args.get('cursor')
+        
+        # Only the returned columns, as rows: no ORM objects per transaction
+        statement = TRANSACTION_PROJECTION.select().where(Transaction.user_id == user_id)
+        
+        # Keyset pagination: opaque cursor, no OFFSET and no COUNT(*) unless asked for
+        if cursor is not None:
+            try:
+                rows, next_cursor = keyset_paginate_rows(db.session, statement, Transaction, cursor, clamp_page_size(per_page))
+            except InvalidCursorError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            
+            response = {
+                'transactions': TRANSACTION_PROJECTION.serialize(rows),
+                'next_cursor': next_cursor,
+                'has_more': next_cursor is not None
+            }
+            if request.args.get('include_total', 'false').lower() == 'true':
+                response['total'] = count_rows(db.session, statement)
+            
+            return json_response(response)
         
         # Query transactions with pagination
-        transactions = Transaction.query.filter_by(user_id=user_id)\
-            .order_by(Transaction.created_at.desc())\
-            .paginate(page=page, per_page=per_page, error_out=False)
+        rows, total, pages = offset_paginate_rows(
+            db.session, statement.order_by(Transaction.created_at.desc()), page, per_page
+        )
         
-        return jsonify({
-            'transactions': [transaction.to_dict() for transaction in transactions.items],
-            'total': transactions.total,
-            'pages': transactions.pages,
+        return json_response({
+            'transactions': TRANSACTION_PROJECTION.serialize(rows),
+            'total': total,
+            'pages': pages,
             'current_page': page
-        }), 200
+        })
         
     except Exception as e:
         return jsonify({'error': 'Failed to get transactions', 'details': str(e)}), 500
 
 @wallet_bp.route('/wallet/topup', methods=['POST'])
 @jwt_required()
+@rate_limit('payment')
+@kyc_required('KYC verification required before top-up')
 def initiate_topup():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-        
-        # Check KYC status
-        if user.kyc_status != 'APPROVED':
-            return jsonify({'error': 'KYC verification required before top-up'}), 403
         
         data = request.get_json()
         
@@ -102,44 +140,27 @@ def initiate_topup():
         if not channel_code:
             return jsonify({'error': f'Invalid payment method: {payment_method}'}), 400
         
-        # Create transaction record
-        transaction = Transaction(
-            user_id=user_id,
-            type='TOPUP',
-            amount=amount,
-            status='PENDING',
-            description=f"Top-up via {payment_method}"
-        )
-        
-        db.session.add(transaction)
-        db.session.commit()
-        
-        # Create DOKU virtual account (replacing Xendit)
-        from src.routes.doku import create_virtual_account
-        doku_response = create_virtual_account(
-            amount=float(amount),
-            reference_id=str(transaction.id)
+        # Reserves the Transaction, calls the provider, then stores its reference
+        created = payment_service.create_payment(
+            wallet_provider(), user_id, 'TOPUP', amount, channel_code, f"Top-up via {payment_method}"
         )
-        
-        # Store DOKU reference
-        transaction.xendit_transaction_id = doku_response['referenceNo']
-        db.session.commit()
+        payment = created.payment
         
         # Prepare response based on payment method
         response_data = {
-            'transaction_id': transaction.id,
-            'reference_no': doku_response['referenceNo'],
-            'partner_reference_no': doku_response['partnerReferenceNo'],
+            'transaction_id': created.transaction_id,
+            'reference_no': payment.reference,
+            'partner_reference_no': created.transaction_id,
             'amount': float(amount),
             'payment_method': payment_method,
-            'status': 'PENDING'
+            'status': created.status
         }
         
         # Add method-specific data for Virtual Account
-        if 'VA' in payment_method or payment_method == 'VA':
-            response_data['va_number'] = doku_response['virtualAccountInfo']['virtualAccountNumber']
-            response_data['bank_code'] = doku_response['virtualAccountInfo']['bankCode']
-            response_data['expired_time'] = doku_response['virtualAccountInfo']['expiredTime']
+        if 'VA' in payment_method and payment.virtual_account is not None:
+            response_data['va_number'] = payment.virtual_account['number']
+            response_data['bank_code'] = payment.virtual_account['bank_code']
+            response_data['expired_time'] = payment.virtual_account['expired_time']
         
         return jsonify(response_data), 201
         
@@ -149,17 +170,12 @@ def initiate_topup():
 
 @wallet_bp.route('/wallet/qris-pay', methods=['POST'])
 @jwt_required()
+@rate_limit('payment')
+@kyc_required('KYC verification required before payment')
 def qris_payment():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-        
-        # Check KYC status
-        if user.kyc_status != 'APPROVED':
-            return jsonify({'error': 'KYC verification required before payment'}), 403
+        user = current_user()
         
         data = request.get_json()
         
@@ -173,46 +189,36 @@ def qris_payment():
         if amount <= 0:
             return jsonify({'error': 'Amount must be greater than 0'}), 400
         
-        # Check wallet balance
+        # Early check against the cached balance; debit() re-checks the balance atomically in its conditional UPDATE
         if user.wallet_balance < amount:
             return jsonify({'error': 'Insufficient wallet balance'}), 400
         
-        # Create transaction record
-        transaction = Transaction(
-            user_id=user_id,
-            type='QRIS_PAYMENT',
-            amount=amount,
-            status='PENDING',
-            description=f"QRIS payment to merchant"
-        )
-        
-        db.session.add(transaction)
-        db.session.commit()
-        
-        # Create DOKU QRIS payment (replacing Xendit)
-        from src.routes.doku import generate_qris
-        doku_response = generate_qris(
-            amount=float(amount),
-            reference_id=str(transaction.id)
-        )
-        
-        # Store DOKU reference
-        transaction.xendit_transaction_id = doku_response['referenceNo']
-        
         # For QRIS payments, simulate immediate success (in real implementation, this would be handled by webhook)
-        transaction.status = 'SUCCESS'
-        user.wallet_balance -= amount
+        def pay(transaction, payment):
+            try:
+                balance = debit(user_id, amount, 'QRIS_PAYMENT', transaction_id=transaction.id)
+            except InsufficientFundsError:
+                transaction.status = 'FAILED'
+                return None
+            transaction.status = 'SUCCESS'
+            return balance
+        
+        # Reserves the Transaction, calls the provider, then stores its reference with the debit
+        created = payment_service.create_payment(
+            wallet_provider(), user_id, 'QRIS_PAYMENT', amount, 'QRIS', "QRIS payment to merchant", complete=pay
+        )
         
-        db.session.commit()
+        if created.status == 'FAILED':
+            return jsonify({'error': 'Insufficient wallet balance'}), 400
         
         return jsonify({
-            'transaction_id': transaction.id,
-            'reference_no': doku_response['referenceNo'],
-            'partner_reference_no': doku_response['partnerReferenceNo'],
-            'status': transaction.status,
+            'transaction_id': created.transaction_id,
+            'reference_no': created.payment.reference,
+            'partner_reference_no': created.transaction_id,
+            'status': created.status,
             'amount': float(amount),
-            'remaining_balance': float(user.wallet_balance),
-            'qr_content': doku_response['qrContent'],
+            'remaining_balance': float(created.completion),
+            'qr_content': created.payment.qr_content,
             'merchant_qris_code': data['merchant_qris_code']
         }), 200
         
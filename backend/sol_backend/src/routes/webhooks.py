@@ -1,111 +1,75 @@
-from flask import Blueprint, jsonify, request
-from src.models.user import User, Transaction, db
-from decimal import Decimal
+from flask import Blueprint, current_app, jsonify, request
+from src.models.user import db
+from src.services.rate_limits import rate_limit
+from src.services.webhooks import event_id_for, process_inline, receive_event, wakeup
 import logging
 
 webhooks_bp = Blueprint('webhooks', __name__)
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def ingest(provider, data, *id_fields):
+    """Persist a delivery and acknowledge it; the worker pool applies it later.
+
+    Redeliveries of an event that was already applied get the stored
+    response, others just the acknowledgement. With WEBHOOK_WORKERS=0 the
+    event is applied before responding instead.
+    """
+    event, is_new = receive_event(provider, event_id_for(data, request.headers, *id_fields), data)
+
+    if not is_new:
+        logger.info("Duplicate %s webhook %s", provider, event.event_id)
+        if event.status == 'DONE':
+            return jsonify(event.response_body), event.response_status
+        return jsonify({'message': 'Webhook received', 'event_id': event.event_id}), 200
+
+    if current_app.config['WEBHOOK_WORKERS'] == 0:
+        response, status = process_inline(event)
+        return jsonify(response), status
+
+    db.session.commit()
+    wakeup().notify()
+
+    return jsonify({'message': 'Webhook received', 'event_id': event.event_id}), 200
+
 @webhooks_bp.route('/webhooks/privy', methods=['POST'])
+@rate_limit('webhook', by='ip')
 def privy_webhook():
     try:
         data = request.get_json()
-        logger.info(f"Received Privy webhook: {data}")
+        logger.info("Received Privy webhook", extra={'payload': data})
         
-        # Extract relevant information from Privy webhook
         # This is a mock implementation - actual Privy webhook structure may differ
-        kyc_id = data.get('kyc_id')
-        status = data.get('status')  # e.g., 'approved', 'rejected'
-        user_identifier = data.get('user_identifier')  # Could be email or passport number
-        
-        if not kyc_id or not status or not user_identifier:
+        if not data.get('kyc_id') or not data.get('status') or not data.get('user_identifier'):
             logger.error("Missing required fields in Privy webhook")
             return jsonify({'error': 'Missing required fields'}), 400
         
-        # Find user by email or passport number
-        user = User.query.filter(
-            (User.email == user_identifier) | 
-            (User.passport_number == user_identifier)
-        ).first()
-        
-        if not user:
-            logger.error(f"User not found for identifier: {user_identifier}")
-            return jsonify({'error': 'User not found'}), 404
-        
-        # Update user KYC status
-        if status.lower() == 'approved':
-            user.kyc_status = 'APPROVED'
-        elif status.lower() == 'rejected':
-            user.kyc_status = 'REJECTED'
-        else:
-            user.kyc_status = 'PENDING'
-        
-        user.privy_kyc_id = kyc_id
-        
-        db.session.commit()
-        
-        logger.info(f"Updated KYC status for user {user.id}: {user.kyc_status}")
-        
-        return jsonify({'message': 'KYC status updated successfully'}), 200
+        return ingest('privy', data, 'event_id')
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error processing Privy webhook: {str(e)}")
+        logger.error("Error processing Privy webhook: %s", e)
         return jsonify({'error': 'Failed to process webhook', 'details': str(e)}), 500
 
 @webhooks_bp.route('/webhooks/xendit', methods=['POST'])
+@rate_limit('webhook', by='ip')
 def xendit_webhook():
     try:
         data = request.get_json()
-        logger.info(f"Received Xendit webhook: {data}")
+        logger.info("Received Xendit webhook", extra={'payload': data})
         
-        # Extract relevant information from Xendit webhook
         # This is a mock implementation - actual Xendit webhook structure may differ
-        external_id = data.get('external_id')  # Should match our transaction ID
-        status = data.get('status')  # e.g., 'PAID', 'EXPIRED', 'FAILED'
-        amount = data.get('amount')
-        payment_method = data.get('payment_method')
-        
-        if not external_id or not status:
+        if not data.get('external_id') or not data.get('status'):
             logger.error("Missing required fields in Xendit webhook")
             return jsonify({'error': 'Missing required fields'}), 400
         
-        # Find transaction by ID
-        transaction = Transaction.query.get(external_id)
-        
-        if not transaction:
-            logger.error(f"Transaction not found: {external_id}")
-            return jsonify({'error': 'Transaction not found'}), 404
-        
-        # Update transaction status
-        if status.upper() == 'PAID':
-            transaction.status = 'SUCCESS'
-            
-            # If it's a top-up transaction, update user wallet balance
-            if transaction.type == 'TOPUP':
-                user = User.query.get(transaction.user_id)
-                if user:
-                    user.wallet_balance += transaction.amount
-                    logger.info(f"Updated wallet balance for user {user.id}: {user.wallet_balance}")
-                    
-        elif status.upper() in ['EXPIRED', 'FAILED']:
-            transaction.status = 'FAILED'
-        
-        # Store Xendit transaction ID for reference
-        transaction.xendit_transaction_id = data.get('id')
-        
-        db.session.commit()
-        
-        logger.info(f"Updated transaction {transaction.id}: {transaction.status}")
-        
-        return jsonify({'message': 'Transaction status updated successfully'}), 200
+        # The payload id names the invoice or payment request, which every status callback for it
+        # shares, so it cannot tell deliveries apart: key on webhook-id, else the payload hash
+        return ingest('xendit', data)
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error processing Xendit webhook: {str(e)}")
+        logger.error("Error processing Xendit webhook: %s", e)
         return jsonify({'error': 'Failed to process webhook', 'details': str(e)}), 500
 
 @webhooks_bp.route('/webhooks/test', methods=['POST'])
@@ -113,7 +77,7 @@ def test_webhook():
     """Test endpoint for webhook functionality"""
     try:
         data = request.get_json()
-        logger.info(f"Received test webhook: {data}")
+        logger.info("Received test webhook", extra={'payload': data})
         
         return jsonify({
             'message': 'Test webhook received successfully',
@@ -121,6 +85,6 @@ def test_webhook():
         }), 200
         
     except Exception as e:
-        logger.error(f"Error processing test webhook: {str(e)}")
+        logger.error("Error processing test webhook: %s", e)
         return jsonify({'error': 'Failed to process test webhook', 'details': str(e)}), 500
 
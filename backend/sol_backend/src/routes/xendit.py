@@ -1,17 +1,21 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models.user import User, Transaction, db
+from sqlalchemy import select
+from src.models.user import Transaction, db
+from src.services.ledger import credit, debit, InsufficientFundsError
+from src.services.http_client import ProviderClient
+from src.services.payments import payment_service
+from src.services.rate_limits import rate_limit
+from src.services.user_cache import current_user, kyc_required
+from src.utils.metrics import timed_call
 import base64
 import uuid
-import requests
 import os
 import logging
 from decimal import Decimal
 
 xendit_bp = Blueprint('xendit', __name__)
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Xendit API configuration
@@ -25,6 +29,14 @@ def get_xendit_auth_header():
     encoded_auth = base64.b64encode(auth_string.encode()).decode()
     return f"Basic {encoded_auth}"
 
+# Shared keep-alive client (connection pool, timeouts, retries, circuit breaker)
+xendit_client = ProviderClient('Xendit', XENDIT_API_BASE_URL, headers={
+    'Authorization': get_xendit_auth_header(),
+    'Content-Type': 'application/json',
+    'api-version': '2024-11-11'
+})
+
+@timed_call('Xendit', 'payment_request')
 def mock_xendit_payment_request(amount, channel_code, reference_id):
     """Mock Xendit payment request creation"""
     # In real implementation, this would call Xendit API
@@ -101,17 +113,12 @@ def mock_xendit_payment_request(amount, channel_code, reference_id):
 
 @xendit_bp.route('/xendit/payment-request', methods=['POST'])
 @jwt_required()
+@rate_limit('payment')
+@kyc_required('KYC verification required before making payments')
 def create_payment_request():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
-        
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-        
-        # Check KYC status for payments
-        if user.kyc_status != 'APPROVED':
-            return jsonify({'error': 'KYC verification required before making payments'}), 403
+        user = current_user()
         
         data = request.get_json()
         
@@ -143,34 +150,17 @@ def create_payment_request():
         if channel_code not in valid_channels:
             return jsonify({'error': f'Invalid channel code. Must be one of: {valid_channels}'}), 400
         
-        # Create transaction record
-        transaction = Transaction(
-            user_id=user_id,
-            type=payment_type,
-            amount=amount,
-            status='PENDING',
-            description=f"{payment_type} via {channel_code}"
-        )
-        
-        db.session.add(transaction)
-        db.session.commit()
-        
-        # Create Xendit payment request
-        xendit_response = mock_xendit_payment_request(
-            amount=float(amount),
-            channel_code=channel_code,
-            reference_id=transaction.id
+        # Reserves the Transaction, calls Xendit, then stores its reference
+        created = payment_service.create_payment(
+            'xendit', user_id, payment_type, amount, channel_code, f"{payment_type} via {channel_code}"
         )
+        xendit_response = created.payment.raw
         
-        # Store Xendit payment request ID
-        transaction.xendit_transaction_id = xendit_response['payment_request_id']
-        db.session.commit()
-        
-        logger.info(f"Created payment request for user {user_id}: {xendit_response['payment_request_id']}")
+        logger.info("Created payment request for user %s: %s", user_id, created.payment.reference)
         
         return jsonify({
-            'transaction_id': transaction.id,
-            'payment_request_id': xendit_response['payment_request_id'],
+            'transaction_id': created.transaction_id,
+            'payment_request_id': created.payment.reference,
             'status': xendit_response['status'],
             'channel_code': channel_code,
             'amount': float(amount),
@@ -182,7 +172,7 @@ def create_payment_request():
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error creating payment request: {str(e)}")
+        logger.error("Error creating payment request: %s", e)
         return jsonify({'error': 'Failed to create payment request', 'details': str(e)}), 500
 
 @xendit_bp.route('/xendit/payment-status/<payment_request_id>', methods=['GET'])
@@ -214,7 +204,7 @@ def get_payment_status(payment_request_id):
         }), 200
         
     except Exception as e:
-        logger.error(f"Error getting payment status: {str(e)}")
+        logger.error("Error getting payment status: %s", e)
         return jsonify({'error': 'Failed to get payment status', 'details': str(e)}), 500
 
 @xendit_bp.route('/xendit/simulate-payment', methods=['POST'])
@@ -229,34 +219,48 @@ def simulate_payment():
         payment_request_id = data['payment_request_id']
         status = data.get('status', 'SUCCEEDED')  # SUCCEEDED or FAILED
         
-        # Find transaction
-        transaction = Transaction.query.filter_by(
-            xendit_transaction_id=payment_request_id
-        ).first()
+        # Find transaction, locked so a repeated simulation waits for the first and then sees it settled
+        transaction = db.session.execute(
+            select(Transaction)
+            .filter_by(xendit_transaction_id=payment_request_id)
+            .with_for_update()
+        ).scalar_one_or_none()
         
         if not transaction:
             return jsonify({'error': 'Payment request not found'}), 404
         
+        # Only a PENDING payment moves; a repeat must not credit or debit the wallet again
+        if transaction.status != 'PENDING':
+            db.session.rollback()
+            return jsonify({
+                'error': 'Payment already processed',
+                'outcome': 'ALREADY_PROCESSED',
+                'payment_request_id': payment_request_id,
+                'transaction_id': transaction.id,
+                'status': transaction.status
+            }), 409
+        
         # Update transaction status
         transaction.status = 'SUCCESS' if status == 'SUCCEEDED' else 'FAILED'
         
         # If successful top-up, update wallet balance
         if status == 'SUCCEEDED' and transaction.type == 'TOPUP':
-            user = User.query.get(transaction.user_id)
-            if user:
-                user.wallet_balance += transaction.amount
-                logger.info(f"Updated wallet balance for user {user.id}: {user.wallet_balance}")
+            balance = credit(transaction.user_id, transaction.amount, 'TOPUP', transaction_id=transaction.id)
+            logger.info("Updated wallet balance for user %s: %s", transaction.user_id, balance)
         
         # If successful QRIS payment, deduct from wallet
         elif status == 'SUCCEEDED' and transaction.type == 'QRIS_PAYMENT':
-            user = User.query.get(transaction.user_id)
-            if user:
-                user.wallet_balance -= transaction.amount
-                logger.info(f"Deducted from wallet for user {user.id}: {user.wallet_balance}")
+            try:
+                balance = debit(transaction.user_id, transaction.amount, 'QRIS_PAYMENT', transaction_id=transaction.id)
+            except InsufficientFundsError:
+                transaction.status = 'FAILED'
+                db.session.commit()
+                return jsonify({'error': 'Insufficient wallet balance'}), 400
+            logger.info("Deducted from wallet for user %s: %s", transaction.user_id, balance)
         
         db.session.commit()
         
-        logger.info(f"Simulated payment {payment_request_id}: {status}")
+        logger.info("Simulated payment %s: %s", payment_request_id, status)
         
         return jsonify({
             'message': f'Payment {status.lower()} simulated successfully',
@@ -267,33 +271,21 @@ def simulate_payment():
         
     except Exception as e:
         db.session.rollback()
-        logger.error(f"Error simulating payment: {str(e)}")
+        logger.error("Error simulating payment: %s", e)
         return jsonify({'error': 'Failed to simulate payment', 'details': str(e)}), 500
 
 # Real Xendit API integration functions (for future implementation)
-def call_xendit_api(endpoint, method='GET', data=None):
-    """Call actual Xendit API (placeholder for real implementation)"""
-    headers = {
-        'Authorization': get_xendit_auth_header(),
-        'Content-Type': 'application/json',
-        'api-version': '2024-11-11'
-    }
-    
-    url = f"{XENDIT_API_BASE_URL}/{endpoint}"
-    
-    try:
-        if method == 'POST':
-            response = requests.post(url, json=data, headers=headers, timeout=30)
-        else:
-            response = requests.get(url, headers=headers, timeout=30)
-        
-        response.raise_for_status()
-        return response.json()
-    
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Xendit API call failed: {str(e)}")
-        raise Exception(f"Xendit API error: {str(e)}")
+def call_xendit_api(endpoint, method='GET', data=None, idempotency_key=None):
+    """Call actual Xendit API (placeholder for real implementation)
+
+    POSTs are only retried when they carry an idempotency key, which Xendit
+    uses to ignore the duplicate. Raises ProviderError.
+    """
+    headers = {'Idempotency-key': idempotency_key} if idempotency_key else None
+    return xendit_client.request(method, endpoint, json=data, headers=headers,
+                                 idempotent=method != 'POST' or idempotency_key is not None)
 
+@timed_call('Xendit', 'payment_request')
 def real_xendit_create_payment_request(amount, channel_code, reference_id):
     """Real Xendit payment request creation (placeholder for actual implementation)"""
     payload = {
@@ -306,5 +298,5 @@ def real_xendit_create_payment_request(amount, channel_code, reference_id):
         "capture_method": "AUTOMATIC"
     }
     
-    return call_xendit_api('v3/payment_requests', 'POST', payload)
+    return call_xendit_api('v3/payment_requests', 'POST', payload, idempotency_key=reference_id)
 
@@ -0,0 +1,83 @@
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from src.models.user import User, Transaction
+from collections import namedtuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+BALANCE = 'balance'
+KYC = 'kyc'
+PROFILE = 'profile'
+TRANSACTION = 'transaction'
+
+# User attributes shown by /auth/profile besides the balance and KYC status
+PROFILE_ATTRIBUTES = ('full_name', 'email', 'passport_number', 'phone_number')
+
+UserChange = namedtuple('UserChange', ['user_id', 'kind', 'data'])
+
+_PENDING_KEY = 'sol_user_changes'
+_listeners = []
+
+def subscribe(listener):
+    """Call listener(changes) with the list of UserChange after every commit that made some"""
+    _listeners.append(listener)
+
+def record(session, user_id, kind, data=None):
+    """Note a change to a user, to be announced once the session commits.
+
+    ORM changes to User rows and Transaction statuses are picked up
+    automatically; call this for changes made with Core statements (ledger
+    balance updates, bulk settlement).
+    """
+    session.info.setdefault(_PENDING_KEY, []).append(UserChange(user_id, kind, data or {}))
+
+def transaction_data(transaction, status=None):
+    return {
+        'transaction_id': transaction.id,
+        'transaction_type': transaction.type,
+        'status': status or transaction.status,
+        'amount': float(transaction.amount),
+        'reference_no': transaction.xendit_transaction_id
+    }
+
+def _changed(obj, attribute):
+    return inspect(obj).attrs[attribute].history.has_changes()
+
+@event.listens_for(Session, 'before_flush')
+def _collect_user_changes(session, flush_context, instances):
+    for obj in session.dirty:
+        if isinstance(obj, Transaction):
+            if _changed(obj, 'status'):
+                record(session, obj.user_id, TRANSACTION, transaction_data(obj))
+            continue
+        if not isinstance(obj, User):
+            continue
+        if _changed(obj, 'kyc_status'):
+            record(session, obj.id, KYC, {'kyc_status': obj.kyc_status})
+        if _changed(obj, 'wallet_balance'):
+            record(session, obj.id, BALANCE, {'balance': obj.wallet_balance})
+        if any(_changed(obj, attribute) for attribute in PROFILE_ATTRIBUTES):
+            record(session, obj.id, PROFILE)
+
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            record(session, obj.id, PROFILE)
+
+@event.listens_for(Session, 'after_commit')
+def _announce_user_changes(session):
+    # Listeners run only once the data is visible to other connections
+    changes = session.info.pop(_PENDING_KEY, None)
+    if not changes:
+        return
+    for listener in _listeners:
+        try:
+            listener(changes)
+        except Exception as e:
+            logger.error("User change listener %s failed: %s", listener.__name__, e)
+
+@event.listens_for(Session, 'after_transaction_end')
+def _discard_uncommitted_changes(session, transaction):
+    # Rolled back or closed without committing: nothing happened
+    if transaction.parent is None:
+        session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,192 @@
+from requests.adapters import HTTPAdapter
+import logging
+import os
+import random
+import requests
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Separate budgets for establishing a connection and for waiting on the response
+PROVIDER_CONNECT_TIMEOUT = float(os.getenv('PROVIDER_CONNECT_TIMEOUT', '3.05'))
+PROVIDER_READ_TIMEOUT = float(os.getenv('PROVIDER_READ_TIMEOUT', '10'))
+# Extra attempts for idempotent calls, with full-jitter exponential backoff
+PROVIDER_MAX_RETRIES = int(os.getenv('PROVIDER_MAX_RETRIES', '2'))
+PROVIDER_RETRY_BACKOFF = float(os.getenv('PROVIDER_RETRY_BACKOFF', '0.2'))
+PROVIDER_RETRY_MAX_SLEEP = float(os.getenv('PROVIDER_RETRY_MAX_SLEEP', '2'))
+# Kept-alive connections per provider host, per process
+PROVIDER_POOL_SIZE = int(os.getenv('PROVIDER_POOL_SIZE', '20'))
+# Consecutive failures that open the circuit, and how long it stays open
+PROVIDER_BREAKER_THRESHOLD = int(os.getenv('PROVIDER_BREAKER_THRESHOLD', '5'))
+PROVIDER_BREAKER_RESET = float(os.getenv('PROVIDER_BREAKER_RESET', '30'))
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+RETRY_STATUSES = frozenset([429, 502, 503, 504])
+
+class ProviderError(Exception):
+    """Raised when a provider call fails after its retries"""
+
+    def __init__(self, message, provider=None, status_code=None, response=None):
+        super().__init__(message)
+        self.provider = provider
+        self.status_code = status_code
+        self.response = response
+
+class CircuitOpenError(ProviderError):
+    """Raised without calling the provider while its circuit breaker is open"""
+
+class CircuitBreaker:
+    """Fails fast after repeated provider failures.
+
+    Closed: calls go through and consecutive failures are counted. Open:
+    calls are refused until reset_timeout has passed. Half-open: one trial
+    call is let through; success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name='provider', failure_threshold=PROVIDER_BREAKER_THRESHOLD,
+                 reset_timeout=PROVIDER_BREAKER_RESET):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning("%s circuit opened after %s consecutive failures", self.name, self._failures)
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+class ProviderClient:
+    """Keep-alive HTTP client for one provider API.
+
+    Each process gets its own requests.Session with a connection pool for the
+    provider host, so repeated calls reuse TCP and TLS connections. GET and
+    other idempotent calls (or calls marked idempotent=True, such as POSTs
+    carrying an idempotency key) are retried on connection errors, timeouts
+    and 429/502/503/504 responses; any call is retried when the connection
+    could not be established. Failures feed a circuit breaker that refuses
+    calls for a while once the provider looks down.
+    """
+
+    def __init__(self, name, base_url, headers=None, connect_timeout=PROVIDER_CONNECT_TIMEOUT,
+                 read_timeout=PROVIDER_READ_TIMEOUT, max_retries=PROVIDER_MAX_RETRIES,
+                 retry_backoff=PROVIDER_RETRY_BACKOFF, pool_size=PROVIDER_POOL_SIZE, breaker=None):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.headers = headers or {}
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.pool_size = pool_size
+        self.breaker = breaker or CircuitBreaker(name)
+        self._lock = threading.Lock()
+        self._session = None
+        self._session_pid = None
+
+    @property
+    def session(self):
+        # Created lazily and per process; sockets must not be shared across a fork
+        with self._lock:
+            if self._session is None or self._session_pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers.update(self.headers)
+                self._session = session
+                self._session_pid = os.getpid()
+            return self._session
+
+    def _sleep_before_retry(self, attempt, response=None):
+        delay = random.uniform(0, min(PROVIDER_RETRY_MAX_SLEEP, self.retry_backoff * 2 ** attempt))
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            delay = min(PROVIDER_RETRY_MAX_SLEEP, max(delay, float(retry_after)))
+        time.sleep(delay)
+
+    def request(self, method, path, json=None, data=None, headers=None, idempotent=None, timeout=None):
+        """Call the provider and return the decoded JSON body. Raises ProviderError.
+
+        Pass data (bytes) instead of json to send a body that was already
+        serialized, such as one that has been signed.
+        """
+        method = method.upper()
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        url = f"{self.base_url}/{path.lstrip('/')}"
+
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError(f"{self.name} API unavailable (circuit open)", provider=self.name)
+
+            response = None
+            try:
+                response = self.session.request(method, url, json=json, data=data, headers=headers,
+                                                timeout=timeout or self.timeout)
+            except requests.exceptions.ConnectTimeout as e:
+                error, retryable = e, True  # Nothing was sent, so any method can be retried
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error, retryable = e, idempotent
+            except requests.exceptions.RequestException as e:
+                error, retryable = e, False
+            else:
+                if response.status_code < 500 and response.status_code != 429:
+                    # The provider answered; 4xx is the caller's problem, not an outage
+                    self.breaker.record_success()
+                    if response.status_code >= 400:
+                        raise ProviderError(f"{self.name} API error: {response.status_code} {response.text[:200]}",
+                                            provider=self.name, status_code=response.status_code, response=response)
+                    return response.json() if response.content else {}
+
+                error = f"{response.status_code} {response.text[:200]}"
+                retryable = idempotent and response.status_code in RETRY_STATUSES
+
+            self.breaker.record_failure()
+
+            if not retryable or attempt >= self.max_retries:
+                logger.error("%s API call %s %s failed after %s attempts: %s", self.name, method, path, attempt + 1, error)
+                raise ProviderError(f"{self.name} API error: {error}", provider=self.name,
+                                    status_code=response.status_code if response is not None else None,
+                                    response=response)
+
+            logger.warning("%s API call %s %s failed (attempt %s), retrying: %s", self.name, method, path, attempt + 1, error)
+            self._sleep_before_retry(attempt, response)
+            attempt += 1
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, json=None, **kwargs):
+        return self.request('POST', path, json=json, **kwargs)
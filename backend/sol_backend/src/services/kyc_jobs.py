@@ -0,0 +1,300 @@
+from flask import current_app
+from sqlalchemy import and_, or_, select, update
+from src.models.kyc import KycJob
+from src.models.user import User, db
+from src.services.kyc_providers import get_provider
+from src.services.uploads import discard_files
+from src.services.webhooks import LocalWakeup, RedisWakeup
+from src.utils.metrics import timed_call
+from src.utils.redis_client import get_redis
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import logging
+import os
+import random
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Threads per process running provider checks; each job uses up to three at once
+KYC_CHECK_THREADS = int(os.getenv('KYC_CHECK_THREADS', '8'))
+WAKEUP_KEY = 'sol:kyc:wakeup'
+
+ACTIVE_STATUSES = ('QUEUED', 'RUNNING')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def check_executor():
+    """The thread pool the checks run on, created on first use in each process (after the fork)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=KYC_CHECK_THREADS, thread_name_prefix='kyc-check')
+        return _executor
+
+def enqueue(user, kyc_id, passport_image, selfie_image, lease_seconds=None):
+    """Add a job for the stored images and mark the user's KYC as pending. Nothing is committed here.
+
+    With lease_seconds the job is created already leased to the caller,
+    which runs it itself (see process_job); the token is returned with the job.
+    """
+    job = KycJob(id=kyc_id, user_id=user.id, passport_image=passport_image, selfie_image=selfie_image)
+    token = None
+    if lease_seconds is not None:
+        token = str(uuid.uuid4())
+        job.status = 'RUNNING'
+        job.attempts = 1
+        job.locked_by = token
+        job.locked_until = datetime.utcnow() + timedelta(seconds=lease_seconds)
+    db.session.add(job)
+
+    user.privy_kyc_id = kyc_id
+    user.kyc_status = 'PENDING'
+    return job, token
+
+def active_job(user_id):
+    """The user's queued or running job, if any"""
+    return db.session.execute(
+        select(KycJob).where(KycJob.user_id == user_id, KycJob.status.in_(ACTIVE_STATUSES)).limit(1)
+    ).scalar()
+
+def _same_passport(read, registered):
+    return read.replace(' ', '').upper() == registered.replace(' ', '').upper()
+
+def decide(results, registered_passport=None):
+    """APPROVED or REJECTED from the three check results.
+
+    A passport number read by OCR must match the one the user registered.
+    """
+    read_passport = results['ocr'].get('passport_number')
+    if read_passport and registered_passport and not _same_passport(read_passport, registered_passport):
+        return 'REJECTED'
+
+    if (results['ocr']['confidence_score'] > 0.8 and
+            results['liveness']['is_live'] and
+            results['face_match']['is_match']):
+        return 'APPROVED'
+    return 'REJECTED'
+
+def _run_checks(provider, job, registered_passport):
+    """Run the checks that have no result yet in parallel.
+
+    Yields (check, result, error) as each one finishes, so a slow check
+    does not hold back recording the others.
+    """
+    calls = {
+        'ocr': (provider.ocr, (job.passport_image, registered_passport)),
+        'liveness': (provider.liveness, (job.selfie_image,)),
+        'face_match': (provider.face_match, (job.passport_image, job.selfie_image))
+    }
+    name = getattr(provider, 'name', type(provider).__name__)
+    executor = check_executor()
+    futures = {
+        executor.submit(timed_call(name, check)(call), *args): check
+        for check, (call, args) in calls.items()
+        if job.results()[check] is None
+    }
+    for future in as_completed(futures):
+        try:
+            yield futures[future], future.result(), None
+        except Exception as e:
+            yield futures[future], None, e
+
+def claim_job(lease_seconds):
+    """Lease one due job to this worker. Returns (token, job id or None).
+
+    Same claim as the webhook queue: QUEUED jobs that are due, or RUNNING
+    jobs whose lease expired because a worker died, marked RUNNING under a
+    fresh token in one UPDATE.
+    """
+    now = datetime.utcnow()
+    token = str(uuid.uuid4())
+    due = or_(
+        and_(KycJob.status == 'QUEUED', KycJob.next_attempt_at <= now),
+        and_(KycJob.status == 'RUNNING', KycJob.locked_until < now)
+    )
+    candidates = select(KycJob.id)\
+        .where(due)\
+        .order_by(KycJob.next_attempt_at)\
+        .limit(1)\
+        .with_for_update(skip_locked=True)
+
+    stmt = update(KycJob)\
+        .where(KycJob.id.in_(candidates), due)\
+        .values(
+            status='RUNNING',
+            attempts=KycJob.attempts + 1,
+            locked_by=token,
+            locked_until=now + timedelta(seconds=lease_seconds)
+        )\
+        .returning(KycJob.id)\
+        .execution_options(synchronize_session=False)
+
+    job_id = db.session.execute(stmt).scalar()
+    db.session.commit()
+    return token, job_id
+
+def _finish(job_id, token, **values):
+    """Update a job only while this worker still holds its lease"""
+    result = db.session.execute(
+        update(KycJob)
+        .where(KycJob.id == job_id, KycJob.locked_by == token)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+def _apply_result(job, status):
+    """Record the outcome on the user, unless a newer KYC attempt has replaced this one"""
+    user = db.session.get(User, job.user_id)
+    if user is None or user.privy_kyc_id != job.id:
+        logger.info("KYC %s finished as %s after the user moved on; user record left as is", job.id, status)
+        return
+
+    # The passport number stays as registered (it is unique per user); decide() compared it with OCR
+    user.kyc_status = status
+
+def _discard_images(job_id, images):
+    """Delete a finished job's passport and selfie; they are not kept past the decision"""
+    for path in discard_files(images):
+        logger.error("Could not delete KYC image %s of job %s", path, job_id)
+
+def process_job(job_id, token, max_attempts, retry_backoff):
+    """Run one leased job. Returns True once it has a final status.
+
+    Each check's result is committed as it arrives, which is the progress
+    reported by the status endpoint; a retried job only repeats the checks
+    that failed. The decision and the user update share one transaction.
+    Once the job has a final status its stored images are deleted.
+    """
+    job = db.session.get(KycJob, job_id)
+    images = (job.passport_image, job.selfie_image)
+    provider = get_provider()
+    failed = None
+
+    try:
+        registered_passport = db.session.execute(
+            select(User.passport_number).where(User.id == job.user_id)
+        ).scalar()
+        for check, result, error in _run_checks(provider, job, registered_passport):
+            if error is not None:
+                failed = failed or (check, error)
+                continue
+            if not _finish(job_id, token, **{f'{check}_result': result}):
+                # The lease expired and another worker took the job over
+                db.session.rollback()
+                logger.warning("Lost lease on KYC job %s", job_id)
+                return False
+            db.session.commit()
+            logger.info("KYC %s %s result recorded", job_id, check, extra={'result': result})
+
+        if failed is not None:
+            check, error = failed
+            raise RuntimeError(f"{check} check failed: {str(error) or type(error).__name__}")
+
+        job = db.session.get(KycJob, job_id)
+        status = decide(job.results(), registered_passport)
+        if not _finish(job_id, token, status=status, finished_at=datetime.utcnow(),
+                       locked_by=None, locked_until=None, last_error=None):
+            db.session.rollback()
+            logger.warning("Lost lease on KYC job %s", job_id)
+            return False
+        _apply_result(job, status)
+        db.session.commit()
+        _discard_images(job_id, images)
+
+        logger.info("KYC completed for user %s: %s", job.user_id, status)
+        return True
+
+    except Exception as e:
+        db.session.rollback()
+        error = str(e) or type(e).__name__
+        attempts = db.session.get(KycJob, job_id).attempts
+
+        if attempts >= max_attempts:
+            values = {'status': 'FAILED', 'finished_at': datetime.utcnow()}
+            logger.error("KYC job %s failed after %s attempts: %s", job_id, attempts, error)
+        else:
+            delay = retry_backoff * 2 ** (attempts - 1) * random.uniform(0.5, 1.5)
+            values = {'status': 'QUEUED', 'next_attempt_at': datetime.utcnow() + timedelta(seconds=delay)}
+            logger.warning("KYC job %s failed (attempt %s), retrying in %.1fs: %s", job_id, attempts, delay, error)
+
+        finished = _finish(job_id, token, locked_by=None, locked_until=None, last_error=error[:1000], **values)
+        db.session.commit()
+        if finished and attempts >= max_attempts:
+            _discard_images(job_id, images)
+        return attempts >= max_attempts
+
+def process_next():
+    """Claim and run one due job. Returns True if one was claimed."""
+    config = current_app.config
+    token, job_id = claim_job(config['KYC_LEASE_SECONDS'])
+    if job_id is None:
+        return False
+
+    process_job(job_id, token, config['KYC_MAX_ATTEMPTS'], config['KYC_RETRY_BACKOFF'])
+    db.session.expunge_all()
+    return True
+
+def queue_depth():
+    """Number of jobs per status"""
+    rows = db.session.execute(
+        select(KycJob.status, db.func.count()).group_by(KycJob.status)
+    ).all()
+    return {status: count for status, count in rows}
+
+_wakeup = None
+
+def wakeup():
+    """The wakeup channel for KYC workers: Redis when REDIS_URL is set, else in-process"""
+    global _wakeup
+    if _wakeup is None:
+        client = get_redis(current_app.config.get('REDIS_URL'))
+        _wakeup = RedisWakeup(client, WAKEUP_KEY) if client is not None else LocalWakeup()
+    return _wakeup
+
+class KycWorkerPool:
+    """Threads that take KYC jobs off the queue one at a time"""
+
+    def __init__(self, app, workers, poll_interval):
+        self.app = app
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        with self.app.app_context():
+            self._wakeup = wakeup()
+
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'kyc-worker-{number}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wakeup.notify()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            claimed = False
+            with self.app.app_context():
+                try:
+                    claimed = process_next()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error("KYC worker failed to claim a job: %s", e)
+
+            if not claimed:
+                self._wakeup.wait(self.poll_interval)
+
+def start_workers(app):
+    """Start the KYC worker pool configured by KYC_WORKERS"""
+    pool = KycWorkerPool(app, app.config['KYC_WORKERS'], app.config['KYC_POLL_INTERVAL'])
+    pool.start()
+    return pool
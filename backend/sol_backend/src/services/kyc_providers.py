@@ -0,0 +1,113 @@
+from flask import current_app
+from src.services.http_client import ProviderClient
+import base64
+import os
+import time
+
+# Mock Privy API configuration
+PRIVY_API_BASE_URL = os.getenv('PRIVY_API_BASE_URL', 'https://api.privy.id/v1')
+PRIVY_API_KEY = os.getenv('PRIVY_API_KEY', 'mock-api-key')
+
+# Shared keep-alive client (connection pool, timeouts, retries, circuit breaker)
+privy_client = ProviderClient('Privy', PRIVY_API_BASE_URL, headers={
+    'Authorization': f'Bearer {PRIVY_API_KEY}',
+    'Content-Type': 'application/json'
+})
+
+class StubKycProvider:
+    """Local stand-in for Privy returning fixed results, for development and tests.
+
+    Each check returns a copy of the matching result dict; pass your own to
+    simulate a rejection, and delay (seconds) to simulate provider latency.
+    OCR reads back the user's registered passport number unless the result
+    dict has its own. Checks are called from several threads at once and
+    must stay thread-safe.
+    """
+    name = 'stub'
+
+    def __init__(self, ocr=None, liveness=None, face_match=None, delay=0):
+        self.ocr_result = ocr or {
+            'full_name': 'JOHN DOE',
+            'nationality': 'USA',
+            'date_of_birth': '1990-01-01',
+            'expiry_date': '2030-01-01',
+            'confidence_score': 0.95
+        }
+        self.liveness_result = liveness or {
+            'is_live': True,
+            'confidence_score': 0.92,
+            'face_detected': True
+        }
+        self.face_match_result = face_match or {
+            'is_match': True,
+            'confidence_score': 0.88
+        }
+        self.delay = delay
+
+    def _respond(self, result):
+        if self.delay:
+            time.sleep(self.delay)
+        return dict(result)
+
+    def ocr(self, passport_image, registered_passport=None):
+        """Passport OCR"""
+        result = self._respond(self.ocr_result)
+        if registered_passport and 'passport_number' not in result:
+            result['passport_number'] = registered_passport
+        return result
+
+    def liveness(self, selfie_image):
+        """Selfie liveness detection"""
+        return self._respond(self.liveness_result)
+
+    def face_match(self, passport_image, selfie_image):
+        """Face matching between passport and selfie"""
+        return self._respond(self.face_match_result)
+
+def _encode_image(path):
+    with open(path, 'rb') as f:
+        return base64.b64encode(f.read()).decode()
+
+class PrivyKycProvider:
+    """Privy's verification API (placeholder until Privy API access is available). Raises ProviderError.
+
+    The checks only read the images, so they are sent as idempotent and
+    retried on timeouts.
+    """
+    name = 'Privy'
+
+    def __init__(self, client=privy_client):
+        self.client = client
+
+    def ocr(self, passport_image, registered_passport=None):
+        # Privy reads the number from the image; the registered one is only compared afterwards
+        return self.client.post('kyc/ocr', json={'image': _encode_image(passport_image)}, idempotent=True)
+
+    def liveness(self, selfie_image):
+        return self.client.post('kyc/liveness', json={'image': _encode_image(selfie_image)}, idempotent=True)
+
+    def face_match(self, passport_image, selfie_image):
+        return self.client.post('kyc/face-match', json={
+            'passport_image': _encode_image(passport_image),
+            'selfie_image': _encode_image(selfie_image)
+        }, idempotent=True)
+
+PROVIDERS = {
+    'stub': StubKycProvider,
+    'privy': PrivyKycProvider
+}
+
+_providers = {}
+
+def get_provider():
+    """The verification backend named by KYC_PROVIDER (stub or privy).
+
+    KYC_PROVIDER may also be a provider object, which tests use to plug in
+    a configured StubKycProvider.
+    """
+    provider = current_app.config['KYC_PROVIDER']
+    if not isinstance(provider, str):
+        return provider
+    if provider not in _providers:
+        _providers[provider] = PROVIDERS[provider]()
+    return _providers[provider]
@@ -0,0 +1,137 @@
+from sqlalchemy import case, func, insert, update
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.util import identity_key
+from src.models.user import User, db
+from src.models.ledger import LedgerEntry
+from src.services import change_events, stats
+from decimal import Decimal
+
+class LedgerError(Exception):
+    """Raised when a wallet balance change cannot be applied"""
+
+class InsufficientFundsError(LedgerError):
+    """Raised when a debit would take a wallet balance below zero"""
+
+def _sync_loaded_user(user_id, balance):
+    """Keep an already-loaded User instance in step with the database balance"""
+    user = db.session.identity_map.get(identity_key(User, user_id))
+    if user is not None:
+        set_committed_value(user, 'wallet_balance', balance)
+
+def _apply_delta(user_id, delta, *conditions):
+    """Atomically add delta to the balance, returning the new balance or None"""
+    stmt = update(User)\
+        .where(User.id == user_id, *conditions)\
+        .values(wallet_balance=func.coalesce(User.wallet_balance, 0) + delta)\
+        .returning(User.wallet_balance)\
+        .execution_options(synchronize_session=False)
+
+    row = db.session.execute(stmt).first()
+    if row is None:
+        return None
+
+    stats.record({stats.WALLET_BALANCE_TOTAL: delta})
+
+    balance = Decimal(str(row[0]))
+    _sync_loaded_user(user_id, balance)
+    change_events.record(db.session, user_id, change_events.BALANCE, {'balance': balance})
+    return balance
+
+def _append_entry(user_id, amount, balance_after, entry_type, transaction_id):
+    entry = LedgerEntry(
+        user_id=user_id,
+        transaction_id=transaction_id,
+        entry_type=entry_type,
+        amount=amount,
+        balance_after=balance_after
+    )
+    db.session.add(entry)
+    return entry
+
+def credit(user_id, amount, entry_type, transaction_id=None):
+    """Add amount to a wallet and record it in the ledger.
+
+    The balance is changed with a single UPDATE, so concurrent credits and
+    debits never overwrite each other. Nothing is committed here; the caller
+    commits together with the related Transaction change.
+    """
+    amount = Decimal(str(amount))
+    if amount <= 0:
+        raise LedgerError('Credit amount must be greater than 0')
+
+    balance = _apply_delta(user_id, amount)
+    if balance is None:
+        raise LedgerError(f'User {user_id} not found')
+
+    _append_entry(user_id, amount, balance, entry_type, transaction_id)
+    return balance
+
+def debit(user_id, amount, entry_type, transaction_id=None):
+    """Remove amount from a wallet if it is covered and record it in the ledger.
+
+    Uses ``UPDATE ... WHERE wallet_balance >= :amount`` so the balance check
+    and the write happen in one statement. Raises InsufficientFundsError when
+    no row matched. Nothing is committed here.
+    """
+    amount = Decimal(str(amount))
+    if amount <= 0:
+        raise LedgerError('Debit amount must be greater than 0')
+
+    balance = _apply_delta(user_id, -amount, func.coalesce(User.wallet_balance, 0) >= amount)
+    if balance is None:
+        raise InsufficientFundsError('Insufficient wallet balance')
+
+    _append_entry(user_id, -amount, balance, entry_type, transaction_id)
+    return balance
+
+def credit_many(credits):
+    """Apply many credits with one UPDATE and one ledger INSERT.
+
+    credits is a list of (user_id, amount, entry_type, transaction_id). Each
+    user's balance moves by the sum of their credits in a single
+    ``UPDATE ... SET wallet_balance = wallet_balance + CASE id ... END``; the
+    ledger entries get running balances in list order. Returns the new
+    balance per user. Nothing is committed here.
+    """
+    totals = {}
+    for user_id, amount, entry_type, transaction_id in credits:
+        amount = Decimal(str(amount))
+        if amount <= 0:
+            raise LedgerError('Credit amount must be greater than 0')
+        totals[user_id] = totals.get(user_id, Decimal('0')) + amount
+
+    if not totals:
+        return {}
+
+    stmt = update(User)\
+        .where(User.id.in_(totals))\
+        .values(wallet_balance=func.coalesce(User.wallet_balance, 0) + case(totals, value=User.id))\
+        .returning(User.id, User.wallet_balance)\
+        .execution_options(synchronize_session=False)
+
+    balances = {user_id: Decimal(str(balance)) for user_id, balance in db.session.execute(stmt)}
+    missing = set(totals) - set(balances)
+    if missing:
+        raise LedgerError(f'User {sorted(missing)[0]} not found')
+
+    stats.record({stats.WALLET_BALANCE_TOTAL: sum(totals.values())})
+
+    # Walk forward from each user's balance before the batch
+    running = {user_id: balances[user_id] - total for user_id, total in totals.items()}
+    entries = []
+    for user_id, amount, entry_type, transaction_id in credits:
+        running[user_id] += Decimal(str(amount))
+        entries.append({
+            'user_id': user_id,
+            'transaction_id': transaction_id,
+            'entry_type': entry_type,
+            'amount': Decimal(str(amount)),
+            'balance_after': running[user_id]
+        })
+    db.session.execute(insert(LedgerEntry), entries)
+
+    for user_id, balance in balances.items():
+        _sync_loaded_user(user_id, balance)
+        change_events.record(db.session, user_id, change_events.BALANCE, {'balance': balance})
+
+    return balances
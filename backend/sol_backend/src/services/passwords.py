@@ -0,0 +1,117 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+import bcrypt
+import logging
+import multiprocessing
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Defaults for a hasher built outside an app; create_app applies the BCRYPT_* settings
+DEFAULT_ROUNDS = 12
+DEFAULT_TIMEOUT = 5
+
+class HasherBusyError(Exception):
+    """Raised when the hashing pool is saturated and the caller should retry later"""
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+def _checkpw(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+def hash_cost(hashed):
+    """Return the work factor encoded in a bcrypt hash such as $2b$12$..."""
+    try:
+        return int(hashed.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded process pool instead of on the request thread"""
+
+    def __init__(self, rounds=DEFAULT_ROUNDS, pool_size=None, max_pending=None, timeout=DEFAULT_TIMEOUT,
+                 mp_context='fork'):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._set(rounds, pool_size, max_pending, timeout, mp_context)
+
+    def _set(self, rounds, pool_size, max_pending, timeout, mp_context):
+        self.rounds = rounds
+        # Worker processes per server process (0 hashes inline on the calling thread)
+        self.pool_size = (os.cpu_count() or 1) if pool_size is None else pool_size
+        # Hash operations allowed to be running or queued before callers get HasherBusyError
+        self.max_pending = max(self.pool_size, 1) * 4 if max_pending is None else max_pending
+        self.timeout = timeout
+        self.mp_context = mp_context
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def configure(self, config):
+        """Apply the BCRYPT_* settings of an app config, replacing any running pool"""
+        self.shutdown()
+        self._set(config['BCRYPT_ROUNDS'], config['BCRYPT_POOL_SIZE'], config['BCRYPT_MAX_PENDING'],
+                  config['BCRYPT_TIMEOUT'], config['BCRYPT_MP_CONTEXT'])
+
+    def _get_executor(self):
+        # Created lazily and per process, so pre-forked server workers each get their own pool
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.pool_size,
+                    mp_context=multiprocessing.get_context(self.mp_context)
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, *args):
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise HasherBusyError('Too many password operations in progress')
+
+        if self.pool_size <= 0:
+            try:
+                return fn(*args)
+            finally:
+                slots.release()
+
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except BaseException:
+            slots.release()
+            raise
+        # The slot is freed when the work finishes, not when a caller gives up waiting on it,
+        # so max_pending also bounds operations still running after a timeout
+        future.add_done_callback(lambda _: slots.release())
+
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise HasherBusyError('Password operation timed out')
+
+    def hash(self, password):
+        """Hash a password with the configured work factor"""
+        return self._run(_hashpw, password.encode('utf-8'), self.rounds).decode('utf-8')
+
+    def verify(self, password, hashed):
+        """Check a password against a stored bcrypt hash"""
+        return self._run(_checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+    def needs_rehash(self, hashed):
+        """True when a stored hash was made with a different work factor"""
+        return hash_cost(hashed) != self.rounds
+
+    def warm_up(self):
+        """Start the worker processes now rather than on the first login"""
+        if self.pool_size > 0:
+            futures = [self._get_executor().submit(hash_cost, '$2b$04$') for _ in range(self.pool_size)]
+            for future in futures:
+                future.result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._executor_pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_hasher = PasswordHasher()
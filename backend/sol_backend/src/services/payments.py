@@ -0,0 +1,156 @@
+from flask import current_app
+from collections import namedtuple
+from src.models.user import Transaction, db
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+class ProviderPayment(namedtuple('ProviderPayment', ['reference', 'virtual_account', 'qr_content', 'raw'])):
+    """A payment created at a provider.
+
+    reference is the provider's id for it (stored in
+    Transaction.xendit_transaction_id), virtual_account a dict of number,
+    bank_code and expired_time for virtual account payments, qr_content
+    the QRIS string for QR payments, and raw the provider's own response.
+    """
+    __slots__ = ()
+
+class CreatedPayment(namedtuple('CreatedPayment', ['transaction_id', 'status', 'payment', 'completion'])):
+    """Result of PaymentService.create_payment.
+
+    Plain values, so reading them after the final commit costs no query to
+    refresh the expired Transaction; completion is what complete() returned.
+    """
+    __slots__ = ()
+
+class DokuAdapter:
+    """DOKU SNAP: QRIS for the QRIS channel, a virtual account for anything else"""
+    name = 'DOKU'
+
+    def create_payment(self, amount, reference_id, channel):
+        # The helpers live with the DOKU routes (signing, token cache, mock responses)
+        from src.routes.doku import create_virtual_account, generate_qris
+
+        if channel == 'QRIS':
+            response = generate_qris(amount=float(amount), reference_id=reference_id)
+            return ProviderPayment(response['referenceNo'], None, response['qrContent'], response)
+
+        response = create_virtual_account(amount=float(amount), reference_id=reference_id)
+        info = response['virtualAccountInfo']
+        return ProviderPayment(response['referenceNo'], {
+            'number': info['virtualAccountNumber'],
+            'bank_code': info['bankCode'],
+            'expired_time': info['expiredTime']
+        }, None, response)
+
+class XenditAdapter:
+    """Xendit payment requests, for any of its channel codes"""
+    name = 'Xendit'
+
+    def create_payment(self, amount, reference_id, channel):
+        from src.routes.xendit import mock_xendit_payment_request
+
+        response = mock_xendit_payment_request(amount=float(amount), channel_code=channel, reference_id=reference_id)
+        properties = response.get('channel_properties') or {}
+        virtual_account = None
+        if 'virtual_account_number' in properties:
+            virtual_account = {
+                'number': properties['virtual_account_number'],
+                'bank_code': properties.get('bank_code'),
+                'expired_time': response.get('expires_at')
+            }
+        qr_content = next((action['qr_string'] for action in response.get('actions', []) if 'qr_string' in action), None)
+        return ProviderPayment(response['payment_request_id'], virtual_account, qr_content, response)
+
+ADAPTERS = {
+    'doku': DokuAdapter,
+    'xendit': XenditAdapter
+}
+
+_adapters = {}
+
+def get_adapter(provider):
+    """The adapter for provider ('doku' or 'xendit'), or provider itself if it is an adapter object"""
+    if not isinstance(provider, str):
+        return provider
+    if provider not in _adapters:
+        _adapters[provider] = ADAPTERS[provider]()
+    return _adapters[provider]
+
+def wallet_provider():
+    """The provider behind /wallet/topup and /wallet/qris-pay (WALLET_PAYMENT_PROVIDER).
+
+    The setting may also be an adapter object, which benchmarks use to
+    plug in one with simulated latency.
+    """
+    return current_app.config['WALLET_PAYMENT_PROVIDER']
+
+class PaymentService:
+    """Creates provider payments and their Transaction rows.
+
+    The Transaction is reserved as PENDING and committed before the
+    provider call, its id doubling as the provider's reference, so a
+    payment the provider accepted always has a row for its webhook to
+    settle, even if the worker dies before the provider answers. The call
+    itself is made without a database transaction (or pooled connection)
+    held open. The provider's reference and whatever complete() changes
+    are then stored in one final commit; a failed provider call marks the
+    reserved row FAILED.
+    """
+
+    def create_payment(self, provider, user_id, payment_type, amount, channel, description, complete=None):
+        """Create the payment and its Transaction. Returns a CreatedPayment.
+
+        complete(transaction, payment), if given, runs before the final
+        commit, so changes it makes (such as a debit, or setting the status)
+        are committed with the provider's reference. The session must have
+        no pending changes other than the caller's own: the reservation
+        commit writes them too. Provider errors are raised unchanged.
+        """
+        adapter = get_adapter(provider)
+        transaction_id = str(uuid.uuid4())
+
+        # Reserve the row; the commit also ends the read transaction the auth checks
+        # opened, which would otherwise hold a connection for the whole call
+        transaction = Transaction(
+            id=transaction_id,
+            user_id=user_id,
+            type=payment_type,
+            amount=amount,
+            status='PENDING',
+            description=description
+        )
+        db.session.add(transaction)
+        db.session.commit()
+
+        try:
+            payment = adapter.create_payment(amount, transaction_id, channel)
+        except Exception:
+            try:
+                transaction.status = 'FAILED'
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error("Could not mark transaction %s FAILED after the %s call failed: %s",
+                             transaction_id, adapter.name, e)
+            raise
+
+        try:
+            # Setting a column on the expired row needs no refresh; complete() may load it
+            transaction.xendit_transaction_id = payment.reference
+            completion = None
+            status = 'PENDING'
+            if complete is not None:
+                completion = complete(transaction, payment)
+                status = transaction.status
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.error("Created %s payment %s but could not store it on transaction %s",
+                         adapter.name, payment.reference, transaction_id)
+            raise
+
+        return CreatedPayment(transaction_id, status, payment, completion)
+
+payment_service = PaymentService()
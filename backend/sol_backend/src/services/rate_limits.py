@@ -0,0 +1,157 @@
+from flask import after_this_request, current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity
+from src.utils.redis_client import get_redis
+from collections import OrderedDict
+from functools import wraps
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'sol:rate-limit'
+
+PERIODS = {
+    'second': 1,
+    'minute': 60,
+    'hour': 3600,
+    'day': 86400
+}
+
+def parse_rate(value):
+    """'5/minute' -> (5, 60): a bucket of 5 tokens refilled over 60 seconds"""
+    count, _, period = value.partition('/')
+    try:
+        return int(count), PERIODS[period.strip().lower()]
+    except (KeyError, ValueError):
+        raise ValueError(f"Invalid rate limit '{value}' (expected <count>/<second|minute|hour|day>)")
+
+class LocalRateLimiter:
+    """Token buckets in process memory, least recently used dropped past max_keys"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, limit, period):
+        """Take a token from key's bucket. Returns (allowed, remaining tokens, seconds until the next token)."""
+        rate = limit / period
+        now = time.monotonic()
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = limit
+            else:
+                tokens = min(limit, bucket[0] + (now - bucket[1]) * rate)
+                self._buckets.move_to_end(key)
+
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+        return allowed, tokens, (1 - tokens) / rate if not allowed else 0
+
+# Refill and take in one step on the Redis clock, so every process and host shares the bucket.
+# The key expires once the bucket would be full again.
+TOKEN_BUCKET_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(state[1]) or limit
+local at = tonumber(state[2]) or now
+tokens = math.min(limit, tokens + math.max(0, now - at) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((limit - tokens) / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+class RedisRateLimiter:
+    """Token buckets in Redis, shared by every process; falls back to process memory if Redis fails"""
+
+    def __init__(self, client, fallback=None):
+        self.client = client
+        self.fallback = fallback or LocalRateLimiter()
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def hit(self, key, limit, period):
+        rate = limit / period
+        try:
+            allowed, tokens = self._script(keys=[key], args=[limit, rate])
+        except Exception as e:
+            logger.warning("Rate limiting through Redis failed, using process-local buckets: %s", e)
+            return self.fallback.hit(key, limit, period)
+
+        tokens = float(tokens)
+        return bool(allowed), tokens, (1 - tokens) / rate if not allowed else 0
+
+_limiter = None
+
+def get_limiter():
+    """The rate limiter for this app: Redis when REDIS_URL is set, else in-process"""
+    global _limiter
+    if _limiter is None:
+        client = get_redis(current_app.config.get('REDIS_URL'))
+        _limiter = RedisRateLimiter(client) if client is not None else LocalRateLimiter()
+    return _limiter
+
+_rates = {}
+
+def _rate_for(route_class):
+    value = current_app.config[f'RATE_LIMIT_{route_class.upper()}']
+    rate = _rates.get(value)
+    if rate is None:
+        rate = _rates[value] = parse_rate(value)
+    return rate
+
+def rate_limit(route_class, by='user'):
+    """Limit a route to RATE_LIMIT_<ROUTE_CLASS> requests per client.
+
+    by='user' counts per JWT identity and must sit below @jwt_required();
+    by='ip' counts per client address, for routes used before logging in.
+    The check runs before the view, so a refused request costs no database
+    or bcrypt work; it is answered with 429 and Retry-After.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            config = current_app.config
+            if not config['RATE_LIMIT_ENABLED']:
+                return f(*args, **kwargs)
+
+            limit, period = _rate_for(route_class)
+            client = get_jwt_identity() if by == 'user' else request.remote_addr
+            key = f'{KEY_PREFIX}:{route_class}:{by}:{client}'
+            allowed, remaining, retry_after = get_limiter().hit(key, limit, period)
+
+            if not allowed:
+                logger.info("Rate limited %s request from %s %s", route_class, by, client)
+                response = jsonify({'error': 'Too many requests, please retry later'})
+                response.status_code = 429
+                response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+                response.headers['X-RateLimit-Limit'] = str(limit)
+                response.headers['X-RateLimit-Remaining'] = '0'
+                return response
+
+            @after_this_request
+            def add_headers(response):
+                response.headers['X-RateLimit-Limit'] = str(limit)
+                response.headers['X-RateLimit-Remaining'] = str(int(remaining))
+                return response
+
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
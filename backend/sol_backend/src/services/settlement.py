@@ -0,0 +1,155 @@
+from sqlalchemy import or_, select, update
+from src.models.user import Transaction, db
+from src.services import change_events, stats
+from src.services.ledger import credit_many
+from collections import Counter
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+# Largest batch accepted by settle(); keeps the IN lists well inside driver parameter limits
+MAX_BATCH_SIZE = 5000
+
+# Provider result -> our transaction status
+STATUS_MAP = {
+    'PAID': 'SUCCESS',
+    'SUCCESS': 'SUCCESS',
+    'SETTLED': 'SUCCESS',
+    'EXPIRED': 'FAILED',
+    'FAILED': 'FAILED'
+}
+
+class SettlementError(Exception):
+    """Raised when a settlement batch cannot be accepted as a whole"""
+
+def _outcome(index, item, outcome, transaction=None, status=None, error=None):
+    result = {
+        'index': index,
+        'reference': item.get('transaction_id') or item.get('reference_no') if isinstance(item, dict) else None,
+        'outcome': outcome
+    }
+    if transaction is not None:
+        result['transaction_id'] = transaction.id
+        result['status'] = status or transaction.status
+    if error:
+        result['error'] = error
+    return result
+
+def settle(notifications):
+    """Apply a batch of payment results in the current transaction.
+
+    Each notification is a dict with ``status`` (PAID, EXPIRED, FAILED, ...)
+    and either ``transaction_id`` or the provider ``reference_no``, plus an
+    optional ``amount`` that must match the transaction. All transactions are
+    read with one indexed IN lookup; only PENDING ones move, through one
+    UPDATE per target status, and successful top-ups are credited with one
+    balance UPDATE. Returns (results, balances): one result per
+    notification, in order, with an outcome of SETTLED, ALREADY_PROCESSED,
+    DUPLICATE, NOT_FOUND, AMOUNT_MISMATCH or INVALID, and the new balance of
+    every credited user. Nothing is committed here.
+    """
+    if len(notifications) > MAX_BATCH_SIZE:
+        raise SettlementError(f'At most {MAX_BATCH_SIZE} notifications per batch')
+
+    results = [None] * len(notifications)
+    valid = []
+
+    for index, item in enumerate(notifications):
+        if not isinstance(item, dict) or not (item.get('transaction_id') or item.get('reference_no')):
+            results[index] = _outcome(index, item, 'INVALID', error='transaction_id or reference_no is required')
+            continue
+
+        target = STATUS_MAP.get(str(item.get('status', '')).upper())
+        if target is None:
+            results[index] = _outcome(index, item, 'INVALID', error=f"Unknown status: {item.get('status')}")
+            continue
+
+        amount = item.get('amount')
+        if amount is not None:
+            try:
+                amount = Decimal(str(amount))
+            except InvalidOperation:
+                results[index] = _outcome(index, item, 'INVALID', error='Invalid amount')
+                continue
+
+        valid.append((index, item, target, amount))
+
+    ids = {item['transaction_id'] for _, item, _, _ in valid if item.get('transaction_id')}
+    references = {item['reference_no'] for _, item, _, _ in valid if item.get('reference_no')}
+
+    transactions = db.session.execute(
+        select(Transaction)
+        .where(or_(Transaction.id.in_(ids), Transaction.xendit_transaction_id.in_(references)))
+        .order_by(Transaction.id)  # Lock rows in a fixed order so concurrent batches cannot deadlock
+        .with_for_update()
+    ).scalars().all() if valid else []
+
+    by_id = {transaction.id: transaction for transaction in transactions}
+    by_reference = {transaction.xendit_transaction_id: transaction for transaction in transactions
+                    if transaction.xendit_transaction_id}
+
+    # Decide every item before writing anything; the first notification for a transaction wins
+    transitions = {}
+    for index, item, target, amount in valid:
+        if item.get('transaction_id'):
+            transaction = by_id.get(item['transaction_id'])
+        else:
+            transaction = by_reference.get(item['reference_no'])
+
+        if transaction is None:
+            results[index] = _outcome(index, item, 'NOT_FOUND')
+        elif transaction.id in transitions:
+            results[index] = _outcome(index, item, 'DUPLICATE', transaction, transitions[transaction.id][0])
+        elif transaction.status != 'PENDING':
+            results[index] = _outcome(index, item, 'ALREADY_PROCESSED', transaction)
+        elif amount is not None and amount != transaction.amount:
+            results[index] = _outcome(index, item, 'AMOUNT_MISMATCH', transaction,
+                                      error=f'Expected {transaction.amount}, got {amount}')
+        else:
+            transitions[transaction.id] = (target, index, item)
+
+    # One UPDATE per target status; the PENDING guard and RETURNING tell us what actually moved
+    moved = set()
+    now = datetime.utcnow()
+    for target in ('SUCCESS', 'FAILED'):
+        target_ids = [transaction_id for transaction_id, (status, _, _) in transitions.items() if status == target]
+        if not target_ids:
+            continue
+
+        moved_ids = db.session.execute(
+            update(Transaction)
+            .where(Transaction.id.in_(target_ids), Transaction.status == 'PENDING')
+            .values(status=target, updated_at=now)
+            .returning(Transaction.id)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+
+        if moved_ids:
+            stats.record({
+                stats.transaction_status_counter('PENDING'): -len(moved_ids),
+                stats.transaction_status_counter(target): len(moved_ids)
+            })
+        moved.update(moved_ids)
+
+    credits = []
+    for transaction_id, (target, index, item) in transitions.items():
+        transaction = by_id[transaction_id]
+        if transaction_id not in moved:
+            # Settled by a concurrent writer between our read and our UPDATE
+            results[index] = _outcome(index, item, 'ALREADY_PROCESSED', transaction)
+            continue
+
+        results[index] = _outcome(index, item, 'SETTLED', transaction, target)
+        change_events.record(db.session, transaction.user_id, change_events.TRANSACTION,
+                             change_events.transaction_data(transaction, target))
+        if target == 'SUCCESS' and transaction.type == 'TOPUP':
+            credits.append((transaction.user_id, transaction.amount, 'TOPUP', transaction.id))
+
+    balances = credit_many(credits)
+    for transaction_id in moved:
+        # Keep the loaded objects in line with what was written
+        db.session.expire(by_id[transaction_id])
+
+    return results, balances
+
+def summarize(results):
+    return dict(Counter(result['outcome'] for result in results))
@@ -0,0 +1,195 @@
+from sqlalchemy import event, func, insert, inspect, select, update
+from sqlalchemy.orm import Session
+from src.models.user import User, Transaction, db
+from src.models.stats import StatCounter
+from collections import defaultdict
+from decimal import Decimal
+import logging
+import os
+import random
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Each counter is spread over this many rows; increments pick one at random
+COUNTER_SLOTS = int(os.getenv('STATS_COUNTER_SLOTS', '8'))
+
+USERS_TOTAL = 'users.total'
+TRANSACTIONS_TOTAL = 'transactions.total'
+WALLET_BALANCE_TOTAL = 'wallet.balance_total'
+
+KYC_STATUSES = ('PENDING', 'APPROVED', 'REJECTED')
+TRANSACTION_STATUSES = ('PENDING', 'SUCCESS', 'FAILED')
+
+def kyc_counter(status):
+    return f'users.kyc.{status}'
+
+def transaction_status_counter(status):
+    return f'transactions.status.{status}'
+
+def known_counters():
+    return [USERS_TOTAL, TRANSACTIONS_TOTAL, WALLET_BALANCE_TOTAL]\
+        + [kyc_counter(status) for status in KYC_STATUSES]\
+        + [transaction_status_counter(status) for status in TRANSACTION_STATUSES]
+
+def apply_deltas(connection, deltas):
+    """Add each delta to its counter in the caller's transaction.
+
+    Deltas are applied with ``UPDATE ... SET value = value + :delta`` on one
+    randomly chosen slot so that concurrent writers rarely wait on the same row.
+    """
+    for name, delta in sorted(deltas.items()):
+        if not delta:
+            continue
+
+        slot = random.randrange(COUNTER_SLOTS)
+        result = connection.execute(
+            update(StatCounter)
+            .where(StatCounter.name == name, StatCounter.slot == slot)
+            .values(value=StatCounter.value + delta)
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(StatCounter).values(name=name, slot=slot, value=delta))
+
+def record(deltas):
+    """Apply counter deltas for changes made outside the ORM (bulk or Core UPDATEs)"""
+    apply_deltas(db.session.connection(), deltas)
+
+def _old_and_new(obj, attribute):
+    history = inspect(obj).attrs[attribute].history
+    if not history.has_changes():
+        return None
+    old = history.deleted[0] if history.deleted else None
+    new = history.added[0] if history.added else None
+    return old, new
+
+def _user_deltas(deltas, user, sign):
+    deltas[USERS_TOTAL] += sign
+    deltas[kyc_counter(user.kyc_status or 'PENDING')] += sign
+    deltas[WALLET_BALANCE_TOTAL] += sign * Decimal(str(user.wallet_balance or 0))
+
+def _transaction_deltas(deltas, transaction, sign):
+    deltas[TRANSACTIONS_TOTAL] += sign
+    deltas[transaction_status_counter(transaction.status or 'PENDING')] += sign
+
+def collect_deltas(session):
+    """Work out counter changes implied by the pending ORM changes in a session"""
+    deltas = defaultdict(Decimal)
+
+    for obj in session.new:
+        if isinstance(obj, User):
+            _user_deltas(deltas, obj, 1)
+        elif isinstance(obj, Transaction):
+            _transaction_deltas(deltas, obj, 1)
+
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            _user_deltas(deltas, obj, -1)
+        elif isinstance(obj, Transaction):
+            _transaction_deltas(deltas, obj, -1)
+
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            change = _old_and_new(obj, 'kyc_status')
+            if change and change[0] != change[1]:
+                deltas[kyc_counter(change[0] or 'PENDING')] -= 1
+                deltas[kyc_counter(change[1] or 'PENDING')] += 1
+
+            change = _old_and_new(obj, 'wallet_balance')
+            if change:
+                deltas[WALLET_BALANCE_TOTAL] += Decimal(str(change[1] or 0)) - Decimal(str(change[0] or 0))
+
+        elif isinstance(obj, Transaction):
+            change = _old_and_new(obj, 'status')
+            if change and change[0] != change[1]:
+                deltas[transaction_status_counter(change[0] or 'PENDING')] -= 1
+                deltas[transaction_status_counter(change[1] or 'PENDING')] += 1
+
+    return deltas
+
+@event.listens_for(Session, 'before_flush')
+def _update_counters_before_flush(session, flush_context, instances):
+    deltas = collect_deltas(session)
+    if any(deltas.values()):
+        apply_deltas(session.connection(), deltas)
+
+# Load the previous value when these attributes are set on an expired instance,
+# so the flush can always tell which counter to move the row out of
+for _attribute in (User.kyc_status, User.wallet_balance, Transaction.status):
+    event.listen(_attribute, 'set', lambda target, value, oldvalue, initiator: None, active_history=True)
+
+def read_counters():
+    """Return every counter's total, summed over its slots"""
+    rows = db.session.execute(
+        select(StatCounter.name, func.sum(StatCounter.value)).group_by(StatCounter.name)
+    ).all()
+    return {name: Decimal(str(value or 0)) for name, value in rows}
+
+def compute_actual():
+    """Recompute every counter from the source tables (full scans)"""
+    actual = defaultdict(Decimal)
+
+    for status, count in db.session.query(User.kyc_status, func.count(User.id)).group_by(User.kyc_status):
+        actual[USERS_TOTAL] += count
+        actual[kyc_counter(status or 'PENDING')] += count
+
+    for status, count in db.session.query(Transaction.status, func.count(Transaction.id)).group_by(Transaction.status):
+        actual[TRANSACTIONS_TOTAL] += count
+        actual[transaction_status_counter(status or 'PENDING')] += count
+
+    actual[WALLET_BALANCE_TOTAL] = Decimal(str(db.session.query(func.sum(User.wallet_balance)).scalar() or 0))
+    return actual
+
+def ensure_counters():
+    """Create every slot row for the known counters so increments never need an INSERT.
+
+    Returns True when the table was empty, meaning the counters still have to
+    be computed from the source tables with reconcile_counters.
+    """
+    existing = set(db.session.execute(select(StatCounter.name, StatCounter.slot)).all())
+    for name in known_counters():
+        for slot in range(COUNTER_SLOTS):
+            if (name, slot) not in existing:
+                db.session.add(StatCounter(name=name, slot=slot, value=0))
+    db.session.commit()
+    return not existing
+
+def reconcile_counters():
+    """Recompute the counters from the source tables and correct any drift.
+
+    Returns a dict of counter name -> drift (stored minus actual) for every
+    counter that was wrong. The correction is applied as a delta, so
+    increments committed while this runs are not overwritten.
+    """
+    actual = compute_actual()
+    stored = read_counters()
+
+    drift = {}
+    for name in set(actual) | set(stored) | set(known_counters()):
+        difference = stored.get(name, Decimal(0)) - actual.get(name, Decimal(0))
+        if difference:
+            drift[name] = difference
+
+    if drift:
+        logger.warning("Stats counter drift detected: %s", {name: float(value) for name, value in drift.items()})
+        record({name: -difference for name, difference in drift.items()})
+    db.session.commit()
+
+    return drift
+
+def start_reconciler(app, interval):
+    """Run reconcile_counters every interval seconds in a daemon thread"""
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            with app.app_context():
+                try:
+                    reconcile_counters()
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error("Stats reconciliation failed: %s", e)
+
+    thread = threading.Thread(target=run, name='stats-reconciler', daemon=True)
+    thread.start()
+    return stop
@@ -0,0 +1,145 @@
+from flask import current_app
+from src.services import change_events
+from src.utils.redis_client import get_redis
+from decimal import Decimal
+import json
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+RELAY_CHANNEL = 'sol:status-events'
+
+# Changes pushed to the user's open streams
+STREAMED_KINDS = (change_events.TRANSACTION, change_events.KYC, change_events.BALANCE)
+
+class StreamLimitError(Exception):
+    """Raised when this process already serves its maximum number of streams"""
+
+class Subscription:
+    """One open stream: a bounded queue of events for a single user"""
+
+    def __init__(self, user_id, max_queued):
+        self.user_id = user_id
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize=max_queued)
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            # A client this far behind resynchronises instead of getting a partial history
+            self.overflowed = True
+
+    def get(self, timeout):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+class StatusBroker:
+    """In-process pub/sub from committed changes to the open streams of each user"""
+
+    def __init__(self, max_connections, max_queued=100):
+        self.max_connections = max_connections
+        self.max_queued = max_queued
+        self._subscriptions = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        with self._lock:
+            if self._count >= self.max_connections:
+                raise StreamLimitError(f'{self.max_connections} status streams already open')
+            subscription = Subscription(user_id, self.max_queued)
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+            self._count += 1
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions and subscription in subscriptions:
+                subscriptions.discard(subscription)
+                self._count -= 1
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def connections(self):
+        with self._lock:
+            return self._count
+
+class RedisRelay:
+    """Carries events to the streams of every process through Redis pub/sub"""
+
+    def __init__(self, client, broker):
+        self.client = client
+        self.broker = broker
+        self._thread = None
+
+    def publish(self, user_id, event):
+        self.client.publish(RELAY_CHANNEL, json.dumps({'user_id': user_id, 'event': event}))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='status-relay', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(RELAY_CHANNEL)
+                for message in pubsub.listen():
+                    data = json.loads(message['data'])
+                    self.broker.publish(data['user_id'], data['event'])
+            except Exception as e:
+                logger.warning("Status relay lost its Redis subscription: %s", e)
+                threading.Event().wait(1)
+
+_broker = None
+_relay = None
+_setup_lock = threading.Lock()
+
+def get_broker():
+    """The status broker for this process, relayed through Redis when REDIS_URL is set"""
+    global _broker, _relay
+    with _setup_lock:
+        if _broker is None:
+            _broker = StatusBroker(current_app.config['STATUS_STREAM_MAX_CONNECTIONS'])
+            client = get_redis(current_app.config.get('REDIS_URL'))
+            if client is not None:
+                _relay = RedisRelay(client, _broker)
+                _relay.start()
+        return _broker
+
+def _event_for(change):
+    data = {name: float(value) if isinstance(value, Decimal) else value for name, value in change.data.items()}
+    return {'type': change.kind, **data}
+
+def _publish_changes(changes):
+    changes = [change for change in changes if change.kind in STREAMED_KINDS]
+    if not changes:
+        return
+    broker = get_broker()
+    for change in changes:
+        event = _event_for(change)
+        if _relay is not None:
+            try:
+                _relay.publish(change.user_id, event)
+                continue
+            except Exception as e:
+                logger.warning("Relaying status event through Redis failed: %s", e)
+        broker.publish(change.user_id, event)
+
+change_events.subscribe(_publish_changes)
+
+def format_event(event):
+    """One server-sent event frame"""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
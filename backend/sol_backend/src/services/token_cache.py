@@ -0,0 +1,218 @@
+from contextlib import contextmanager
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+class TokenRefreshError(Exception):
+    """Raised when no valid token is cached and fetching a new one failed"""
+
+class FileTokenStore:
+    """Shares a token between the processes of one host through a file guarded by flock"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + '.lock'
+
+    def read(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            return data['token'], data['expires_at']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def write(self, token, expires_at):
+        # Write then rename, so readers never see a half-written file
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'token': token, 'expires_at': expires_at}, f)
+        os.replace(tmp_path, self.path)
+
+    @contextmanager
+    def lock(self, timeout):
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        raise TimeoutError(f'Timed out waiting for {self.lock_path}')
+                    time.sleep(0.01)
+            yield
+        finally:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+
+class RedisTokenStore:
+    """Shares a token between processes and hosts through Redis"""
+
+    # Delete the lock only if we still own it
+    RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, client, key):
+        self.client = client
+        self.key = key
+        self.lock_key = key + ':lock'
+
+    def read(self):
+        raw = self.client.get(self.key)
+        if raw is None:
+            return None
+        data = json.loads(raw)
+        return data['token'], data['expires_at']
+
+    def write(self, token, expires_at):
+        ttl_ms = int((expires_at - time.time()) * 1000)
+        if ttl_ms > 0:
+            self.client.set(self.key, json.dumps({'token': token, 'expires_at': expires_at}), px=ttl_ms)
+
+    @contextmanager
+    def lock(self, timeout):
+        owner = str(uuid.uuid4())
+        deadline = time.monotonic() + timeout
+        # The lock expires on its own if the holder dies mid-refresh
+        while not self.client.set(self.lock_key, owner, nx=True, px=int(timeout * 1000)):
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f'Timed out waiting for {self.lock_key}')
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            self.client.eval(self.RELEASE_SCRIPT, 1, self.lock_key, owner)
+
+class TokenCache:
+    """Access token cache with single-flight refresh and refresh-ahead.
+
+    fetch() returns (token, lifetime_seconds). Callers get the token from
+    process memory while it is fresh. Within refresh_ahead seconds of expiry
+    the first caller refreshes while the others keep using the current
+    token; once it has expired, one thread per process refreshes and the
+    rest wait for it. The shared store (Redis or a file) and its lock make
+    that one refresh per deployment rather than per worker: a process that
+    finds a fresh token there adopts it instead of fetching.
+    """
+
+    def __init__(self, name, fetch, store=None, refresh_ahead=60, lock_timeout=10):
+        self.name = name
+        self.fetch = fetch
+        self.store = store
+        self.refresh_ahead = refresh_ahead
+        self.lock_timeout = lock_timeout
+        self._token = None
+        self._expires_at = 0
+        self._refresh_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            'hits': 0,
+            'misses': 0,
+            'shared_hits': 0,
+            'refreshes': 0,
+            'refresh_ahead': 0,
+            'refresh_errors': 0,
+            'store_errors': 0
+        }
+
+    def _count(self, name):
+        with self._metrics_lock:
+            self._metrics[name] += 1
+
+    def metrics(self):
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        metrics['expires_in'] = max(0, round(self._expires_at - time.time()))
+        metrics['store'] = type(self.store).__name__ if self.store else 'memory'
+        return metrics
+
+    def get(self):
+        now = time.time()
+        token, expires_at = self._token, self._expires_at
+
+        if token and now < expires_at - self.refresh_ahead:
+            self._count('hits')
+            return token
+
+        if token and now < expires_at:
+            # Refresh ahead: one caller refreshes, everyone else keeps the still-valid token
+            self._count('hits')
+            if self._refresh_lock.acquire(blocking=False):
+                try:
+                    self._count('refresh_ahead')
+                    self._refresh(force_after=expires_at)
+                except Exception as e:
+                    logger.warning("%s token refresh ahead of expiry failed: %s", self.name, e)
+                finally:
+                    self._refresh_lock.release()
+            return self._token
+
+        self._count('misses')
+        with self._refresh_lock:
+            # Another thread may have refreshed while we waited
+            if self._token and time.time() < self._expires_at:
+                return self._token
+            return self._refresh()
+
+    def invalidate(self):
+        """Drop the process copy, e.g. after the provider rejected the token"""
+        self._token, self._expires_at = None, 0
+
+    def _adopt(self, cached, force_after):
+        """Use a token from the shared store if it is newer than ours and still fresh"""
+        if not cached:
+            return False
+        token, expires_at = cached
+        if expires_at <= force_after or time.time() >= expires_at - self.refresh_ahead:
+            return False
+        self._token, self._expires_at = token, expires_at
+        self._count('shared_hits')
+        return True
+
+    def _fetch(self):
+        try:
+            token, lifetime = self.fetch()
+        except Exception as e:
+            self._count('refresh_errors')
+            raise TokenRefreshError(f'{self.name} token refresh failed: {str(e)}') from e
+        self._count('refreshes')
+        return token, time.time() + lifetime
+
+    def _refresh(self, force_after=0):
+        """Called with the process refresh lock held"""
+        if self.store is None:
+            self._token, self._expires_at = self._fetch()
+            return self._token
+
+        try:
+            if self._adopt(self.store.read(), force_after):
+                return self._token
+
+            with self.store.lock(self.lock_timeout):
+                # Double-check: another process may have refreshed while we waited for the lock
+                if self._adopt(self.store.read(), force_after):
+                    return self._token
+
+                token, expires_at = self._fetch()
+                self._token, self._expires_at = token, expires_at
+                self.store.write(token, expires_at)
+                return token
+
+        except TokenRefreshError:
+            raise
+        except Exception as e:
+            # The shared store is an optimisation; fall back to a process-local refresh
+            self._count('store_errors')
+            logger.warning("%s token store unavailable, refreshing locally: %s", self.name, e)
+            if not (self._token and time.time() < self._expires_at - self.refresh_ahead):
+                self._token, self._expires_at = self._fetch()
+            return self._token
@@ -0,0 +1,184 @@
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import parse_form_data
+import base64
+import binascii
+import os
+import tempfile
+
+# Leading bytes of the image formats accepted for KYC, and the extension they are stored under
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+)
+SNIFF_BYTES = 16
+
+# Room for the multipart boundaries, part headers and small form fields
+MULTIPART_OVERHEAD = 64 * 1024
+
+# Parser buffer limit; must stay well above the 64 KiB chunks it reads (Flask's default)
+MAX_FORM_MEMORY_SIZE = 500 * 1024
+
+class UploadError(Exception):
+    """Raised when an upload is missing, too large or not an accepted image"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+def sniff_image(head):
+    """The extension for an image whose first bytes are head, or None"""
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    return None
+
+def sniff_base64_image(image_data):
+    """Check a base64 image (optionally a data: URL) by decoding only its first bytes"""
+    if not image_data or not isinstance(image_data, str):
+        return None
+    if image_data.startswith('data:'):
+        image_data = image_data.partition(',')[2]
+    # 24 base64 characters are the first 18 bytes
+    try:
+        head = base64.b64decode(image_data[:24], validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    return sniff_image(head)
+
+def save_base64_images(images, directory, name_prefix, max_image_bytes):
+    """Decode base64 images ({field: data}) into directory, named like receive_images.
+
+    For the JSON form of the KYC upload, whose images are already in
+    memory. Returns {field: path}. Raises UploadError; nothing is left on
+    disk when it does.
+    """
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    saved = {}
+    try:
+        for field, image_data in images.items():
+            if image_data.startswith('data:'):
+                image_data = image_data.partition(',')[2]
+            try:
+                content = base64.b64decode(image_data, validate=True)
+            except (binascii.Error, ValueError):
+                raise UploadError(f'{field} is not valid base64')
+            if len(content) > max_image_bytes:
+                raise UploadError(f'Each image must be at most {max_image_bytes} bytes', 413)
+            extension = sniff_image(content[:SNIFF_BYTES])
+            if extension is None:
+                raise UploadError(f'{field} must be a JPEG, PNG or WebP image')
+
+            path = os.path.join(directory, f'{name_prefix}-{field}.{extension}')
+            with open(path, 'wb') as f:
+                f.write(content)
+            saved[field] = path
+        return saved
+
+    except Exception:
+        for path in saved.values():
+            os.unlink(path)
+        raise
+
+def discard_files(paths):
+    """Delete stored uploads, ignoring ones already gone. Returns the paths that could not be deleted."""
+    failed = []
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            failed.append(path)
+    return failed
+
+class _LimitedFile:
+    """File part written straight to disk, refusing to grow past max_bytes.
+
+    Keeps the first SNIFF_BYTES so the type can be checked without reading
+    the file back.
+    """
+
+    def __init__(self, directory, max_bytes):
+        fd, self.path = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        self._file = os.fdopen(fd, 'wb+')
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.head = b''
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise RequestEntityTooLarge(f'Each image must be at most {self.max_bytes} bytes')
+        if len(self.head) < SNIFF_BYTES:
+            self.head += data[:SNIFF_BYTES - len(self.head)]
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+def receive_images(environ, content_length, fields, directory, name_prefix, max_image_bytes):
+    """Stream the image parts of a multipart request into directory.
+
+    The declared length is checked before any of the body is read; parts
+    are then written to disk in chunks as they arrive, so the request is
+    never held in memory. Every field in fields must be present and be a
+    JPEG, PNG or WebP image. Returns {field: path}, the files named
+    ``<name_prefix>-<field>.<ext>``. Raises UploadError; nothing is left
+    on disk when it does.
+    """
+    max_total = len(fields) * max_image_bytes + MULTIPART_OVERHEAD
+    if content_length is not None and content_length > max_total:
+        raise UploadError(f'Upload too large (limit {max_total} bytes)', 413)
+
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    parts = []
+
+    def stream_factory(total_content_length, content_type, filename, content_length=None):
+        part = _LimitedFile(directory, max_image_bytes)
+        parts.append(part)
+        return part
+
+    saved = {}
+    try:
+        try:
+            _, form, files = parse_form_data(
+                environ,
+                stream_factory=stream_factory,
+                max_form_memory_size=MAX_FORM_MEMORY_SIZE,
+                max_content_length=max_total,
+                silent=False,
+                max_form_parts=len(fields) + 10
+            )
+        except RequestEntityTooLarge as e:
+            raise UploadError(e.description or 'Upload too large', 413)
+        except ValueError:
+            raise UploadError('Malformed multipart body')
+
+        for field in fields:
+            upload = files.get(field)
+            if upload is None or not upload.stream.size:
+                raise UploadError(f'{field} is required')
+            extension = sniff_image(upload.stream.head)
+            if extension is None:
+                raise UploadError(f'{field} must be a JPEG, PNG or WebP image')
+
+            upload.stream.close()
+            path = os.path.join(directory, f'{name_prefix}-{field}.{extension}')
+            os.replace(upload.stream.path, path)
+            saved[field] = path
+        return saved
+
+    except Exception:
+        for path in saved.values():
+            os.unlink(path)
+        raise
+
+    finally:
+        # Unclaimed parts: extra fields, or everything after a failure
+        for part in parts:
+            part.close()
+            if os.path.exists(part.path):
+                os.unlink(part.path)
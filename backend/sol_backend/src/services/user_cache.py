@@ -0,0 +1,150 @@
+from collections import OrderedDict, namedtuple
+from flask import current_app, g, jsonify
+from flask_jwt_extended import get_jwt_identity
+from functools import wraps
+from sqlalchemy import select
+from src.models.user import User, db
+from src.services import change_events
+from src.services.user_versions import current_version
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Changes that alter a cached record
+CACHED_KINDS = (change_events.BALANCE, change_events.KYC, change_events.PROFILE)
+
+_COLUMNS = (
+    User.id, User.passport_number, User.full_name, User.email, User.phone_number,
+    User.kyc_status, User.wallet_balance, User.privy_kyc_id, User.created_at, User.updated_at
+)
+
+class CachedUser(namedtuple('CachedUser', [column.key for column in _COLUMNS])):
+    """Read-only snapshot of a User row, safe to share between requests and threads.
+
+    Writes still go through the ORM, and balance changes through
+    src.services.ledger, whose debit() re-checks the stored balance
+    atomically in its conditional UPDATE.
+    """
+    __slots__ = ()
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'passport_number': self.passport_number,
+            'full_name': self.full_name,
+            'email': self.email,
+            'phone_number': self.phone_number,
+            'kyc_status': self.kyc_status,
+            'wallet_balance': float(self.wallet_balance),
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class UserCache:
+    """LRU of user snapshots, each valid for ttl seconds and only under the version it was loaded with.
+
+    The version is the user's ETag version (src.services.user_versions),
+    which every committed balance, KYC or profile change bumps: through
+    Redis for all processes, or in-process without it. Changes made in
+    this process also drop the entry right away.
+    """
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, version):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            user, entry_version, expires = entry
+            if entry_version != version or expires <= now:
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return user
+
+    def put(self, user_id, user, version):
+        with self._lock:
+            self._entries[user_id] = (user, version, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_user_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = UserCache(current_app.config['USER_CACHE_TTL'], current_app.config['USER_CACHE_SIZE'])
+        return _cache
+
+def _invalidate_changed_users(changes):
+    if _cache is None:
+        return
+    user_ids = {change.user_id for change in changes if change.kind in CACHED_KINDS}
+    if user_ids:
+        _cache.invalidate(user_ids)
+
+change_events.subscribe(_invalidate_changed_users)
+
+def load_user(user_id):
+    """The user as a CachedUser, or None if there is no such user.
+
+    Served from the cache while the user's version is unchanged; otherwise
+    one SELECT of the columns, no ORM object.
+    """
+    cache = get_user_cache() if current_app.config['USER_CACHE_TTL'] > 0 else None
+    # Read the version before the row: a change committed in between bumps it,
+    # so the entry stored below is never served
+    version = current_version(user_id) if cache is not None else None
+    if version is not None:
+        user = cache.get(user_id, version)
+        if user is not None:
+            return user
+
+    row = db.session.execute(select(*_COLUMNS).where(User.id == user_id)).first()
+    user = CachedUser(*row) if row is not None else None
+    if user is not None and version is not None:
+        cache.put(user_id, user, version)
+    return user
+
+_MISSING = object()
+
+def current_user():
+    """The authenticated user (CachedUser or None), resolved once per request. Use under @jwt_required()."""
+    user = g.get('sol_current_user', _MISSING)
+    if user is _MISSING:
+        user = g.sol_current_user = load_user(get_jwt_identity())
+    return user
+
+def kyc_required(message='KYC verification required'):
+    """Refuse the request with 403 unless the user's KYC is approved (404 if the user is gone).
+
+    Reads the cached record, so the check costs no query while the user
+    is unchanged. Use under @jwt_required().
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            user = current_user()
+            if user is None:
+                return jsonify({'error': 'User not found'}), 404
+            if user.kyc_status != 'APPROVED':
+                return jsonify({'error': message}), 403
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,167 @@
+from collections import OrderedDict
+from flask import current_app, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from functools import wraps
+from sqlalchemy import select
+from src.models.user import User, db
+from src.services import change_events
+from src.utils.redis_client import get_redis
+import hashlib
+import logging
+import secrets
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'sol:user-version:'
+
+# Changes that alter what /wallet/balance or /auth/profile return
+VERSIONED_KINDS = (change_events.BALANCE, change_events.KYC, change_events.PROFILE)
+
+# Columns behind everything /wallet/balance and /auth/profile return; updated_at covers
+# ORM changes to any other column, the balance covers the ledger's Core UPDATEs
+FINGERPRINT_COLUMNS = (User.updated_at, User.wallet_balance, User.kyc_status, User.full_name,
+                       User.email, User.phone_number, User.passport_number)
+
+def _new_version():
+    # Random rather than a counter, so a version lost with its entry is never handed out again
+    return secrets.token_hex(8)
+
+def row_version(user_id):
+    """A version derived from the user's row, the same in every process; None if there is no such user"""
+    row = db.session.execute(select(*FINGERPRINT_COLUMNS).where(User.id == user_id)).first()
+    if row is None:
+        return None
+    return hashlib.sha256(repr(tuple(row)).encode()).hexdigest()[:16]
+
+class LocalVersionStore:
+    """Per-process versions derived from the user's row.
+
+    Other processes cannot bump them, so an entry is only trusted for ttl
+    seconds and then derived again with one primary key SELECT; that bounds
+    how long a change made by another worker can be answered with 304. An
+    unchanged row gives the same version, so clients polling less often
+    than ttl, or served by another worker, still get 304.
+    """
+
+    def __init__(self, ttl, max_entries=100000, derive=row_version):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.derive = derive
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bumps = 0
+
+    def current(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                return entry[0]
+            bumps = self._bumps
+
+        # Outside the lock: the SELECT must not hold up other users' lookups
+        version = self.derive(user_id)
+        if version is None:
+            return None
+
+        with self._lock:
+            # A bump while the row was read may mean it is already out of date; do not keep it
+            if self._bumps == bumps:
+                self._entries[user_id] = (version, time.monotonic() + self.ttl)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return version
+
+    def bump(self, user_ids):
+        with self._lock:
+            self._bumps += 1
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+class RedisVersionStore:
+    """Versions shared by every process through Redis"""
+
+    def __init__(self, client, ttl):
+        self.client = client
+        self.ttl = ttl
+
+    def current(self, user_id):
+        key = KEY_PREFIX + str(user_id)
+        version = self.client.get(key)
+        if version is None:
+            self.client.set(key, _new_version(), nx=True, ex=self.ttl)
+            version = self.client.get(key)
+        return version.decode() if isinstance(version, bytes) else version
+
+    def bump(self, user_ids):
+        pipe = self.client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.set(KEY_PREFIX + str(user_id), _new_version(), ex=self.ttl)
+        pipe.execute()
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_version_store():
+    """The version store for this app: Redis when REDIS_URL is set, else in-process"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            client = get_redis(current_app.config.get('REDIS_URL'))
+            if client is not None:
+                _store = RedisVersionStore(client, current_app.config['USER_VERSION_TTL'])
+            else:
+                _store = LocalVersionStore(current_app.config['USER_VERSION_LOCAL_TTL'])
+        return _store
+
+def current_version(user_id):
+    """The user's current version, or None if the store is unavailable"""
+    try:
+        return get_version_store().current(user_id)
+    except Exception as e:
+        logger.warning("User version lookup failed: %s", e)
+        return None
+
+def _bump_changed_users(changes):
+    user_ids = {change.user_id for change in changes if change.kind in VERSIONED_KINDS}
+    if not user_ids:
+        return
+    try:
+        get_version_store().bump(user_ids)
+    except Exception as e:
+        # Clients keep getting 304 until the version expires (USER_VERSION_TTL)
+        logger.error("Bumping user versions failed for %s users: %s", len(user_ids), e)
+
+change_events.subscribe(_bump_changed_users)
+
+def conditional_on_user_version(view):
+    """Serve the view with the user's version as ETag and answer a matching If-None-Match with 304.
+
+    The 304 path reads only the version store: Redis, or in-process with a
+    primary key SELECT at most every USER_VERSION_LOCAL_TTL seconds. Use under
+    @jwt_required() on views whose body depends only on the user's balance,
+    KYC status and profile.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # Read the version before the view reads the database: a change committed
+        # in between bumps it, so the next request gets a full response
+        version = current_version(get_jwt_identity())
+        if version is None:
+            return view(*args, **kwargs)
+
+        if request.if_none_match.contains(version):
+            response = current_app.response_class(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+
+        response.set_etag(version)
+        # Let browsers keep the body but revalidate it on every use
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    return wrapper
@@ -0,0 +1,84 @@
+from src.models.user import User, Transaction, db
+from src.services.ledger import credit
+import logging
+
+logger = logging.getLogger(__name__)
+
+class WebhookProcessingError(Exception):
+    """Raised when an event cannot be applied yet; the queue retries it and eventually dead-letters it"""
+
+    def __init__(self, message, status=422):
+        super().__init__(message)
+        self.status = status
+
+def handle_privy(data):
+    """Apply a Privy KYC result. Nothing is committed here."""
+    # This is a mock implementation - actual Privy webhook structure may differ
+    kyc_id = data.get('kyc_id')
+    status = data.get('status')  # e.g., 'approved', 'rejected'
+    user_identifier = data.get('user_identifier')  # Could be email or passport number
+
+    # Find user by email or passport number
+    user = User.query.filter(
+        (User.email == user_identifier) |
+        (User.passport_number == user_identifier)
+    ).first()
+
+    if not user:
+        raise WebhookProcessingError(f'User not found for identifier: {user_identifier}', status=404)
+
+    # Update user KYC status
+    if status.lower() == 'approved':
+        user.kyc_status = 'APPROVED'
+    elif status.lower() == 'rejected':
+        user.kyc_status = 'REJECTED'
+    else:
+        user.kyc_status = 'PENDING'
+
+    user.privy_kyc_id = kyc_id
+
+    logger.info("Updated KYC status for user %s: %s", user.id, user.kyc_status)
+
+    return {'message': 'KYC status updated successfully'}
+
+def handle_xendit(data):
+    """Apply a Xendit payment notification. Nothing is committed here."""
+    # This is a mock implementation - actual Xendit webhook structure may differ
+    external_id = data.get('external_id')  # Should match our transaction ID
+    status = data.get('status')  # e.g., 'PAID', 'EXPIRED', 'FAILED'
+
+    # Find transaction by ID, locked so concurrent notifications for it are applied one at a time.
+    # A notification can overtake the commit of the transaction it refers to, so not found is retried.
+    transaction = db.session.get(Transaction, external_id, with_for_update=True)
+
+    if not transaction:
+        raise WebhookProcessingError(f'Transaction not found: {external_id}', status=404)
+
+    # A different event for a transaction that is already settled must not credit it again
+    if transaction.status != 'PENDING':
+        logger.info("Ignored Xendit webhook for settled transaction %s: %s", transaction.id, transaction.status)
+        return {'message': 'Transaction already processed', 'status': transaction.status}
+
+    # Update transaction status
+    if status.upper() == 'PAID':
+        transaction.status = 'SUCCESS'
+
+        # If it's a top-up transaction, update user wallet balance
+        if transaction.type == 'TOPUP':
+            balance = credit(transaction.user_id, transaction.amount, 'TOPUP', transaction_id=transaction.id)
+            logger.info("Updated wallet balance for user %s: %s", transaction.user_id, balance)
+
+    elif status.upper() in ['EXPIRED', 'FAILED']:
+        transaction.status = 'FAILED'
+
+    # Store Xendit transaction ID for reference
+    transaction.xendit_transaction_id = data.get('id')
+
+    logger.info("Updated transaction %s: %s", transaction.id, transaction.status)
+
+    return {'message': 'Transaction status updated successfully'}
+
+HANDLERS = {
+    'privy': handle_privy,
+    'xendit': handle_xendit
+}
@@ -0,0 +1,341 @@
+from flask import current_app
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db
+from src.models.webhook import WebhookEvent
+from src.services.webhook_handlers import HANDLERS, WebhookProcessingError
+from src.utils.redis_client import get_redis
+from datetime import datetime, timedelta
+import hashlib
+import json
+import logging
+import random
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+SWEEP_BATCH_SIZE = 1000
+WAKEUP_KEY = 'sol:webhooks:wakeup'
+
+def event_id_for(data, headers, *fields):
+    """Identify a delivery by the provider's event id.
+
+    Looks at the webhook-id header and then the given payload fields, which
+    must name the delivery itself, never the invoice or payment it is about.
+    When the provider sends none of them, a hash of the payload is used so
+    that a byte-for-byte redelivery is still recognised.
+    """
+    event_id = headers.get('webhook-id')
+    for field in fields:
+        if event_id:
+            break
+        event_id = data.get(field)
+
+    if event_id:
+        return str(event_id)
+
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return 'sha256:' + hashlib.sha256(canonical.encode()).hexdigest()
+
+def receive_event(provider, event_id, payload):
+    """Record a delivery as the first write of the current transaction.
+
+    Returns (event, True) for a first delivery; the caller commits it.
+    Returns (existing_event, False) for a redelivery, after rolling the
+    session back. A concurrent duplicate waits on the unique index
+    (PostgreSQL) or the write lock (SQLite) until the first delivery commits
+    or rolls back.
+    """
+    event = WebhookEvent(provider=provider, event_id=event_id, payload=payload)
+    db.session.add(event)
+
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        existing = db.session.execute(
+            select(WebhookEvent).filter_by(provider=provider, event_id=event_id)
+        ).scalar_one()
+        return existing, False
+
+    return event, True
+
+def _mark_done(event, response, status=200):
+    event.status = 'DONE'
+    event.response_status = status
+    event.response_body = response
+    event.processed_at = datetime.utcnow()
+    event.locked_by = None
+    event.locked_until = None
+    event.last_error = None
+
+def process_inline(event):
+    """Apply a just-received event in the request's own transaction.
+
+    Used when no worker pool runs (WEBHOOK_WORKERS=0). On failure nothing is
+    kept, not even the event, so the provider's retry is processed again.
+    Returns (response, status).
+    """
+    try:
+        event.attempts = 1
+        response = HANDLERS[event.provider](event.payload)
+        _mark_done(event, response)
+        db.session.commit()
+        return response, 200
+    except WebhookProcessingError as e:
+        db.session.rollback()
+        logger.error("Error processing %s webhook: %s", event.provider, e)
+        return {'error': str(e)}, e.status
+
+def claim_batch(batch_size, lease_seconds):
+    """Lease up to batch_size due events to this worker.
+
+    One UPDATE picks events that are due, or whose previous lease expired
+    because a worker died, and marks them PROCESSING under a fresh token.
+    On PostgreSQL SKIP LOCKED keeps concurrent workers from waiting on each
+    other; SQLite runs the statement under its write lock. Returns
+    (token, event ids).
+    """
+    now = datetime.utcnow()
+    token = str(uuid.uuid4())
+    due = or_(
+        and_(WebhookEvent.status == 'RECEIVED', WebhookEvent.next_attempt_at <= now),
+        and_(WebhookEvent.status == 'PROCESSING', WebhookEvent.locked_until < now)
+    )
+    candidates = select(WebhookEvent.id)\
+        .where(due)\
+        .order_by(WebhookEvent.next_attempt_at)\
+        .limit(batch_size)\
+        .with_for_update(skip_locked=True)
+
+    stmt = update(WebhookEvent)\
+        .where(WebhookEvent.id.in_(candidates), due)\
+        .values(
+            status='PROCESSING',
+            attempts=WebhookEvent.attempts + 1,
+            locked_by=token,
+            locked_until=now + timedelta(seconds=lease_seconds)
+        )\
+        .returning(WebhookEvent.id)\
+        .execution_options(synchronize_session=False)
+
+    ids = db.session.execute(stmt).scalars().all()
+    db.session.commit()
+    return token, ids
+
+def _finish(event_id, token, **values):
+    """Update an event only while this worker still holds its lease"""
+    result = db.session.execute(
+        update(WebhookEvent)
+        .where(WebhookEvent.id == event_id, WebhookEvent.locked_by == token)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+def process_event(event_id, token, max_attempts, retry_backoff):
+    """Apply one leased event in its own transaction. Returns True if it is DONE."""
+    event = db.session.get(WebhookEvent, event_id)
+
+    try:
+        response = HANDLERS[event.provider](event.payload)
+        finished = _finish(
+            event_id, token,
+            status='DONE', response_status=200, response_body=response,
+            processed_at=datetime.utcnow(), locked_by=None, locked_until=None, last_error=None
+        )
+        if not finished:
+            # The lease expired and another worker took the event over; let it apply the changes
+            db.session.rollback()
+            logger.warning("Lost lease on webhook event %s:%s", event.provider, event.event_id)
+            return False
+
+        db.session.commit()
+        return True
+
+    except Exception as e:
+        db.session.rollback()
+        error = str(e) or type(e).__name__
+
+        if event.attempts >= max_attempts:
+            values = {'status': 'DEAD'}
+            logger.error("Webhook event %s:%s dead-lettered after %s attempts: %s", event.provider, event.event_id, event.attempts, error)
+        else:
+            # Exponential backoff with jitter so a burst of failures does not retry in lockstep
+            delay = retry_backoff * 2 ** (event.attempts - 1) * random.uniform(0.5, 1.5)
+            values = {'status': 'RECEIVED', 'next_attempt_at': datetime.utcnow() + timedelta(seconds=delay)}
+            logger.warning("Webhook event %s:%s failed (attempt %s), retrying in %.1fs: %s", event.provider, event.event_id, event.attempts, delay, error)
+
+        _finish(event_id, token, locked_by=None, locked_until=None, last_error=error[:1000], **values)
+        db.session.commit()
+        return False
+
+def process_batch(batch_size=None):
+    """Claim and apply one batch of due events. Returns the number claimed."""
+    config = current_app.config
+    token, ids = claim_batch(batch_size or config['WEBHOOK_BATCH_SIZE'], config['WEBHOOK_LEASE_SECONDS'])
+
+    for event_id in ids:
+        process_event(event_id, token, config['WEBHOOK_MAX_ATTEMPTS'], config['WEBHOOK_RETRY_BACKOFF'])
+        # Each event has its own transaction; drop the loaded objects between them
+        db.session.expunge_all()
+
+    return len(ids)
+
+def requeue_dead(event_ids=None):
+    """Move dead-lettered events back to the queue with a fresh attempt budget. Returns the number moved."""
+    stmt = update(WebhookEvent)\
+        .where(WebhookEvent.status == 'DEAD')\
+        .values(status='RECEIVED', attempts=0, next_attempt_at=datetime.utcnow())\
+        .execution_options(synchronize_session=False)
+    if event_ids is not None:
+        stmt = stmt.where(WebhookEvent.id.in_(event_ids))
+
+    result = db.session.execute(stmt)
+    db.session.commit()
+    return result.rowcount
+
+def queue_depth():
+    """Number of events per status"""
+    rows = db.session.execute(
+        select(WebhookEvent.status, db.func.count()).group_by(WebhookEvent.status)
+    ).all()
+    return {status: count for status, count in rows}
+
+def sweep_events(retention_days, batch_size=SWEEP_BATCH_SIZE):
+    """Delete finished events older than retention_days, in batches. Returns the number removed.
+
+    Providers stop retrying well within the retention window, so an event
+    older than that will not be redelivered. Events still queued are kept.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    removed = 0
+
+    while True:
+        ids = select(WebhookEvent.id)\
+            .where(WebhookEvent.created_at < cutoff, WebhookEvent.status.in_(('DONE', 'DEAD')))\
+            .limit(batch_size)
+        result = db.session.execute(
+            delete(WebhookEvent).where(WebhookEvent.id.in_(ids)).execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+        removed += result.rowcount
+        if result.rowcount < batch_size:
+            return removed
+
+class LocalWakeup:
+    """Wakes the workers of this process when work is queued"""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def notify(self):
+        self._event.set()
+
+    def wait(self, timeout):
+        woken = self._event.wait(timeout)
+        self._event.clear()
+        return woken
+
+class RedisWakeup:
+    """Wakes an idle worker in any process through a Redis list"""
+
+    def __init__(self, client, key=WAKEUP_KEY):
+        self.client = client
+        self.key = key
+
+    def notify(self):
+        try:
+            pipe = self.client.pipeline()
+            pipe.lpush(self.key, 1)
+            pipe.ltrim(self.key, 0, 99)
+            pipe.execute()
+        except Exception as e:
+            # The database is the queue; workers still find the work on their next poll
+            logger.warning("Wakeup through Redis (%s) failed: %s", self.key, e)
+
+    def wait(self, timeout):
+        try:
+            return self.client.blpop(self.key, timeout=max(1, int(timeout))) is not None
+        except Exception as e:
+            logger.warning("Waiting for wakeup through Redis (%s) failed: %s", self.key, e)
+            threading.Event().wait(timeout)
+            return False
+
+_wakeup = None
+
+def wakeup():
+    """The wakeup channel for this app: Redis when REDIS_URL is set, else in-process"""
+    global _wakeup
+    if _wakeup is None:
+        client = get_redis(current_app.config.get('REDIS_URL'))
+        _wakeup = RedisWakeup(client) if client is not None else LocalWakeup()
+    return _wakeup
+
+class WebhookWorkerPool:
+    """Threads that drain the webhook queue in batches"""
+
+    def __init__(self, app, workers, poll_interval):
+        self.app = app
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        with self.app.app_context():
+            self._wakeup = wakeup()
+
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'webhook-worker-{number}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wakeup.notify()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self):
+        batch_size = self.app.config['WEBHOOK_BATCH_SIZE']
+
+        while not self._stop.is_set():
+            claimed = 0
+            with self.app.app_context():
+                try:
+                    claimed = process_batch(batch_size)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error("Webhook worker failed to claim events: %s", e)
+
+            # A full batch means there is probably more waiting; otherwise sleep until woken
+            if claimed < batch_size:
+                self._wakeup.wait(self.poll_interval)
+
+def start_workers(app):
+    """Start the webhook worker pool configured by WEBHOOK_WORKERS"""
+    pool = WebhookWorkerPool(app, app.config['WEBHOOK_WORKERS'], app.config['WEBHOOK_POLL_INTERVAL'])
+    pool.start()
+    return pool
+
+def start_sweeper(app, interval, retention_days):
+    """Run sweep_events every interval seconds in a daemon thread"""
+    stop = threading.Event()
+
+    def run():
+        while not stop.wait(interval):
+            with app.app_context():
+                try:
+                    removed = sweep_events(retention_days)
+                    if removed:
+                        logger.info("Removed %s webhook events older than %s days", removed, retention_days)
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error("Webhook event sweep failed: %s", e)
+
+    thread = threading.Thread(target=run, name='webhook-sweeper', daemon=True)
+    thread.start()
+    return stop
@@ -0,0 +1,219 @@
+from logging.handlers import QueueHandler, QueueListener
+from datetime import datetime, timezone
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+
+try:
+    import orjson
+except ImportError:  # Optional; the standard library encoder is used without it
+    orjson = None
+
+REDACTED = '[REDACTED]'
+
+# Keys holding personal data or secrets, wherever they appear in a logged dict
+PII_KEYS = frozenset([
+    'passport_number', 'full_name', 'date_of_birth', 'nationality', 'expiry_date', 'email',
+    'phone_number', 'password', 'password_hash', 'access_token', 'refresh_token', 'authorization',
+    'image', 'passport_image', 'selfie_image', 'virtual_account_number', 'card_number'
+])
+EMAIL_PATTERN = re.compile(r'[\w.+-]+@[\w-]+(\.[\w-]+)+')
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+
+# INFO and DEBUG records past this many per message per window are sampled
+SAMPLE_WINDOW = 60
+# Distinct messages tracked by the sampler before it starts over
+SAMPLE_MAX_KEYS = 10000
+
+_STANDARD_ATTRIBUTES = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+def redact(value):
+    """Copy of value with PII_KEYS masked in dicts, at any depth, and email addresses masked in strings"""
+    if isinstance(value, str):
+        return EMAIL_PATTERN.sub(REDACTED, value) if '@' in value else value
+    if isinstance(value, dict):
+        return {key: REDACTED if str(key).lower() in PII_KEYS else redact(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(item) for item in value]
+    return value
+
+def _extra_fields(record):
+    return {key: value for key, value in vars(record).items() if key not in _STANDARD_ATTRIBUTES}
+
+class SamplingFilter(logging.Filter):
+    """Keeps repeated INFO and DEBUG messages from flooding the log.
+
+    The first `burst` records of each message (logger and format string)
+    in a SAMPLE_WINDOW go through, then a `rate` fraction of the rest. A
+    record let through after others were dropped carries the dropped count
+    in its 'sampled' field. Warnings and errors are never sampled.
+    """
+
+    def __init__(self, burst, rate):
+        super().__init__()
+        self.burst = burst
+        self.rate = rate
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno > logging.INFO or self.burst <= 0:
+            return True
+
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= SAMPLE_WINDOW:
+                if len(self._windows) >= SAMPLE_MAX_KEYS:
+                    self._windows.clear()
+                dropped = window[2] if window is not None else 0
+                window = self._windows[key] = [now, 0, dropped]
+            window[1] += 1
+            if window[1] > self.burst and random.random() >= self.rate:
+                window[2] += 1
+                return False
+            dropped, window[2] = window[2], 0
+
+        if dropped:
+            record.sampled = {'dropped': dropped, 'rate': self.rate}
+        return True
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the writer thread without waiting on I/O.
+
+    The message is rendered and redacted in the calling thread, since the
+    caller may change its arguments afterwards; JSON encoding and writing
+    happen on the writer thread. Records are dropped, and counted on the
+    next one that fits, when the queue is full.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Other handlers may see the same record, so work on a shallow copy
+        prepared = object.__new__(type(record))
+        prepared.__dict__.update(record.__dict__)
+        record = prepared
+        args = record.args
+        if args:
+            record.args = redact(args) if isinstance(args, dict) else tuple(redact(list(args)))
+        record.msg = redact(record.getMessage())
+        record.args = None
+        for key, value in _extra_fields(record).items():
+            setattr(record, key, redact(value))
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        # Handler.handle holds self.lock around emit, so the counter needs no lock of its own
+        if self.dropped:
+            record.dropped_records, self.dropped = self.dropped, 0
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; extra= fields are added as top-level keys"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.threadName
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        if orjson is not None:
+            return orjson.dumps(entry, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+        return json.dumps(entry, default=str)
+
+_lock = threading.Lock()
+_handler = None
+_writer = None
+_listener = None
+_listener_pid = None
+
+def configure_logging(config):
+    """Route all logging through a bounded queue to a writer thread.
+
+    Replaces the handler installed by an earlier call, so building several
+    apps in one process does not duplicate output. Other root handlers are
+    left alone.
+    """
+    global _handler, _writer
+    root = logging.getLogger()
+    with _lock:
+        if _handler is not None:
+            root.removeHandler(_handler)
+            _stop_listener()
+
+        _writer = logging.StreamHandler(sys.stderr)
+        _writer.setFormatter(JsonFormatter() if config['LOG_FORMAT'] == 'json' else logging.Formatter(TEXT_FORMAT))
+
+        _handler = NonBlockingQueueHandler(queue.Queue(config['LOG_QUEUE_SIZE']))
+        _handler.addFilter(SamplingFilter(config['LOG_SAMPLE_BURST'], config['LOG_SAMPLE_RATE']))
+        root.addHandler(_handler)
+        root.setLevel(config['LOG_LEVEL'].upper())
+        _start_listener()
+
+def start_log_writer():
+    """Start the writer thread in this process if it is not running.
+
+    A forked worker inherits the handler but not the parent's writer thread;
+    records logged before this call wait in the queue.
+    """
+    with _lock:
+        if _handler is not None and _listener_pid != os.getpid():
+            _start_listener()
+
+def _reset_queue_after_fork():
+    # The parent's writer thread may have held the queue's lock at the fork
+    global _lock
+    _lock = threading.Lock()
+    if _handler is not None:
+        _handler.queue = queue.Queue(_handler.queue.maxsize)
+
+os.register_at_fork(after_in_child=_reset_queue_after_fork)
+
+def _start_listener():
+    global _listener, _listener_pid
+    _listener = QueueListener(_handler.queue, _writer, respect_handler_level=True)
+    _listener.start()
+    _listener_pid = os.getpid()
+
+def _stop_listener():
+    global _listener
+    if _listener is not None and _listener_pid == os.getpid():
+        try:
+            _listener.stop()
+        except queue.Full:
+            pass  # No room for the stop marker; the daemon thread ends with the process
+    _listener = None
+
+@atexit.register
+def _flush_on_exit():
+    # Writes out whatever is still queued
+    with _lock:
+        _stop_listener()
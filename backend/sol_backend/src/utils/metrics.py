@@ -0,0 +1,285 @@
+from flask import g, has_request_context, request
+from bisect import bisect_left
+from collections import OrderedDict
+from functools import wraps
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Prometheus text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds in seconds; SQL statements and pool checkouts are usually much faster than requests
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+SQL_OPERATIONS = frozenset(['SELECT', 'INSERT', 'UPDATE', 'DELETE'])
+
+# Per-process snapshots shared through Redis, so a scrape of any worker covers the host
+REDIS_KEY_PREFIX = f'sol:metrics:{socket.gethostname()}:'
+
+class Histogram:
+    """Cumulative latency histogram with one series per combination of label values"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=REQUEST_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                # Per-bucket counts (the last one is +Inf), then the sum
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def time(self, *labelvalues):
+        return _Timer(self, labelvalues)
+
+    def snapshot(self):
+        with self._lock:
+            series = [[list(labels), values[:-1], values[-1]] for labels, values in self._series.items()]
+        return {'type': 'histogram', 'help': self.documentation, 'labels': list(self.labelnames),
+                'buckets': list(self.buckets), 'series': series}
+
+class _Timer:
+    def __init__(self, histogram, labelvalues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.elapsed = time.perf_counter() - self.start
+        self.histogram.observe(self.elapsed, *self.labelvalues)
+        return False
+
+class Gauge:
+    """Value read at scrape time from a callback returning [(label values, value)]"""
+
+    def __init__(self, name, documentation, labelnames, callback):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+
+    def snapshot(self):
+        try:
+            series = [[list(labels), value] for labels, value in self.callback()]
+        except Exception as e:
+            logger.warning("Could not read gauge %s: %s", self.name, e)
+            series = []
+        return {'type': 'gauge', 'help': self.documentation, 'labels': list(self.labelnames), 'series': series}
+
+class Registry:
+    def __init__(self):
+        self._metrics = OrderedDict()
+        self._lock = threading.Lock()
+
+    def histogram(self, name, documentation, labelnames=(), buckets=REQUEST_BUCKETS):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = Histogram(name, documentation, labelnames, buckets)
+            return metric
+
+    def gauge(self, name, documentation, labelnames, callback):
+        """Register a gauge, replacing any earlier one of the same name (one per app)"""
+        with self._lock:
+            metric = self._metrics[name] = Gauge(name, documentation, labelnames, callback)
+            return metric
+
+    def snapshot(self):
+        """JSON-serializable state of every metric, for render() and merge()"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {metric.name: metric.snapshot() for metric in metrics}
+
+registry = Registry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    'sol_http_request_duration_seconds', 'Time to handle a request, by route pattern',
+    ('method', 'route', 'status'))
+DB_QUERY_SECONDS = registry.histogram(
+    'sol_db_query_duration_seconds', 'SQL statement execution time', ('operation',), DB_BUCKETS)
+DB_POOL_WAIT_SECONDS = registry.histogram(
+    'sol_db_pool_checkout_wait_seconds', 'Time spent getting a connection from the pool, connecting included',
+    (), DB_BUCKETS)
+PROVIDER_CALL_SECONDS = registry.histogram(
+    'sol_provider_call_duration_seconds', 'DOKU, Xendit and Privy calls, retries included',
+    ('provider', 'operation', 'outcome'))
+
+def add_server_timing(name, seconds):
+    """Add to the named Server-Timing entry of the current request, if any"""
+    if has_request_context():
+        timings = g.get('server_timing')
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + seconds
+
+def observe_query(statement, elapsed):
+    operation = statement.lstrip()[:6].upper()
+    DB_QUERY_SECONDS.observe(elapsed, operation if operation in SQL_OPERATIONS else 'OTHER')
+
+def observe_pool_wait(elapsed):
+    DB_POOL_WAIT_SECONDS.observe(elapsed)
+    add_server_timing('pool', elapsed)
+
+def timed_call(provider, operation):
+    """Record a provider helper's duration and outcome (ok or error)"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = 'error'
+            try:
+                result = f(*args, **kwargs)
+                outcome = 'ok'
+                return result
+            finally:
+                elapsed = time.perf_counter() - start
+                PROVIDER_CALL_SECONDS.observe(elapsed, provider, operation, outcome)
+                add_server_timing('provider', elapsed)
+        return wrapper
+    return decorator
+
+def merge(snapshots):
+    """Add up snapshots from several processes, series by series"""
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.get(name)
+            if target is None:
+                merged[name] = target = dict(metric, series=[])
+                target['_index'] = {}
+            if metric['type'] == 'histogram' and metric['buckets'] != target['buckets']:
+                continue
+            index = target['_index']
+            for entry in metric['series']:
+                key = tuple(entry[0])
+                existing = index.get(key)
+                if existing is None:
+                    index[key] = existing = [entry[0]] + [list(value) if isinstance(value, list) else value
+                                                          for value in entry[1:]]
+                    target['series'].append(existing)
+                elif metric['type'] == 'histogram':
+                    existing[1] = [a + b for a, b in zip(existing[1], entry[1])]
+                    existing[2] += entry[2]
+                else:
+                    existing[1] += entry[1]
+    for metric in merged.values():
+        del metric['_index']
+    return merged
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def render(snapshot):
+    """Prometheus text format for a snapshot"""
+    lines = []
+    for name, metric in snapshot.items():
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric['labels']
+        for entry in metric['series']:
+            labels = entry[0]
+            if metric['type'] != 'histogram':
+                lines.append(f"{name}{_format_labels(labelnames, labels)} {_format_value(entry[1])}")
+                continue
+            counts, total = entry[1], entry[2]
+            cumulative = 0
+            for bound, count in zip(metric['buckets'] + ['+Inf'], counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else _format_value(float(bound))
+                lines.append(f"{name}_bucket{_format_labels(labelnames, labels, [('le', le)])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(labelnames, labels)} {cumulative}")
+    return '\n'.join(lines) + '\n'
+
+def publish(client, ttl):
+    """Store this process's snapshot in Redis for ttl seconds"""
+    client.set(f'{REDIS_KEY_PREFIX}{os.getpid()}', json.dumps(registry.snapshot()), ex=ttl)
+
+def collect(client=None, ttl=60):
+    """The snapshot to expose: this process alone, or every live process on this host through Redis"""
+    if client is None:
+        return registry.snapshot()
+    try:
+        publish(client, ttl)
+        keys = list(client.scan_iter(match=f'{REDIS_KEY_PREFIX}*', count=100))
+        snapshots = [json.loads(raw) for raw in client.mget(keys) if raw is not None]
+    except Exception as e:
+        logger.warning("Could not collect metrics from Redis, exposing this process only: %s", e)
+        return registry.snapshot()
+    return merge(snapshots)
+
+def start_publisher(app, client, interval):
+    """Publish this process's snapshot every interval seconds from a daemon thread.
+
+    Snapshots expire after a few intervals, so a worker that exits drops
+    out of the host's totals.
+    """
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    publish(client, int(interval * 4))
+            except Exception as e:
+                logger.warning("Could not publish metrics: %s", e)
+
+    thread = threading.Thread(target=run, name='metrics-publisher', daemon=True)
+    thread.start()
+    return thread
+
+def init_metrics(app):
+    """Time every request per route and break it down in a Server-Timing header.
+
+    The header has total (app), SQL (db, from the query stats), pool
+    checkout (pool) and provider call (provider) time, and is left out when
+    SERVER_TIMING_ENABLED is off.
+    """
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.server_timing = {}
+
+    @app.after_request
+    def record_request_time(response):
+        started = g.get('request_started')
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        HTTP_REQUEST_SECONDS.observe(elapsed, request.method, route, str(response.status_code))
+
+        if app.config['SERVER_TIMING_ENABLED']:
+            entries = [f'app;dur={elapsed * 1000:.2f}']
+            stats = g.get('query_stats')
+            if stats is not None:
+                entries.append(f'db;dur={stats.total_time * 1000:.2f};desc="{stats.count} queries"')
+            for name, seconds in g.server_timing.items():
+                entries.append(f'{name};dur={seconds * 1000:.2f}')
+            response.headers['Server-Timing'] = ', '.join(entries)
+
+        return response
@@ -0,0 +1,93 @@
+from sqlalchemy import and_, func, or_, select
+import math
+from datetime import datetime
+import base64
+import binascii
+
+MAX_PAGE_SIZE = 500
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+def encode_cursor(created_at, row_id):
+    """Encode a (created_at, id) position as an opaque URL-safe token"""
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Decode a token produced by encode_cursor back into (created_at, id)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = base64.urlsafe_b64decode(padded).decode().split('|', 1)
+        return datetime.fromisoformat(created_at), row_id
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        raise InvalidCursorError('Invalid cursor')
+
+def clamp_page_size(per_page):
+    return max(1, min(per_page, MAX_PAGE_SIZE))
+
+def _after_cursor(statement, model, cursor):
+    created_at, row_id = decode_cursor(cursor)
+    return statement.where(or_(
+        model.created_at < created_at,
+        and_(model.created_at == created_at, model.id < row_id)
+    ))
+
+def keyset_paginate(query, model, cursor=None, limit=20):
+    """Return one page of rows ordered by (created_at DESC, id DESC) and the next cursor.
+
+    Instead of OFFSET, the page starts strictly after the row the cursor points
+    at, so deep pages cost the same as the first one when (created_at, id) is
+    indexed. No COUNT(*) is issued; next_cursor is None on the last page.
+    """
+    if cursor:
+        query = _after_cursor(query, model, cursor)
+
+    # Fetch one extra row to learn whether another page exists
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+def keyset_paginate_rows(session, statement, model, cursor=None, limit=20):
+    """keyset_paginate for a column select (see src.utils.projection).
+
+    The statement must select model.created_at and model.id; rows are
+    returned as they come from the database.
+    """
+    if cursor:
+        statement = _after_cursor(statement, model, cursor)
+
+    statement = statement.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+    rows = session.execute(statement).all()
+
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]._mapping
+    return rows, encode_cursor(last[model.created_at], last[model.id])
+
+def count_rows(session, statement):
+    """COUNT(*) of what a select would return"""
+    return session.execute(select(func.count()).select_from(statement.order_by(None).subquery())).scalar()
+
+def offset_paginate_rows(session, statement, page, per_page, max_per_page=100):
+    """Page/per_page pagination for a column select, with the same argument
+    handling as Flask-SQLAlchemy's paginate(error_out=False).
+
+    Returns (rows, total, pages). The statement must already be ordered.
+    """
+    page = page if page and page >= 1 else 1
+    per_page = min(per_page, max_per_page) if per_page and per_page >= 1 else 20
+
+    rows = session.execute(statement.limit(per_page).offset((page - 1) * per_page)).all()
+    # A first page that is not full is the whole result; skip the COUNT
+    if page == 1 and len(rows) < per_page:
+        total = len(rows)
+    else:
+        total = count_rows(session, statement)
+    return rows, total, math.ceil(total / per_page)
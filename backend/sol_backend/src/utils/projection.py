@@ -0,0 +1,50 @@
+from flask import current_app
+from sqlalchemy import Float, cast, select
+from datetime import date, datetime
+from decimal import Decimal
+import json
+
+try:
+    import orjson
+except ImportError:  # Optional; the standard library encoder is the fallback
+    orjson = None
+
+class Projection:
+    """The columns a list endpoint returns, selected as plain rows instead of ORM objects.
+
+    fields is a sequence of (key, column expression). Rows come back as
+    tuples and become dicts with a single zip, skipping identity-map
+    bookkeeping and per-attribute instrumentation; datetimes are left for
+    the JSON encoder.
+    """
+
+    def __init__(self, *fields):
+        self.keys = tuple(key for key, _ in fields)
+        self.columns = tuple(column for _, column in fields)
+
+    def select(self):
+        return select(*self.columns)
+
+    def serialize(self, rows):
+        keys = self.keys
+        return [dict(zip(keys, row)) for row in rows]
+
+def as_float(column):
+    """Have the database return a NUMERIC column as a float, as the API reports amounts"""
+    return cast(column, Float)
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def dumps(payload):
+    """Encode to JSON bytes: orjson when installed, else the standard library"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode()
+
+def json_response(payload, status=200):
+    return current_app.response_class(dumps(payload), status=status, mimetype='application/json')
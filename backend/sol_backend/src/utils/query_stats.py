@@ -0,0 +1,134 @@
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from src.utils.metrics import observe_query
+from collections import Counter
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Same statement text repeated this many times in one request is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = 5
+
+_listeners_installed = False
+_local = threading.local()
+
+class QueryStats:
+    """SQL statement count and time collected for one request or block"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.statements = Counter()
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.total_time += elapsed
+        self.statements[statement] += 1
+
+    def repeated_selects(self, threshold=N_PLUS_ONE_THRESHOLD):
+        return [
+            (statement, count) for statement, count in self.statements.items()
+            if count >= threshold and statement.lstrip().upper().startswith('SELECT')
+        ]
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+    observe_query(statement, elapsed)
+
+    if has_app_context():
+        stats = g.get('query_stats')
+        if stats is not None:
+            stats.record(statement, elapsed)
+
+    for stats in getattr(_local, 'collectors', ()):
+        stats.record(statement, elapsed)
+
+def query_budget(max_queries):
+    """Declare the maximum number of SQL statements a view may run per request"""
+    def decorator(f):
+        f.query_budget = max_queries
+        return f
+    return decorator
+
+def _declared_budget():
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, 'query_budget', None)
+
+def init_query_stats(app):
+    """Count SQL statements per request and report them in response headers.
+
+    Adds X-Query-Count and X-Query-Time-Ms to every response (and
+    X-Query-Budget when the view declares one). Requests that go over their
+    declared budget or repeat the same SELECT N_PLUS_ONE_THRESHOLD times
+    are logged as warnings.
+    """
+    global _listeners_installed
+    if not _listeners_installed:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _listeners_installed = True
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = QueryStats()
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = g.get('query_stats')
+        if stats is None:
+            return response
+
+        response.headers['X-Query-Count'] = str(stats.count)
+        response.headers['X-Query-Time-Ms'] = f"{stats.total_time * 1000:.2f}"
+
+        budget = _declared_budget()
+        if budget is not None:
+            response.headers['X-Query-Budget'] = str(budget)
+            if stats.count > budget:
+                logger.warning("%s %s ran %s queries, budget is %s", request.method, request.path, stats.count, budget)
+
+        for statement, count in stats.repeated_selects():
+            logger.warning("Possible N+1 in %s %s: statement ran %s times: %s", request.method, request.path, count, statement[:200])
+
+        return response
+
+class count_queries:
+    """Collect SQL statements run on this thread inside a with block.
+
+    Works across Flask test client requests, which push their own app context:
+
+        with count_queries() as stats:
+            client.get('/api/admin/transactions', headers=headers)
+        assert stats.count <= 2
+    """
+
+    def __enter__(self):
+        self.stats = QueryStats()
+        if not hasattr(_local, 'collectors'):
+            _local.collectors = []
+        _local.collectors.append(self.stats)
+        return self.stats
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _local.collectors.remove(self.stats)
+        return False
+
+def assert_query_budget(response, max_queries=None):
+    """Fail when a test client response ran more queries than its budget.
+
+    The budget defaults to the one the view declared with @query_budget.
+    """
+    count = int(response.headers['X-Query-Count'])
+    if max_queries is None:
+        if 'X-Query-Budget' not in response.headers:
+            raise AssertionError(f"{response.request.path} does not declare a query budget")
+        max_queries = int(response.headers['X-Query-Budget'])
+
+    if count > max_queries:
+        raise AssertionError(f"{response.request.path} ran {count} queries, budget is {max_queries}")
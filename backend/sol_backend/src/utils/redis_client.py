@@ -0,0 +1,27 @@
+import threading
+
+try:
+    import redis
+except ImportError:  # Redis is optional; every feature using it has an in-process fallback
+    redis = None
+
+_clients = {}
+_lock = threading.Lock()
+
+def get_redis(url):
+    """Shared client for url, or None when no Redis is configured.
+
+    Raises RuntimeError if a URL is set but the redis package is missing,
+    rather than silently running without the shared backend.
+    """
+    if not url:
+        return None
+    if redis is None:
+        raise RuntimeError('REDIS_URL is set but the redis package is not installed')
+
+    with _lock:
+        client = _clients.get(url)
+        if client is None:
+            client = redis.Redis.from_url(url, socket_connect_timeout=2, health_check_interval=30)
+            _clients[url] = client
+        return client
@@ -0,0 +1,5 @@
+"""WSGI entry point for production servers: gunicorn -c gunicorn.conf.py src.wsgi:app"""
+import os
+from src.main import create_app
+
+app = create_app(os.getenv('SOL_CONFIG', 'production'))
@@ -0,0 +1,59 @@
+"""Shared fixtures: the testing app on an in-memory SQLite database.
+
+Run from backend/sol_backend:
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from flask_jwt_extended import create_access_token
+from src.main import create_app
+from src.models.user import Admin, Transaction, User, db
+from src.services import stats
+from decimal import Decimal
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        stats.ensure_counters()
+    # No app context stays pushed: the test client would reuse it, sharing g and the session across requests
+    yield app
+    with app.app_context():
+        db.drop_all()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def user_id(app):
+    """An approved user with 30 transactions, more than one page"""
+    with app.app_context():
+        user = User(passport_number='A1234567', full_name='Test User', email='user@example.com',
+                    password_hash='not-a-bcrypt-hash', kyc_status='APPROVED', wallet_balance=Decimal('500000'))
+        db.session.add(user)
+        db.session.flush()
+        for index in range(30):
+            db.session.add(Transaction(user_id=user.id, type='TOPUP', amount=Decimal(1000 + index),
+                                       status='SUCCESS' if index % 3 else 'PENDING', description=f'Top-up {index}'))
+        db.session.commit()
+        return user.id
+
+@pytest.fixture
+def user_headers(app, user_id):
+    with app.app_context():
+        return {'Authorization': f'Bearer {create_access_token(identity=user_id)}'}
+
+@pytest.fixture
+def admin_headers(app):
+    with app.app_context():
+        admin = Admin(username='admin', email='admin@example.com', password_hash='not-a-bcrypt-hash')
+        db.session.add(admin)
+        db.session.commit()
+        return {'Authorization': f'Bearer {create_access_token(identity=f"admin:{admin.id}")}'}
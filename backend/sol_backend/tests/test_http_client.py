@@ -0,0 +1,161 @@
+"""ProviderClient retries, timeouts and circuit breaker, against the local provider stub"""
+import pytest
+import threading
+import time
+from benchmarks.provider_stub import StubServer, StubState
+from src.services import http_client
+from src.services.http_client import CircuitBreaker, CircuitOpenError, ProviderClient, ProviderError
+
+@pytest.fixture(scope='module')
+def stub_server():
+    with StubServer() as server:
+        yield server
+
+@pytest.fixture
+def stub(stub_server):
+    # Fresh request counts and failure keys for every test
+    stub_server.httpd.state = StubState()
+    return stub_server
+
+@pytest.fixture
+def backoffs(monkeypatch):
+    """Bounds passed to the jitter draw; the draw itself returns 0 so tests do not sleep"""
+    calls = []
+
+    def uniform(low, high):
+        calls.append((low, high))
+        return 0.0
+
+    monkeypatch.setattr(http_client.random, 'uniform', uniform)
+    return calls
+
+def make_client(stub, **kwargs):
+    kwargs.setdefault('retry_backoff', 0.05)
+    kwargs.setdefault('breaker', CircuitBreaker('Stub', failure_threshold=10, reset_timeout=60))
+    return ProviderClient('Stub', stub.url, **kwargs)
+
+def test_get_is_retried_on_5xx_with_jittered_backoff(stub, backoffs):
+    client = make_client(stub, max_retries=2)
+
+    body = client.get('/v1/status?fail=2&key=get-5xx')
+
+    assert body['status'] == 'OK'
+    assert stub.state.requests == 3
+    # Full jitter: each wait is drawn from [0, backoff * 2^attempt]
+    assert backoffs == [(0, 0.05), (0, 0.1)]
+
+def test_get_gives_up_after_max_retries(stub, backoffs):
+    client = make_client(stub, max_retries=2)
+
+    with pytest.raises(ProviderError) as raised:
+        client.get('/v1/status?fail=5&key=get-down')
+
+    assert raised.value.status_code == 503
+    assert stub.state.requests == 3
+
+def test_read_timeout_is_enforced_and_retried_for_get(stub, backoffs):
+    client = make_client(stub, read_timeout=0.1, max_retries=1)
+
+    started = time.monotonic()
+    with pytest.raises(ProviderError):
+        client.get('/v1/status?delay=1')
+    elapsed = time.monotonic() - started
+
+    assert stub.state.requests == 2
+    assert elapsed < 0.8
+
+def test_per_call_timeout_overrides_the_default(stub, backoffs):
+    client = make_client(stub, max_retries=0)
+
+    started = time.monotonic()
+    with pytest.raises(ProviderError):
+        client.get('/v1/status?delay=1', timeout=(1, 0.1))
+
+    assert time.monotonic() - started < 0.8
+
+def test_post_without_idempotency_key_is_not_retried(stub, backoffs):
+    client = make_client(stub, max_retries=2)
+
+    with pytest.raises(ProviderError) as raised:
+        client.post('/v1/payment_requests?fail=1&key=post-5xx', json={'amount': 1000})
+
+    assert raised.value.status_code == 503
+    assert stub.state.requests == 1
+    assert backoffs == []
+
+def test_post_timeout_is_not_retried(stub, backoffs):
+    client = make_client(stub, read_timeout=0.1, max_retries=2)
+
+    with pytest.raises(ProviderError):
+        client.post('/v1/payment_requests?delay=1', json={'amount': 1000})
+
+    assert stub.state.requests == 1
+
+def test_post_with_idempotency_key_is_retried(stub, backoffs):
+    client = make_client(stub, max_retries=2)
+
+    body = client.request('POST', '/v1/payment_requests?fail=1&key=post-key', json={'amount': 1000},
+                          headers={'Idempotency-key': 'tx-1'}, idempotent=True)
+
+    assert body['status'] == 'OK'
+    assert stub.state.requests == 2
+
+def test_client_errors_are_not_retried(stub, backoffs):
+    client = make_client(stub, max_retries=2)
+
+    with pytest.raises(ProviderError) as raised:
+        client.get('/v1/status?status=404')
+
+    assert raised.value.status_code == 404
+    assert stub.state.requests == 1
+
+def test_breaker_opens_after_consecutive_failures(stub, backoffs):
+    client = make_client(stub, max_retries=0, breaker=CircuitBreaker('Stub', failure_threshold=3, reset_timeout=60))
+
+    for _ in range(3):
+        with pytest.raises(ProviderError):
+            client.get('/v1/status?status=503')
+
+    assert client.breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        client.get('/v1/status')
+    # Refused without calling the provider
+    assert stub.state.requests == 3
+
+def test_half_open_breaker_admits_exactly_one_trial(stub, backoffs):
+    client = make_client(stub, max_retries=0, breaker=CircuitBreaker('Stub', failure_threshold=1, reset_timeout=0.2))
+    with pytest.raises(ProviderError):
+        client.get('/v1/status?status=503')
+    time.sleep(0.25)
+    assert client.breaker.state == 'half-open'
+
+    results = {}
+
+    def trial():
+        results['trial'] = client.get('/v1/status?delay=0.3')
+
+    thread = threading.Thread(target=trial)
+    thread.start()
+    time.sleep(0.1)
+    # The trial is still running; every other call is refused until it finishes
+    with pytest.raises(CircuitOpenError):
+        client.get('/v1/status')
+    thread.join()
+
+    assert results['trial']['status'] == 'OK'
+    assert stub.state.requests == 2
+    assert client.breaker.state == 'closed'
+    assert client.get('/v1/status')['status'] == 'OK'
+
+def test_failed_trial_opens_the_breaker_again(stub, backoffs):
+    client = make_client(stub, max_retries=0, breaker=CircuitBreaker('Stub', failure_threshold=1, reset_timeout=0.2))
+    with pytest.raises(ProviderError):
+        client.get('/v1/status?status=503')
+    time.sleep(0.25)
+
+    with pytest.raises(ProviderError):
+        client.get('/v1/status?status=503')
+
+    assert client.breaker.state == 'open'
+    with pytest.raises(CircuitOpenError):
+        client.get('/v1/status')
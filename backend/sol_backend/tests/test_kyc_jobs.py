@@ -0,0 +1,77 @@
+"""KYC job outcome and the user's registered passport number"""
+import uuid
+from src.models.user import User, db
+from src.services import kyc_jobs
+from src.services.kyc_providers import StubKycProvider
+
+def register(passport_number):
+    user = User(passport_number=passport_number, full_name='Kyc User', email=f'{passport_number.lower()}@example.com',
+                password_hash='not-a-bcrypt-hash')
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+def verify(user_id, images=('passport.jpg', 'selfie.jpg'), max_attempts=1):
+    kyc_id = str(uuid.uuid4())
+    _, token = kyc_jobs.enqueue(db.session.get(User, user_id), kyc_id, *images, lease_seconds=60)
+    db.session.commit()
+    kyc_jobs.process_job(kyc_id, token, max_attempts, 0)
+    db.session.expunge_all()
+    return db.session.get(User, user_id)
+
+def test_default_stub_approves_every_user_and_keeps_their_passport(app):
+    with app.app_context():
+        first, second = register('B1234567'), register('C7654321')
+
+        assert verify(first).kyc_status == 'APPROVED'
+        user = verify(second)
+
+        assert user.kyc_status == 'APPROVED'
+        assert user.passport_number == 'C7654321'
+
+def test_ocr_passport_that_differs_from_the_registered_one_is_rejected(app):
+    app.config['KYC_PROVIDER'] = StubKycProvider(ocr={'passport_number': 'Z9999999', 'confidence_score': 0.95})
+    with app.app_context():
+        user = verify(register('D1234567'))
+
+        assert user.kyc_status == 'REJECTED'
+        assert user.passport_number == 'D1234567'
+
+def test_decide_compares_passport_numbers_loosely():
+    results = {
+        'ocr': {'passport_number': 'e 1234567', 'confidence_score': 0.95},
+        'liveness': {'is_live': True},
+        'face_match': {'is_match': True}
+    }
+
+    assert kyc_jobs.decide(results, 'E1234567') == 'APPROVED'
+    assert kyc_jobs.decide(results, 'E7654321') == 'REJECTED'
+    assert kyc_jobs.decide(results) == 'APPROVED'
+
+def stored_images(tmp_path):
+    images = (tmp_path / 'passport_image.jpg', tmp_path / 'selfie_image.jpg')
+    for image in images:
+        image.write_bytes(b'\xff\xd8\xff image')
+    return tuple(str(image) for image in images)
+
+def test_images_are_deleted_once_the_job_is_decided(app, tmp_path):
+    images = stored_images(tmp_path)
+    with app.app_context():
+        assert verify(register('F1234567'), images).kyc_status == 'APPROVED'
+
+    assert list(tmp_path.iterdir()) == []
+
+class BrokenLiveness(StubKycProvider):
+    def liveness(self, selfie_image):
+        raise RuntimeError('liveness unavailable')
+
+def test_images_are_kept_for_a_retry_and_deleted_when_the_job_fails(app, tmp_path):
+    app.config['KYC_PROVIDER'] = BrokenLiveness()
+    images = stored_images(tmp_path)
+    with app.app_context():
+        assert verify(register('G1234567'), images, max_attempts=2).kyc_status == 'PENDING'
+        assert sorted(str(path) for path in tmp_path.iterdir()) == sorted(images)
+
+        assert verify(register('H1234567'), images, max_attempts=1).kyc_status == 'PENDING'
+
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,83 @@
+"""Log redaction on the queue handler and the INFO sampling filter"""
+import json
+import logging
+import queue
+import pytest
+from src.utils.logging_setup import REDACTED, JsonFormatter, NonBlockingQueueHandler, SamplingFilter
+
+@pytest.fixture
+def captured():
+    """A logger whose records go through NonBlockingQueueHandler; yields (logger, lines)"""
+    records = queue.Queue()
+    handler = NonBlockingQueueHandler(records)
+    logger = logging.getLogger('tests.logging_setup')
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    formatter = JsonFormatter()
+
+    def lines():
+        entries = []
+        while not records.empty():
+            entries.append(json.loads(formatter.format(records.get_nowait())))
+        return entries
+
+    yield logger, lines
+    logger.removeHandler(handler)
+    logger.propagate = True
+
+def test_percent_args_are_redacted(captured):
+    logger, lines = captured
+    logger.info("Registered %s", {'passport_number': 'A1234567', 'email': 'user@example.com', 'kyc_status': 'PENDING'})
+    logger.info("Sent receipt to %s", 'user@example.com')
+
+    first, second = lines()
+    assert 'A1234567' not in first['message'] and 'user@example.com' not in first['message']
+    assert f"'passport_number': '{REDACTED}'" in first['message']
+    assert "'kyc_status': 'PENDING'" in first['message']
+    assert second['message'] == f'Sent receipt to {REDACTED}'
+
+def test_mapping_args_are_redacted(captured):
+    logger, lines = captured
+    logger.info("User %(full_name)s at %(status)s", {'full_name': 'Test User', 'status': 'APPROVED'})
+
+    assert lines()[0]['message'] == f'User {REDACTED} at APPROVED'
+
+def test_extra_fields_are_redacted_at_any_depth(captured):
+    logger, lines = captured
+    result = {
+        'status': 'PASSED',
+        'data': {'passport_number': 'A1234567', 'full_name': 'Test User', 'confidence': 0.98},
+        'checks': [{'email': 'user@example.com'}, {'note': 'contact user@example.com'}]
+    }
+    logger.info("KYC %s %s result recorded", 'job-1', 'ocr', extra={'result': result})
+
+    entry = lines()[0]
+    assert entry['result'] == {
+        'status': 'PASSED',
+        'data': {'passport_number': REDACTED, 'full_name': REDACTED, 'confidence': 0.98},
+        'checks': [{'email': REDACTED}, {'note': f'contact {REDACTED}'}]
+    }
+    # The caller's objects are left as they were
+    assert result['data']['passport_number'] == 'A1234567'
+
+def test_sampling_never_drops_warnings(monkeypatch):
+    monkeypatch.setattr('src.utils.logging_setup.random.random', lambda: 0.99)
+    sampler = SamplingFilter(burst=2, rate=0.1)
+
+    def record(level, msg='Repeated message'):
+        return logging.LogRecord('tests.sampling', level, __file__, 1, msg, (), None)
+
+    assert [sampler.filter(record(logging.INFO)) for _ in range(5)] == [True, True, False, False, False]
+    for level in (logging.WARNING, logging.ERROR, logging.CRITICAL):
+        assert all(sampler.filter(record(level)) for _ in range(50))
+    assert sampler.filter(record(logging.INFO, 'Another message'))
+
+def test_sampled_record_carries_the_dropped_count(monkeypatch):
+    draws = iter([0.99, 0.99, 0.0])
+    monkeypatch.setattr('src.utils.logging_setup.random.random', lambda: next(draws))
+    sampler = SamplingFilter(burst=1, rate=0.5)
+    records = [logging.LogRecord('tests.sampling', logging.INFO, __file__, 1, 'Tick', (), None) for _ in range(4)]
+
+    assert [sampler.filter(record) for record in records] == [True, False, False, True]
+    assert records[3].sampled == {'dropped': 2, 'rate': 0.5}
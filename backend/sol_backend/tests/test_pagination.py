@@ -0,0 +1,41 @@
+"""The keyset ORDER BY is served by the Transaction indexes"""
+from sqlalchemy import select, text
+from src.cli import create_missing_indexes, drop_superseded_indexes
+from src.models.user import Transaction, db
+from src.utils.pagination import _after_cursor, encode_cursor
+from datetime import datetime
+
+def query_plan(statement):
+    sql = statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    return ' '.join(row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')))
+
+def keyset_page(statement):
+    return statement.order_by(Transaction.created_at.desc(), Transaction.id.desc()).limit(21)
+
+def test_keyset_pages_are_read_in_index_order(app):
+    cursor = encode_cursor(datetime(2026, 1, 1), 'b9d1c4c2-0000-0000-0000-000000000000')
+    pages = {
+        'ix_transaction_user_id_created_at_id': select(Transaction).where(Transaction.user_id == 'u1'),
+        'ix_transaction_created_at_id': select(Transaction),
+        'ix_transaction_status_created_at_id': select(Transaction).where(Transaction.status == 'PENDING')
+    }
+    with app.app_context():
+        for index, statement in pages.items():
+            for page in (statement, _after_cursor(statement, Transaction, cursor)):
+                plan = query_plan(keyset_page(page))
+                assert index in plan
+                assert 'TEMP B-TREE' not in plan
+
+def test_init_db_replaces_the_id_ascending_indexes(app):
+    table = Transaction.__table__
+    with app.app_context():
+        for index in list(table.indexes):
+            index.drop(db.engine)
+        db.session.execute(text('CREATE INDEX ix_transaction_created_at ON "transaction" (created_at DESC, id)'))
+        db.session.commit()
+        assert 'TEMP B-TREE' in query_plan(keyset_page(select(Transaction.id, Transaction.created_at)))
+
+        assert create_missing_indexes() == sorted(index.name for index in table.indexes)
+        assert drop_superseded_indexes() == ['ix_transaction_created_at']
+        assert create_missing_indexes() == drop_superseded_indexes() == []
+        assert 'ix_transaction_created_at' not in {index.name for index in table.indexes}
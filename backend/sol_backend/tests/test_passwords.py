@@ -0,0 +1,39 @@
+"""Bounds of the bcrypt process pool"""
+import pytest
+import time
+from src.services.passwords import HasherBusyError, PasswordHasher, hash_cost
+
+def test_inline_hash_and_verify():
+    hasher = PasswordHasher(rounds=4, pool_size=0)
+
+    hashed = hasher.hash('secret')
+
+    assert hash_cost(hashed) == 4
+    assert hasher.verify('secret', hashed)
+    assert not hasher.verify('wrong', hashed)
+    assert not hasher.needs_rehash(hashed)
+    assert PasswordHasher(rounds=5, pool_size=0).needs_rehash(hashed)
+
+def test_timed_out_operation_keeps_its_slot_until_it_finishes():
+    hasher = PasswordHasher(rounds=12, pool_size=1, max_pending=1, timeout=0.01)
+    try:
+        with pytest.raises(HasherBusyError, match='timed out'):
+            hasher.hash('secret')
+
+        # The bcrypt call is still running in the pool, so it still counts against max_pending
+        with pytest.raises(HasherBusyError, match='Too many'):
+            hasher.hash('secret')
+
+        deadline = time.monotonic() + 10
+        while not hasher._slots.acquire(blocking=False):
+            assert time.monotonic() < deadline, 'slot was never released'
+            time.sleep(0.05)
+        hasher._slots.release()
+    finally:
+        hasher.shutdown()
+
+def test_configure_applies_app_settings(app):
+    from src.services.passwords import password_hasher
+
+    assert password_hasher.rounds == app.config['BCRYPT_ROUNDS'] == 4
+    assert password_hasher.pool_size == 0
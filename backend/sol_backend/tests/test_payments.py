@@ -0,0 +1,60 @@
+"""PaymentService: the Transaction is reserved before the provider call"""
+import pytest
+from src.models.user import Transaction, db
+from src.services.ledger import debit
+from src.services.payments import ProviderPayment, payment_service
+from decimal import Decimal
+
+class RecordingProvider:
+    """Records the Transaction as stored while it is being called"""
+    name = 'Recording'
+
+    def __init__(self, error=None):
+        self.error = error
+        self.seen = None
+
+    def create_payment(self, amount, reference_id, channel):
+        transaction = db.session.get(Transaction, reference_id)
+        self.seen = (transaction.status, transaction.xendit_transaction_id)
+        db.session.rollback()
+        if self.error:
+            raise self.error
+        return ProviderPayment(f'ref-{reference_id}', None, None, {})
+
+def stored(app, transaction_id):
+    with app.app_context():
+        transaction = db.session.get(Transaction, transaction_id)
+        return transaction.status, transaction.xendit_transaction_id
+
+def test_row_is_committed_before_the_provider_call(app, user_id):
+    provider = RecordingProvider()
+    with app.test_request_context():
+        created = payment_service.create_payment(provider, user_id, 'TOPUP', Decimal('50000'), 'BCA_VA', 'Top-up')
+
+    assert provider.seen == ('PENDING', None)
+    assert created.status == 'PENDING'
+    assert stored(app, created.transaction_id) == ('PENDING', f'ref-{created.transaction_id}')
+
+def test_provider_error_marks_the_row_failed(app, user_id):
+    provider = RecordingProvider(RuntimeError('provider down'))
+    with app.test_request_context():
+        with pytest.raises(RuntimeError):
+            payment_service.create_payment(provider, user_id, 'TOPUP', Decimal('50000'), 'BCA_VA', 'Top-up')
+
+    with app.app_context():
+        failed = Transaction.query.filter_by(description='Top-up', status='FAILED').all()
+        assert len(failed) == 1
+        assert failed[0].xendit_transaction_id is None
+
+def test_completion_is_committed_with_the_reference(app, user_id):
+    def pay(transaction, payment):
+        transaction.status = 'SUCCESS'
+        return debit(user_id, Decimal('30000'), 'QRIS_PAYMENT', transaction_id=transaction.id)
+
+    with app.test_request_context():
+        created = payment_service.create_payment(RecordingProvider(), user_id, 'QRIS_PAYMENT', Decimal('30000'),
+                                                 'QRIS', 'QRIS payment', complete=pay)
+
+    assert created.status == 'SUCCESS'
+    assert created.completion == Decimal('470000')
+    assert stored(app, created.transaction_id) == ('SUCCESS', f'ref-{created.transaction_id}')
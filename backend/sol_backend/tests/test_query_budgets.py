@@ -0,0 +1,46 @@
+"""The listing and dashboard endpoints stay within their @query_budget"""
+from src.utils.query_stats import assert_query_budget, count_queries
+
+def test_wallet_transactions(client, user_headers):
+    response = client.get('/api/wallet/transactions', headers=user_headers)
+
+    assert response.status_code == 200
+    assert len(response.get_json()['transactions']) == 20
+    assert_query_budget(response)
+
+def test_wallet_transactions_keyset_pages(client, user_headers):
+    first = client.get('/api/wallet/transactions?cursor=&per_page=20', headers=user_headers)
+    assert first.status_code == 200
+    assert_query_budget(first)
+
+    cursor = first.get_json()['next_cursor']
+    second = client.get(f'/api/wallet/transactions?cursor={cursor}&per_page=20', headers=user_headers)
+    assert second.status_code == 200
+    assert len(second.get_json()['transactions']) == 10
+    assert_query_budget(second)
+
+def test_admin_transactions(client, user_id, admin_headers):
+    response = client.get('/api/admin/transactions', headers=admin_headers)
+
+    assert response.status_code == 200
+    transactions = response.get_json()['transactions']
+    assert len(transactions) == 30
+    assert {transaction['user_name'] for transaction in transactions} == {'Test User'}
+    assert_query_budget(response)
+
+def test_admin_transactions_keyset(client, user_id, admin_headers):
+    response = client.get('/api/admin/transactions?cursor=&per_page=10', headers=admin_headers)
+
+    assert response.status_code == 200
+    assert response.get_json()['has_more'] is True
+    assert_query_budget(response)
+
+def test_admin_stats(client, user_id, admin_headers):
+    with count_queries() as queries:
+        response = client.get('/api/admin/stats', headers=admin_headers)
+
+    assert response.status_code == 200
+    assert response.get_json()['total_transactions'] == 30
+    assert response.get_json()['successful_transactions'] == 20
+    assert_query_budget(response)
+    assert queries.count == int(response.headers['X-Query-Count'])
@@ -0,0 +1,69 @@
+"""Token buckets and the @rate_limit decorator"""
+import pytest
+from flask_jwt_extended import create_access_token
+from src.models.user import User, db
+from src.services import rate_limits
+from src.services.rate_limits import LocalRateLimiter
+
+@pytest.fixture
+def limited(app, monkeypatch):
+    """Rate limiting on, with fresh in-process buckets"""
+    monkeypatch.setattr(rate_limits, '_limiter', LocalRateLimiter())
+    app.config.update(RATE_LIMIT_ENABLED=True, RATE_LIMIT_AUTH='5/minute', RATE_LIMIT_PAYMENT='2/minute')
+    return app
+
+def login(client, address='10.0.0.1'):
+    return client.post('/api/auth/login', json={'email': 'nobody@example.com', 'password': 'wrong'},
+                       environ_base={'REMOTE_ADDR': address})
+
+def test_bucket_allows_a_burst_then_refills(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(rate_limits.time, 'monotonic', lambda: clock[0])
+    limiter = LocalRateLimiter()
+
+    assert [limiter.hit('key', 5, 60)[0] for _ in range(6)] == [True] * 5 + [False]
+    assert limiter.hit('key', 5, 60)[2] == pytest.approx(12)
+
+    clock[0] += 12
+    assert limiter.hit('key', 5, 60)[0] is True
+    assert limiter.hit('key', 5, 60)[0] is False
+
+def test_request_after_the_burst_gets_429(limited, client):
+    responses = [login(client) for _ in range(5)]
+    assert [response.status_code for response in responses] == [401] * 5
+    assert [response.headers['X-RateLimit-Remaining'] for response in responses] == ['4', '3', '2', '1', '0']
+    assert responses[0].headers['X-RateLimit-Limit'] == '5'
+
+    refused = login(client)
+
+    assert refused.status_code == 429
+    assert refused.get_json() == {'error': 'Too many requests, please retry later'}
+    assert 1 <= int(refused.headers['Retry-After']) <= 12
+    assert refused.headers['X-RateLimit-Limit'] == '5'
+    assert refused.headers['X-RateLimit-Remaining'] == '0'
+
+def test_auth_routes_share_one_bucket_per_ip(limited, client):
+    for _ in range(5):
+        login(client)
+
+    register = client.post('/api/auth/register', json={}, environ_base={'REMOTE_ADDR': '10.0.0.1'})
+    admin_login = client.post('/api/admin/login', json={}, environ_base={'REMOTE_ADDR': '10.0.0.1'})
+
+    assert register.status_code == admin_login.status_code == 429
+    assert login(client, '10.0.0.2').status_code == 401
+
+def test_user_buckets_are_separate(limited, client, user_headers):
+    with limited.app_context():
+        other = User(passport_number='B7654321', full_name='Other User', email='other@example.com',
+                     password_hash='not-a-bcrypt-hash', kyc_status='APPROVED')
+        db.session.add(other)
+        db.session.commit()
+        other_headers = {'Authorization': f'Bearer {create_access_token(identity=other.id)}'}
+
+    def topup(headers):
+        # An unknown payment method is refused after the rate limit check, without calling a provider
+        return client.post('/api/wallet/topup', headers=headers, json={'amount': 50, 'payment_method': 'BOGUS'},
+                           environ_base={'REMOTE_ADDR': '10.0.0.1'}).status_code
+
+    assert [topup(user_headers) for _ in range(3)] == [400, 400, 429]
+    assert [topup(other_headers) for _ in range(3)] == [400, 400, 429]
@@ -0,0 +1,142 @@
+"""Bulk settlement: settle() and the credit_many() balance UPDATE behind it"""
+from src.models.ledger import LedgerEntry
+from src.models.user import Transaction, User, db
+from src.utils.query_stats import assert_query_budget
+from decimal import Decimal
+
+def pending(app, user_id, amount, reference=None, type='TOPUP'):
+    with app.app_context():
+        transaction = Transaction(user_id=user_id, type=type, amount=Decimal(amount), status='PENDING',
+                                  xendit_transaction_id=reference)
+        db.session.add(transaction)
+        db.session.commit()
+        return transaction.id
+
+def second_user(app):
+    with app.app_context():
+        user = User(passport_number='B7654321', full_name='Other User', email='other@example.com',
+                    password_hash='not-a-bcrypt-hash', kyc_status='APPROVED', wallet_balance=Decimal('1000'))
+        db.session.add(user)
+        db.session.commit()
+        return user.id
+
+def balance(app, user_id):
+    with app.app_context():
+        return db.session.get(User, user_id).wallet_balance
+
+def status(app, transaction_id):
+    with app.app_context():
+        return db.session.get(Transaction, transaction_id).status
+
+def ledger(app, user_id):
+    with app.app_context():
+        return {entry.transaction_id: (entry.amount, entry.balance_after)
+                for entry in LedgerEntry.query.filter_by(user_id=user_id)}
+
+def settle(client, admin_headers, notifications):
+    response = client.post('/api/admin/settlements/bulk', headers=admin_headers, json={'notifications': notifications})
+    assert response.status_code == 200
+    assert_query_budget(response)
+    return response.get_json()
+
+def outcomes(body):
+    return [result['outcome'] for result in body['results']]
+
+def test_repeated_user_is_credited_once_with_running_ledger_balances(app, client, user_id, admin_headers):
+    other_id = second_user(app)
+    first = pending(app, user_id, '1000', 'ref-1')
+    second = pending(app, user_id, '2500', 'ref-2')
+    third = pending(app, other_id, '400', 'ref-3')
+
+    body = settle(client, admin_headers, [
+        {'reference_no': 'ref-1', 'status': 'PAID', 'amount': 1000},
+        {'reference_no': 'ref-3', 'status': 'PAID'},
+        {'transaction_id': second, 'status': 'SETTLED'}
+    ])
+
+    assert outcomes(body) == ['SETTLED'] * 3
+    assert body['credited_users'] == 2
+    assert balance(app, user_id) == Decimal('503500')
+    assert balance(app, other_id) == Decimal('1400')
+    assert ledger(app, user_id) == {first: (Decimal('1000'), Decimal('501000')),
+                                    second: (Decimal('2500'), Decimal('503500'))}
+    assert ledger(app, other_id) == {third: (Decimal('400'), Decimal('1400'))}
+
+def test_duplicate_in_a_batch_is_applied_once(app, client, user_id, admin_headers):
+    transaction_id = pending(app, user_id, '1000', 'ref-1')
+
+    body = settle(client, admin_headers, [
+        {'reference_no': 'ref-1', 'status': 'PAID'},
+        {'transaction_id': transaction_id, 'status': 'EXPIRED'}
+    ])
+
+    assert outcomes(body) == ['SETTLED', 'DUPLICATE']
+    assert body['results'][1]['status'] == 'SUCCESS'
+    assert status(app, transaction_id) == 'SUCCESS'
+    assert balance(app, user_id) == Decimal('501000')
+
+def test_replayed_batch_is_already_processed(app, client, user_id, admin_headers):
+    transaction_id = pending(app, user_id, '1000', 'ref-1')
+    failed_id = pending(app, user_id, '700', 'ref-2')
+    notifications = [{'reference_no': 'ref-1', 'status': 'PAID'}, {'reference_no': 'ref-2', 'status': 'EXPIRED'}]
+
+    settle(client, admin_headers, notifications)
+    body = settle(client, admin_headers, notifications)
+
+    assert outcomes(body) == ['ALREADY_PROCESSED', 'ALREADY_PROCESSED']
+    assert body['credited_users'] == 0
+    assert (status(app, transaction_id), status(app, failed_id)) == ('SUCCESS', 'FAILED')
+    assert balance(app, user_id) == Decimal('501000')
+    assert len(ledger(app, user_id)) == 1
+
+def test_amount_mismatch_leaves_the_transaction_pending(app, client, user_id, admin_headers):
+    transaction_id = pending(app, user_id, '1000', 'ref-1')
+
+    body = settle(client, admin_headers, [{'reference_no': 'ref-1', 'status': 'PAID', 'amount': 999}])
+
+    assert outcomes(body) == ['AMOUNT_MISMATCH']
+    assert status(app, transaction_id) == 'PENDING'
+    assert balance(app, user_id) == Decimal('500000')
+
+def test_not_found_and_invalid_items(app, client, user_id, admin_headers):
+    pending(app, user_id, '1000', 'ref-1')
+
+    body = settle(client, admin_headers, [
+        {'reference_no': 'no-such-ref', 'status': 'PAID'},
+        {'status': 'PAID'},
+        {'reference_no': 'ref-1', 'status': 'REFUNDED'},
+        {'reference_no': 'ref-1', 'status': 'PAID', 'amount': 'lots'},
+        'ref-1'
+    ])
+
+    assert outcomes(body) == ['NOT_FOUND', 'INVALID', 'INVALID', 'INVALID', 'INVALID']
+    assert body['summary'] == {'NOT_FOUND': 1, 'INVALID': 4}
+    assert balance(app, user_id) == Decimal('500000')
+
+def test_large_batch_stays_within_the_query_budget(app, client, user_id, admin_headers):
+    other_id = second_user(app)
+    with app.app_context():
+        for index in range(200):
+            db.session.add(Transaction(user_id=(user_id, other_id)[index % 2], type='TOPUP', amount=Decimal('10'),
+                                       status='PENDING', xendit_transaction_id=f'bulk-{index}'))
+        db.session.commit()
+
+    body = settle(client, admin_headers, [
+        {'reference_no': f'bulk-{index}', 'status': 'PAID' if index % 4 else 'EXPIRED'} for index in range(200)
+    ])
+
+    assert body['summary'] == {'SETTLED': 200}
+    assert balance(app, user_id) == Decimal('500000') + 50 * Decimal('10')
+    assert balance(app, other_id) == Decimal('1000') + 100 * Decimal('10')
+
+def test_repeated_doku_simulation_is_a_conflict(app, client, user_id):
+    transaction_id = pending(app, user_id, '1000', 'doku-ref-1')
+
+    first = client.post('/api/doku/simulate-payment', json={'reference_no': 'doku-ref-1'})
+    again = client.post('/api/doku/simulate-payment', json={'reference_no': 'doku-ref-1'})
+
+    assert first.status_code == 200
+    assert again.status_code == 409
+    assert again.get_json() == {'error': 'Payment already processed', 'outcome': 'ALREADY_PROCESSED',
+                                'reference_no': 'doku-ref-1', 'transaction_id': transaction_id, 'status': 'SUCCESS'}
+    assert balance(app, user_id) == Decimal('501000')
@@ -0,0 +1,123 @@
+"""TokenCache: single-flight refresh, refresh-ahead and tokens shared through a store"""
+import threading
+import time
+import pytest
+from src.services.token_cache import FileTokenStore, RedisTokenStore, TokenCache, TokenRefreshError
+
+class Fetcher:
+    """Hands out token-1, token-2, ... with the given lifetimes, slowly enough for callers to pile up"""
+
+    def __init__(self, *lifetimes, delay=0.05, error=None):
+        self.lifetimes = list(lifetimes)
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        with self._lock:
+            self.calls += 1
+            lifetime = self.lifetimes[min(self.calls, len(self.lifetimes)) - 1]
+            return f'token-{self.calls}', lifetime
+
+class FakeRedis:
+    """The commands RedisTokenStore uses, on a dict"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def eval(self, script, numkeys, key, owner):
+        if self.data.get(key) == owner:
+            del self.data[key]
+
+def concurrently(calls, threads=16):
+    """Run every call at the same moment; returns their results"""
+    barrier = threading.Barrier(threads)
+    results = [None] * threads
+
+    def run(index):
+        barrier.wait()
+        results[index] = calls[index % len(calls)]()
+
+    workers = [threading.Thread(target=run, args=(index,)) for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results
+
+def test_expired_token_is_fetched_once_for_all_threads():
+    fetch = Fetcher(3600)
+    cache = TokenCache('Test', fetch)
+
+    assert concurrently([cache.get]) == ['token-1'] * 16
+    assert fetch.calls == 1
+    assert cache.metrics()['refreshes'] == 1
+
+def test_processes_sharing_a_file_store_fetch_once(tmp_path):
+    fetch = Fetcher(3600)
+    path = str(tmp_path / 'token.json')
+    # Separate caches stand in for worker processes; only the store is shared
+    caches = [TokenCache('Test', fetch, FileTokenStore(path)) for _ in range(4)]
+
+    assert concurrently([cache.get for cache in caches]) == ['token-1'] * 16
+    assert fetch.calls == 1
+    assert sum(cache.metrics()['shared_hits'] for cache in caches) == 3
+
+def test_token_about_to_expire_is_refreshed_early():
+    fetch = Fetcher(30, 3600, delay=0)
+    cache = TokenCache('Test', fetch, refresh_ahead=60)
+
+    assert cache.get() == 'token-1'
+    assert cache.get() == 'token-2'
+    assert cache.get() == 'token-2'
+    assert fetch.calls == 2
+    assert cache.metrics()['refresh_ahead'] == 1
+
+def test_failed_early_refresh_keeps_the_valid_token():
+    fetch = Fetcher(30, delay=0)
+    cache = TokenCache('Test', fetch, refresh_ahead=60)
+    assert cache.get() == 'token-1'
+
+    fetch.error = RuntimeError('provider down')
+
+    assert cache.get() == 'token-1'
+    assert cache.metrics()['refresh_errors'] == 1
+
+def test_expired_token_with_a_failing_fetch_raises():
+    cache = TokenCache('Test', Fetcher(delay=0, error=RuntimeError('provider down')))
+
+    with pytest.raises(TokenRefreshError):
+        cache.get()
+
+@pytest.mark.parametrize('store', ['file', 'redis'])
+def test_token_in_the_store_is_adopted_without_a_fetch(tmp_path, store):
+    store = FileTokenStore(str(tmp_path / 'token.json')) if store == 'file' else RedisTokenStore(FakeRedis(), 'test:token')
+    store.write('stored-token', time.time() + 3600)
+    fetch = Fetcher(3600)
+    cache = TokenCache('Test', fetch, store)
+
+    assert cache.get() == 'stored-token'
+    assert fetch.calls == 0
+    assert cache.metrics()['shared_hits'] == 1
+
+def test_stored_token_inside_the_refresh_window_is_replaced(tmp_path):
+    store = FileTokenStore(str(tmp_path / 'token.json'))
+    store.write('old-token', time.time() + 30)
+    fetch = Fetcher(3600, delay=0)
+    cache = TokenCache('Test', fetch, store, refresh_ahead=60)
+
+    assert cache.get() == 'token-1'
+    assert store.read()[0] == 'token-1'
@@ -0,0 +1,59 @@
+"""ETag versions for /wallet/balance without Redis"""
+import pytest
+import time
+from src.models.user import User, db
+from src.services import user_versions
+from src.services.ledger import credit
+
+@pytest.fixture(autouse=True)
+def local_store(app):
+    """A fresh in-process store trusted for 50 ms"""
+    app.config['USER_VERSION_LOCAL_TTL'] = 0.05
+    user_versions._store = None
+    yield
+    user_versions._store = None
+
+def balance(client, headers, etag=None):
+    if etag is not None:
+        headers = dict(headers, **{'If-None-Match': etag})
+    return client.get('/api/wallet/balance', headers=headers)
+
+def test_unchanged_user_still_gets_304_after_the_local_ttl(client, user_headers):
+    first = balance(client, user_headers)
+    time.sleep(0.1)
+    again = balance(client, user_headers, first.headers['ETag'])
+
+    assert first.status_code == 200
+    assert again.status_code == 304
+
+def test_version_is_the_same_in_every_process(app, client, user_id, user_headers):
+    etag = balance(client, user_headers).headers['ETag']
+
+    # Another worker starts with an empty store and derives the same version from the row
+    with app.app_context():
+        assert user_versions.LocalVersionStore(5).current(user_id) == etag.strip('"')
+
+def test_change_made_elsewhere_is_seen_after_the_local_ttl(app, client, user_id, user_headers):
+    etag = balance(client, user_headers).headers['ETag']
+
+    # A Core UPDATE with no change event, as another process's change looks from here
+    with app.app_context():
+        db.session.execute(db.update(User).where(User.id == user_id).values(wallet_balance=User.wallet_balance + 1))
+        db.session.commit()
+    time.sleep(0.1)
+    response = balance(client, user_headers, etag)
+
+    assert response.status_code == 200
+    assert response.get_json()['balance'] == 500001.0
+
+def test_change_in_this_process_bumps_the_version_at_once(app, client, user_id, user_headers):
+    app.config['USER_VERSION_LOCAL_TTL'] = 60
+    etag = balance(client, user_headers).headers['ETag']
+
+    with app.app_context():
+        credit(user_id, 1000, 'TOPUP')
+        db.session.commit()
+    response = balance(client, user_headers, etag)
+
+    assert response.status_code == 200
+    assert response.get_json()['balance'] == 501000.0
@@ -0,0 +1,48 @@
+"""Deduplication of Xendit webhook deliveries"""
+from src.models.user import Transaction, User, db
+from decimal import Decimal
+
+def pending_topup(app, user_id):
+    with app.app_context():
+        transaction = Transaction(user_id=user_id, type='TOPUP', amount=Decimal('25000'), status='PENDING')
+        db.session.add(transaction)
+        db.session.commit()
+        return transaction.id
+
+def stored(app, user_id, transaction_id):
+    with app.app_context():
+        return db.session.get(Transaction, transaction_id).status, db.session.get(User, user_id).wallet_balance
+
+def test_status_callbacks_for_one_payment_are_separate_events(app, client, user_id):
+    transaction_id = pending_topup(app, user_id)
+    callback = {'id': 'inv-123', 'external_id': transaction_id}
+
+    pending = client.post('/api/webhooks/xendit', json=dict(callback, status='PENDING'))
+    paid = client.post('/api/webhooks/xendit', json=dict(callback, status='PAID'))
+
+    assert pending.status_code == paid.status_code == 200
+    assert paid.get_json() == {'message': 'Transaction status updated successfully'}
+    assert stored(app, user_id, transaction_id) == ('SUCCESS', Decimal('525000'))
+
+def test_redelivery_is_not_applied_twice(app, client, user_id):
+    transaction_id = pending_topup(app, user_id)
+    callback = {'id': 'inv-456', 'external_id': transaction_id, 'status': 'PAID'}
+
+    first = client.post('/api/webhooks/xendit', json=callback)
+    again = client.post('/api/webhooks/xendit', json=callback)
+
+    assert again.status_code == 200
+    assert again.get_json() == first.get_json()
+    assert stored(app, user_id, transaction_id) == ('SUCCESS', Decimal('525000'))
+
+def test_webhook_id_header_identifies_the_delivery(app, client, user_id):
+    transaction_id = pending_topup(app, user_id)
+    headers = {'webhook-id': 'whk-1'}
+
+    client.post('/api/webhooks/xendit', json={'external_id': transaction_id, 'status': 'PAID'}, headers=headers)
+    # Same delivery id, so a replay with a changed body is still recognised as the same event
+    replay = client.post('/api/webhooks/xendit', json={'external_id': transaction_id, 'status': 'PAID', 'retry': 1},
+                         headers=headers)
+
+    assert replay.status_code == 200
+    assert stored(app, user_id, transaction_id) == ('SUCCESS', Decimal('525000'))